@@ -7,7 +7,7 @@ from .models import (
     )
 from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import OICAssignment, OICRemark
+from .models import OICAssignment, OICRemark, CertificateIssuanceJob, CertificateIssuanceJobItem, ReportJob
 
 class SchoolAdminFilter(admin.SimpleListFilter):
     title = 'school'
@@ -304,6 +304,28 @@ class CertificateAdmin(TenantAdminMixin, admin.ModelAdmin):
     ordering = ['-school', 'certificate_number']
     raw_id_fields = ['school', 'student', 'issued_by']
 
+class CertificateIssuanceJobItemInline(admin.TabularInline):
+    model = CertificateIssuanceJobItem
+    extra = 0
+    raw_id_fields = ['enrollment', 'certificate']
+    readonly_fields = ['student_svc_number', 'student_name', 'status', 'error', 'updated_at']
+
+@admin.register(CertificateIssuanceJob)
+class CertificateIssuanceJobAdmin(TenantAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'school', 'class_obj', 'status', 'total_students', 'created_at', 'finished_at']
+    list_filter = ['status', 'school']
+    raw_id_fields = ['school', 'class_obj', 'template', 'requested_by']
+    ordering = ['-created_at']
+    inlines = [CertificateIssuanceJobItemInline]
+
+@admin.register(ReportJob)
+class ReportJobAdmin(TenantAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'school', 'requested_by', 'action', 'status', 'progress', 'result_size', 'created_at', 'expires_at']
+    list_filter = ['status', 'action', 'school']
+    raw_id_fields = ['school', 'requested_by']
+    exclude = ['result']
+    ordering = ['-created_at']
+
 @admin.register(StudentIndex)
 class StudentIndexAdmin(admin.ModelAdmin):
     list_display = [
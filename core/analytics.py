@@ -0,0 +1,278 @@
+"""
+Vectorised performance statistics across a class, a course or a school.
+
+Per-student features are pulled with a handful of grouped queries and laid
+out as a NumPy matrix (one row per active enrollment, NaN where a student
+has no data), so correlations, percentiles, z-scores and histograms are
+array operations instead of Python loops over per-student dicts.
+"""
+import numpy as np
+from django.db.models import Count, Q
+
+from .models import (
+    Enrollment, AttendanceSession, SessionAttendance,
+    StudentSubjectStanding, StudentComponentResult,
+)
+
+
+BASE_FEATURES = (
+    ('attendance_rate', 'Attendance rate'),
+    ('late_rate', 'Late rate'),
+    ('exam_percentage', 'Overall percentage'),
+)
+COUNTED_SESSION_STATUSES = ('active', 'completed')
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class FeatureMatrix:
+    """
+    ``values[i, j]`` is feature ``columns[j]`` for enrollment ``rows[i]``.
+    Columns are ``(key, label)`` pairs; subject and component columns use
+    ``subject:<id>`` / ``component:<id>`` keys.
+    """
+
+    def __init__(self, rows, columns, values):
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self._col_index = {key: j for j, (key, _) in enumerate(columns)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def has(self, key):
+        return key in self._col_index
+
+    def column(self, key):
+        return self.values[:, self._col_index[key]]
+
+    def select(self, keys):
+        idx = [self._col_index[k] for k in keys]
+        return FeatureMatrix(self.rows, [self.columns[j] for j in idx], self.values[:, idx])
+
+
+def build_feature_matrix(class_ids, *, include_subjects=False, include_components=False):
+    """
+    Feature matrix for every active enrollment in ``class_ids``.
+
+    Subject scores come from the maintained StudentSubjectStanding rows and
+    component scores from effective attempts, so both grading modes line up.
+    """
+    class_ids = list(class_ids)
+    enrollments = list(
+        Enrollment.all_objects
+        .filter(class_obj_id__in=class_ids, is_active=True)
+        .values(
+            'student_id', 'class_obj_id',
+            'student__first_name', 'student__last_name', 'student__svc_number',
+        )
+        .order_by('class_obj_id', 'student__svc_number', 'student_id')
+    )
+    rows = [
+        {
+            'student_id': e['student_id'],
+            'class_id': e['class_obj_id'],
+            'student_name': f"{e['student__first_name']} {e['student__last_name']}".strip(),
+            'svc_number': e['student__svc_number'],
+        }
+        for e in enrollments
+    ]
+    row_index = {(r['student_id'], r['class_id']): i for i, r in enumerate(rows)}
+
+    sessions = dict(
+        AttendanceSession.all_objects
+        .filter(class_obj_id__in=class_ids, status__in=COUNTED_SESSION_STATUSES)
+        .values('class_obj_id')
+        .annotate(n=Count('id'))
+        .values_list('class_obj_id', 'n')
+    )
+    attendance = (
+        SessionAttendance.all_objects
+        .filter(
+            session__class_obj_id__in=class_ids,
+            session__status__in=COUNTED_SESSION_STATUSES,
+        )
+        .values('student_id', 'session__class_obj_id')
+        .annotate(
+            attended=Count('id', filter=Q(status__in=['present', 'late'])),
+            late=Count('id', filter=Q(status='late')),
+        )
+    )
+
+    standings = list(
+        StudentSubjectStanding.all_objects
+        .filter(class_obj_id__in=class_ids, subject__is_active=True, percentage__isnull=False)
+        .values('student_id', 'class_obj_id', 'subject_id', 'subject__name', 'percentage')
+    )
+
+    components = []
+    if include_components:
+        components = list(
+            StudentComponentResult.all_objects
+            .filter(
+                component__subject__class_obj_id__in=class_ids,
+                component__is_active=True,
+            )
+            .effective()
+            .filter(percentage__isnull=False)
+            .values(
+                'student_id', 'component__subject__class_obj_id', 'component_id',
+                'component__name', 'component__subject__name', 'percentage',
+            )
+        )
+
+    columns = list(BASE_FEATURES)
+    subject_cols = {}
+    if include_subjects:
+        for s in standings:
+            if s['subject_id'] not in subject_cols:
+                subject_cols[s['subject_id']] = len(columns)
+                columns.append((f"subject:{s['subject_id']}", s['subject__name']))
+    component_cols = {}
+    for c in components:
+        if c['component_id'] not in component_cols:
+            component_cols[c['component_id']] = len(columns)
+            columns.append((
+                f"component:{c['component_id']}",
+                f"{c['component__subject__name']} - {c['component__name']}",
+            ))
+
+    values = np.full((len(rows), len(columns)), np.nan)
+
+    # Attendance and late rates.
+    att_rows, attended, late, expected = [], [], [], []
+    for a in attendance:
+        i = row_index.get((a['student_id'], a['session__class_obj_id']))
+        if i is None:
+            continue
+        att_rows.append(i)
+        attended.append(a['attended'])
+        late.append(a['late'])
+        expected.append(sessions.get(a['session__class_obj_id'], 0))
+    if att_rows:
+        att_rows = np.array(att_rows)
+        attended = np.array(attended, dtype=float)
+        late = np.array(late, dtype=float)
+        expected = np.array(expected, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values[att_rows, 0] = np.where(expected > 0, attended / expected * 100, np.nan)
+            values[att_rows, 1] = np.where(attended > 0, late / attended * 100, np.nan)
+    # Enrolled students with no attendance records attended nothing.
+    has_sessions = np.array([sessions.get(r['class_id'], 0) > 0 for r in rows], dtype=bool)
+    if len(rows):
+        missing = has_sessions & np.isnan(values[:, 0])
+        values[missing, 0] = 0.0
+
+    # Overall percentage is the mean of the student's subject percentages.
+    if standings:
+        idx = np.array([
+            row_index.get((s['student_id'], s['class_obj_id']), -1) for s in standings
+        ])
+        pct = np.array([float(s['percentage']) for s in standings])
+        keep = idx >= 0
+        idx, pct = idx[keep], pct[keep]
+        totals = np.bincount(idx, weights=pct, minlength=len(rows))
+        counts = np.bincount(idx, minlength=len(rows))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values[:, 2] = np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+        if include_subjects:
+            cols = np.array([subject_cols[s['subject_id']] for s in standings])[keep]
+            values[idx, cols] = pct
+
+    if components:
+        idx = np.array([
+            row_index.get((c['student_id'], c['component__subject__class_obj_id']), -1)
+            for c in components
+        ])
+        cols = np.array([component_cols[c['component_id']] for c in components])
+        pct = np.array([float(c['percentage']) for c in components])
+        keep = idx >= 0
+        values[idx[keep], cols[keep]] = pct[keep]
+
+    return FeatureMatrix(rows, columns, values)
+
+
+def correlation_matrix(values, min_pairs=3):
+    """
+    Pairwise-complete Pearson correlation between the columns of ``values``.
+
+    Each pair uses only the rows where both columns are present. Returns
+    ``(r, n)``: the correlation matrix (NaN where a pair has fewer than
+    ``min_pairs`` observations or no variance) and the pair counts.
+    """
+    present = ~np.isnan(values)
+    m = present.astype(float)
+    x = np.where(present, values, 0.0)
+
+    n = m.T @ m
+    sx = x.T @ m                # sum of column i over rows where j is present
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n
+        var_j = var_i.T
+        r = cov / np.sqrt(var_i * var_j)
+
+    r[(n < min_pairs) | ~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0), n.astype(int)
+
+
+def pearson(x, y, min_pairs=2):
+    r, _ = correlation_matrix(
+        np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)]),
+        min_pairs=min_pairs,
+    )
+    return None if np.isnan(r[0, 1]) else float(r[0, 1])
+
+
+def describe(values, percentiles=DEFAULT_PERCENTILES):
+    data = values[~np.isnan(values)]
+    if data.size == 0:
+        return {
+            'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None,
+            'percentiles': {f'p{p}': None for p in percentiles},
+        }
+    return {
+        'count': int(data.size),
+        'mean': round(float(data.mean()), 2),
+        'std': round(float(data.std()), 2),
+        'min': round(float(data.min()), 2),
+        'max': round(float(data.max()), 2),
+        'percentiles': {
+            f'p{p}': round(float(v), 2)
+            for p, v in zip(percentiles, np.percentile(data, percentiles))
+        },
+    }
+
+
+def z_scores(values):
+    data = values[~np.isnan(values)]
+    std = data.std() if data.size else 0.0
+    if not std:
+        return np.where(np.isnan(values), np.nan, 0.0)
+    return (values - data.mean()) / std
+
+
+def percentile_ranks(values):
+    """Share of present values at or below each value, 0-100."""
+    data = np.sort(values[~np.isnan(values)])
+    if data.size == 0:
+        return np.full(values.shape, np.nan)
+    ranks = np.searchsorted(data, values, side='right') / data.size * 100
+    return np.where(np.isnan(values), np.nan, ranks)
+
+
+def histogram(values, bins=10, value_range=(0, 100)):
+    data = values[~np.isnan(values)]
+    counts, edges = np.histogram(data, bins=bins, range=value_range)
+    return [
+        {'from': round(float(lo), 2), 'to': round(float(hi), 2), 'count': int(c)}
+        for lo, hi, c in zip(edges[:-1], edges[1:], counts)
+    ]
+
+
+def to_json_float(value, digits=4):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
@@ -0,0 +1,77 @@
+import time
+from functools import wraps
+
+from django.core.cache import cache
+
+
+# How long a value stays in the cache (and may be served stale) after it
+# stops being fresh.
+STALE_TTL = 600
+# Upper bound on how long one worker may hold the fill lock.
+LOCK_TIMEOUT = 30
+# How long a request with nothing to serve waits for another worker's fill.
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+
+
+def single_flight(key, compute, *, timeout=120, stale_ttl=STALE_TTL,
+                  lock_timeout=LOCK_TIMEOUT, wait=WAIT_TIMEOUT):
+    """
+    Read-through cache fill where only one caller recomputes an expired key.
+
+    The value is stored with a freshness deadline ``timeout`` seconds out and
+    kept for another ``stale_ttl`` seconds. Once it goes stale, the caller
+    that wins ``cache.add`` on ``<key>:lock`` recomputes it while everyone
+    else keeps getting the stale value. When there is no value at all, the
+    losers poll for up to ``wait`` seconds before computing it themselves.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['value']
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            return _fill(key, compute, timeout, stale_ttl)
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry['value']
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+
+    return _fill(key, compute, timeout, stale_ttl)
+
+
+def _fill(key, compute, timeout, stale_ttl):
+    value = compute()
+    cache.set(
+        key,
+        {'value': value, 'fresh_until': time.time() + timeout},
+        timeout=timeout + stale_ttl,
+    )
+    return value
+
+
+def single_flight_cached(key_func, **options):
+    """
+    Decorator form of :func:`single_flight`. ``key_func`` receives the
+    wrapped function's arguments and returns the cache key, or ``None`` to
+    bypass the cache for that call. The wrapped function must return plain,
+    picklable data rather than a Response.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            if key is None:
+                return func(*args, **kwargs)
+            return single_flight(key, lambda: func(*args, **kwargs), **options)
+        return wrapper
+    return decorator
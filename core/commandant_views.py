@@ -8,6 +8,7 @@ from django.db.models import (
     Q, Count, Avg, Sum, Case, When, IntegerField, Value, F,
 )
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.db import transaction
 from .models import (
     User, School, Department, DepartmentMembership,
@@ -36,6 +37,9 @@ from .serializers import (
 )
 from .permissions import IsCommandantOrChiefInstructor
 from .managers import get_current_school
+from .caching import single_flight_cached
+from .services import school_stats_summary
+from .services.report_jobs import async_report
 
 def _get_school(user):
     school = get_current_school()
@@ -43,6 +47,32 @@ def _get_school(user):
         return school
     return user.school
 
+def _parse_date_range(request):
+    parsed = []
+    for param in ('date_from', 'date_to'):
+        raw = request.query_params.get(param)
+        if not raw:
+            parsed.append(None)
+            continue
+        try:
+            value = parse_date(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            return None, None, Response(
+                {'error': f'{param} must be a date in YYYY-MM-DD format.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        parsed.append(value)
+
+    date_from, date_to = parsed
+    if date_from and date_to and date_from > date_to:
+        return None, None, Response(
+            {'error': 'date_from must be on or before date_to.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return date_from, date_to, None
+
 class CommandantDashboardViewSet(viewsets.ViewSet):
 
     permission_classes = [IsAuthenticated, IsCommandantOrChiefInstructor]
@@ -64,6 +94,19 @@ class CommandantDashboardViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        date_from, date_to, error = _parse_date_range(request)
+        if error is not None:
+            return error
+
+        return Response(self._overview_data(school, user.role, date_from, date_to))
+
+    @single_flight_cached(
+        lambda self, school, role, date_from=None, date_to=None: (
+            f'commandant_overview:{school.id}:{role}:{date_from or ""}:{date_to or ""}'
+        ),
+        timeout=60,
+    )
+    def _overview_data(self, school, role, date_from=None, date_to=None):
         memberships = SchoolMembership.all_objects.filter(
             school=school, status='active'
         )
@@ -89,52 +132,27 @@ class CommandantDashboardViewSet(viewsets.ViewSet):
             school=school, status='issued'
         ).count()
 
-        thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        recent_sessions = AttendanceSession.all_objects.filter(
-            school=school,
-            scheduled_start__gte=thirty_days_ago,
-        )
-        total_sessions = recent_sessions.count()
-        completed_sessions = recent_sessions.filter(status='completed').count()
-
-        session_attendance_qs = SessionAttendance.all_objects.filter(
-            session__school=school,
-            session__scheduled_start__gte=thirty_days_ago,
-        )
-        present_count = session_attendance_qs.filter(
-            status__in=['present', 'late']
-        ).count()
-        total_attendance_records = session_attendance_qs.count()
-        overall_attendance_rate = (
-            round(present_count / total_attendance_records * 100, 2)
-            if total_attendance_records > 0 else 0
-        )
-
-        submitted_results = ExamResult.all_objects.filter(
-            school=school, is_submitted=True, marks_obtained__isnull=False,
-        )
-        result_count = submitted_results.count()
-        if result_count > 0:
-            total_marks = sum(r.marks_obtained for r in submitted_results.select_related('exam'))
-            total_possible = sum(r.exam.total_marks for r in submitted_results.select_related('exam'))
-            avg_performance = round(total_marks / total_possible * 100, 2) if total_possible > 0 else 0
-            pass_count = sum(1 for r in submitted_results if r.percentage >= 50)
-            pass_rate = round(pass_count / result_count * 100, 2)
+        if date_from or date_to:
+            attendance_period = exam_period = 'custom'
+            attendance_stats = exam_stats = school_stats_summary(school.id, date_from, date_to)
         else:
-            avg_performance = 0
-            pass_rate = 0
+            attendance_period, exam_period = 'last_30_days', 'all_time'
+            attendance_stats = school_stats_summary(
+                school.id, date_from=timezone.localdate() - timezone.timedelta(days=30),
+            )
+            exam_stats = school_stats_summary(school.id)
 
         reports_without_remark = exam_reports.exclude(
-            remarks__author_role=user.role,
+            remarks__author_role=role,
         ).count()
 
-        return Response({
+        return {
             'school': {
                 'id': str(school.id),
                 'name': school.name,
                 'code': school.code,
             },
-            'user_role': user.role,
+            'user_role': role,
             'counts': {
                 'total_students': total_students,
                 'total_instructors': total_instructors,
@@ -148,21 +166,26 @@ class CommandantDashboardViewSet(viewsets.ViewSet):
                 'exam_reports': exam_reports.count(),
                 'certificates_issued': certificates_issued,
             },
+            'date_range': {
+                'date_from': date_from,
+                'date_to': date_to,
+            },
             'attendance_summary': {
-                'period': 'last_30_days',
-                'total_sessions': total_sessions,
-                'completed_sessions': completed_sessions,
-                'overall_attendance_rate': overall_attendance_rate,
+                'period': attendance_period,
+                'total_sessions': attendance_stats['sessions_count'],
+                'completed_sessions': attendance_stats['completed_sessions'],
+                'overall_attendance_rate': attendance_stats['attendance_rate'],
             },
             'exam_performance': {
-                'total_results': result_count,
-                'average_performance': avg_performance,
-                'pass_rate': pass_rate,
+                'period': exam_period,
+                'total_results': exam_stats['results_count'],
+                'average_performance': exam_stats['average_performance'],
+                'pass_rate': exam_stats['pass_rate'],
             },
             'pending_actions': {
                 'reports_awaiting_your_remarks': reports_without_remark,
             },
-        })
+        }
 
 class CommandantDepartmentViewSet(viewsets.ReadOnlyModelViewSet):
 
@@ -511,6 +534,7 @@ class CommandantExamReportViewSet(viewsets.ReadOnlyModelViewSet):
         ).prefetch_related('exams', 'remarks')
 
     @action(detail=True, methods=['get'])
+    @async_report
     def detailed_report(self, request, pk=None):
         report = self.get_object()
         exam_ids = report.exams.values_list('id', flat=True)
@@ -0,0 +1,160 @@
+import bisect
+import threading
+import time
+
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+
+
+DEFAULT_GRADE_BANDS = (
+    (91, 'A'),
+    (86, 'A-'),
+    (81, 'B+'),
+    (76, 'B'),
+    (71, 'B-'),
+    (65, 'C+'),
+    (60, 'C'),
+    (50, 'C-'),
+)
+DEFAULT_FAIL_GRADE = 'F'
+
+# How long a worker trusts its copy of a school's scale before re-reading it.
+SCALE_CACHE_TTL = 300
+
+
+def _settle(percentage):
+    # marks / total * 100 can land a hair under a band edge (36.4 / 40 * 100
+    # is 90.999...); the SQL path compares marks exactly, so round the float
+    # noise away before bisecting.
+    return round(float(percentage), 9)
+
+
+class GradeScale:
+    """
+    Percentage → letter grade banding.
+
+    A school can override the default scale with
+    ``School.settings['grade_scale'] = [[min_percentage, "grade"], ...]`` and
+    optionally ``settings['fail_grade']``. The scale compiles to a bisect
+    lookup for Python lists and to a ``CASE`` expression for SQL aggregates.
+    """
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    def __init__(self, bands=DEFAULT_GRADE_BANDS, fail_grade=DEFAULT_FAIL_GRADE):
+        ordered = sorted(((float(m), str(g)) for m, g in bands), key=lambda b: b[0])
+        self.bands = tuple(ordered)
+        self.fail_grade = fail_grade
+        self._thresholds = [m for m, _ in ordered]
+        self._grades = [fail_grade] + [g for _, g in ordered]
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, GradeScale)
+            and self.bands == other.bands
+            and self.fail_grade == other.fail_grade
+        )
+
+    def __hash__(self):
+        return hash((self.bands, self.fail_grade))
+
+    @property
+    def labels(self):
+        """Grades from highest to lowest, fail grade last."""
+        return [g for _, g in reversed(self.bands)] + [self.fail_grade]
+
+    def classify(self, percentage):
+        if percentage is None:
+            return ''
+        return self._grades[bisect.bisect_right(self._thresholds, _settle(percentage))]
+
+    def classify_many(self, percentages):
+        thresholds, grades = self._thresholds, self._grades
+        return [
+            grades[bisect.bisect_right(thresholds, _settle(p))] if p is not None else ''
+            for p in percentages
+        ]
+
+    def empty_distribution(self):
+        return {label: 0 for label in self.labels}
+
+    def distribution(self, percentages):
+        dist = self.empty_distribution()
+        for grade in self.classify_many(percentages):
+            if grade in dist:
+                dist[grade] += 1
+        return dist
+
+    def sql_case(self, percentage_expr):
+        """CASE expression bucketing an arbitrary percentage expression."""
+        return Case(
+            *[
+                When(GreaterThanOrEqual(percentage_expr, Value(minimum)), then=Value(grade))
+                for minimum, grade in reversed(self.bands)
+            ],
+            default=Value(self.fail_grade),
+            output_field=CharField(),
+        )
+
+    def sql_case_marks(self, marks='marks_obtained', total='exam__total_marks'):
+        """CASE expression comparing raw marks against a fraction of the total (no division)."""
+        return Case(
+            *[
+                When(**{f'{marks}__gte': F(total) * (minimum / 100)}, then=Value(grade))
+                for minimum, grade in reversed(self.bands)
+            ],
+            default=Value(self.fail_grade),
+            output_field=CharField(),
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        settings = settings or {}
+        bands = settings.get('grade_scale') or DEFAULT_GRADE_BANDS
+        fail_grade = settings.get('fail_grade') or DEFAULT_FAIL_GRADE
+        try:
+            return cls(bands, fail_grade)
+        except (TypeError, ValueError):
+            return DEFAULT_SCALE
+
+    @classmethod
+    def for_school(cls, school):
+        """
+        Scale for a School instance or school id (None → default). Cached
+        in-process per school for SCALE_CACHE_TTL seconds.
+        """
+        if school is None:
+            return DEFAULT_SCALE
+
+        school_id = getattr(school, 'pk', school)
+        now = time.monotonic()
+        entry = cls._cache.get(school_id)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        if hasattr(school, 'settings'):
+            settings = school.settings
+        else:
+            from core.models import School
+            settings = (
+                School.objects.filter(pk=school_id)
+                .values_list('settings', flat=True)
+                .first()
+            )
+
+        scale = cls.from_settings(settings)
+        with cls._lock:
+            cls._cache[school_id] = (now + SCALE_CACHE_TTL, scale)
+        return scale
+
+    @classmethod
+    def invalidate(cls, school_id=None):
+        with cls._lock:
+            if school_id is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(school_id, None)
+
+
+DEFAULT_SCALE = GradeScale()
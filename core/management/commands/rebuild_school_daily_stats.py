@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SchoolDailyStats and ClassDailyStats rollups behind the dashboards and trends'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='Only rebuild this school (code)',
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only rebuild days on or after this date (YYYY-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        from core.models import School
+        from core.services import rebuild_school_daily_stats, school_stats_live_from
+        from core.services.trends import rebuild_class_daily_stats
+
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+
+        schools = School.objects.all().order_by('name')
+        if options['school']:
+            schools = schools.filter(code=options['school'])
+            if not schools.exists():
+                raise CommandError(f"School {options['school']} not found")
+
+        # Recent days are always aggregated live, so the rollup stops short of them.
+        settled_to = school_stats_live_from() - timedelta(days=1)
+        total = 0
+        for school in schools:
+            rows = rebuild_school_daily_stats(school.id, date_from=since, date_to=settled_to)
+            class_rows = rebuild_class_daily_stats(school.id, date_from=since, date_to=settled_to)
+            total += rows + class_rows
+            self.stdout.write(f'  {school.name}: {rows} days, {class_rows} class/subject days')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} daily rows'))
+
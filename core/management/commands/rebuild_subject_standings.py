@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized StudentSubjectStanding table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--class-id',
+            type=int,
+            help='Only rebuild standings for this class',
+        )
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='Only rebuild standings for classes in this school (code)',
+        )
+        parser.add_argument(
+            '--include-closed',
+            action='store_true',
+            help='Also rebuild standings for closed classes',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete standings for inactive subjects and inactive enrollments',
+        )
+
+    def handle(self, *args, **options):
+        from core.models import Class, Enrollment, StudentSubjectStanding
+        from core.services import refresh_class_standings
+
+        classes = Class.all_objects.all().order_by('id')
+
+        if options['class_id']:
+            classes = classes.filter(id=options['class_id'])
+            if not classes.exists():
+                raise CommandError(f"Class {options['class_id']} not found")
+
+        if options['school']:
+            classes = classes.filter(school__code=options['school'])
+
+        if not options['include_closed'] and not options['class_id']:
+            classes = classes.filter(is_closed=False)
+
+        total_classes = 0
+        total_rows = 0
+
+        for class_obj in classes.iterator():
+            rows = refresh_class_standings(class_obj)
+            total_classes += 1
+            total_rows += len(rows)
+            self.stdout.write(f'  {class_obj.name}: {len(rows)} standings')
+
+            if options['prune']:
+                active_students = Enrollment.all_objects.filter(
+                    class_obj=class_obj, is_active=True,
+                ).values('student_id')
+                deleted, _ = StudentSubjectStanding.all_objects.filter(
+                    class_obj=class_obj,
+                ).exclude(
+                    subject__is_active=True,
+                    student_id__in=active_students,
+                ).delete()
+                if deleted:
+                    self.stdout.write(f'    pruned {deleted} stale standings')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total_rows} standings across {total_classes} classes'
+        ))
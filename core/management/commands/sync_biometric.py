@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from core.models import BiometricRecord, AttendanceSession
+from core.models import BiometricRecord
 import sys
 
 class Command(BaseCommand):
@@ -136,46 +136,21 @@ class Command(BaseCommand):
     def auto_mark_absent(self):
 
         self.stdout.write('Auto-marking absent students...')
-        from core.models import SessionAttendance, User, Enrollment
+        from core.services import mark_absent_for_completed_sessions
 
         from datetime import timedelta
         cutoff_date = timezone.now() - timedelta(days=7)
 
-        completed_sessions = AttendanceSession.objects.filter(
-            status='completed',
-            actual_end__gte=cutoff_date
+        marked = mark_absent_for_completed_sessions(
+            ended_from=cutoff_date,
+            remarks='Auto-marked absent by system',
         )
+        total_marked = sum(marked.values())
 
-        total_marked = 0
-
-        for session in completed_sessions:
-            marked_student_ids = session.sessio_attendances.values_list('student_id', flat=True)
-
-            unmarked_students = User.objects.filter(
-                enrollments__class_obj = session.class_obj,
-                enrollments__is_active = True,
-                role = 'student',
-                is_active=True
-            ).exclude(id__in=marked_student_ids)
-
-            if unmarked_students.exists():
-
-                absent_records = []
-                for student in unmarked_students:
-                    absent_records.append(SessionAttendance(
-                        session=session,
-                        student = student,
-                        status='absent',
-                        marking_method='admin',
-                        remarks='Auto-marked  absent by system'
-                    ))
-                SessionAttendance.objects.bulk_create(absent_records)
-                total_marked +=len(absent_records)
-
-
-                self_stdout.write(
-                    f' Session{session.id}: Marked{len(absent_records)} students as absent'
-                )
+        for session_id, count in marked.items():
+            self.stdout.write(
+                f' Session {session_id}: Marked {count} students as absent'
+            )
 
         if total_marked == 0:
             self.stdout.write(self.style.WARNING('No students to mark as absent'))
@@ -36,6 +36,42 @@ class TenantAwareQuerySet(models.QuerySet):
             return self
         return self.filter(school=school)
 
+class StudentComponentResultQuerySet(models.QuerySet):
+
+    def effective(self):
+        """
+        Restrict to the effective attempt per (student, component): the best
+        percentage when the component's retake_evaluation is 'best',
+        otherwise the latest attempt. Ranked with ROW_NUMBER() in a single
+        subquery, so the result can be aggregated or grouped directly.
+
+        Narrow by student/component/subject before calling this; filters on
+        attempt fields (status, percentage) belong after it.
+        """
+        from django.db.models import F, Case, When, Value, Window, DecimalField
+        from django.db.models.functions import Coalesce, RowNumber
+
+        best_pct = Case(
+            When(
+                component__retake_evaluation='best',
+                then=Coalesce('percentage', Value(0), output_field=DecimalField()),
+            ),
+            default=Value(0),
+            output_field=DecimalField(),
+        )
+        ranked = (
+            self
+            .filter(is_submitted=True, marks_obtained__isnull=False)
+            .annotate(effective_rank=Window(
+                RowNumber(),
+                partition_by=[F('student_id'), F('component_id')],
+                order_by=[best_pct.desc(), F('attempt_number').desc()],
+            ))
+            .filter(effective_rank=1)
+            .values('pk')
+        )
+        return self.filter(pk__in=ranked)
+
 class TenantAwareUserManager(UserManager):
 
     def get_queryset(self):
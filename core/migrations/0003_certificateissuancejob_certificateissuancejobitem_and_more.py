@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_biometricdevice_certificatetemplate_department_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateIssuanceJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('completed_with_errors', 'Completed With Errors'), ('failed', 'Failed')], default='pending', max_length=30)),
+                ('total_students', models.IntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('class_obj', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='certificate_jobs', to='core.class')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='certificate_jobs_requested', to=settings.AUTH_USER_MODEL)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='certificate_jobs', to='core.school')),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='issuance_jobs', to='core.certificatetemplate')),
+            ],
+            options={
+                'db_table': 'certificate_issuance_jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CertificateIssuanceJobItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student_svc_number', models.CharField(blank=True, default='', max_length=50)),
+                ('student_name', models.CharField(blank=True, default='', max_length=300)),
+                ('status', models.CharField(choices=[('pending', 'Pending Render'), ('rendered', 'Rendered'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('certificate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job_items', to='core.certificate')),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='certificate_job_items', to='core.enrollment')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.certificateissuancejob')),
+            ],
+            options={
+                'db_table': 'certificate_issuance_job_items',
+                'ordering': ['job', 'student_svc_number'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='certificateissuancejob',
+            index=models.Index(fields=['class_obj', 'created_at'], name='certificate_class_o_2adc58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificateissuancejob',
+            index=models.Index(fields=['school', 'status'], name='certificate_school__cbc242_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificateissuancejobitem',
+            index=models.Index(fields=['job', 'status'], name='certificate_job_id_f01689_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_certificateissuancejob_certificateissuancejobitem_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSubjectStanding',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('grading_mode', models.CharField(choices=[('LEGACY', 'Legacy (Final Exam Only)'), ('POLICY', 'Policy (Component-Based)')], default='LEGACY', max_length=10)),
+                ('exam_marks_obtained', models.DecimalField(decimal_places=2, default=0, help_text='Sum of submitted exam result marks in this subject.', max_digits=9)),
+                ('exam_marks_possible', models.IntegerField(default=0)),
+                ('exams_taken', models.PositiveIntegerField(default=0)),
+                ('component_marks_obtained', models.DecimalField(decimal_places=2, default=0, help_text='Sum of effective component attempt marks (POLICY only).', max_digits=9)),
+                ('component_marks_possible', models.IntegerField(default=0)),
+                ('components_graded', models.PositiveIntegerField(default=0)),
+                ('pending_components', models.PositiveIntegerField(default=0)),
+                ('percentage', models.DecimalField(blank=True, decimal_places=2, help_text='LEGACY: all exam marks / possible. POLICY: weighted percentage of graded components.', max_digits=6, null=True)),
+                ('final_exam_percentage', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('grade', models.CharField(blank=True, max_length=5)),
+                ('is_complete', models.BooleanField(default=False)),
+                ('is_passed', models.BooleanField(default=False)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('failed_critical', models.JSONField(blank=True, default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('class_obj', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_standings', to='core.class')),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subject_standings', to='core.school')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='subject_standings', to=settings.AUTH_USER_MODEL)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='core.subject')),
+            ],
+            options={
+                'db_table': 'student_subject_standings',
+                'indexes': [models.Index(fields=['class_obj', 'student'], name='student_sub_class_o_9a52be_idx'), models.Index(fields=['subject', 'is_passed'], name='student_sub_subject_310a71_idx')],
+                'unique_together': {('student', 'subject')},
+            },
+        ),
+    ]
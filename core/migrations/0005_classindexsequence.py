@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_studentsubjectstanding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassIndexSequence',
+            fields=[
+                ('class_obj', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='index_sequence', serialize=False, to='core.class')),
+                ('last_value', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'class_index_sequences',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_classindexsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20)),
+                ('year', models.PositiveIntegerField()),
+                ('last_value', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'certificate_number_sequences',
+                'unique_together': {('prefix', 'year')},
+            },
+        ),
+    ]
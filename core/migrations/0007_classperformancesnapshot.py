@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_certificatenumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassPerformanceSnapshot',
+            fields=[
+                ('class_obj', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='performance_snapshot', serialize=False, to='core.class')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('computed_at', models.DateTimeField()),
+                ('build_ms', models.PositiveIntegerField(default=0)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='class_performance_snapshots', to='core.school')),
+            ],
+            options={
+                'db_table': 'class_performance_snapshots',
+            },
+        ),
+    ]
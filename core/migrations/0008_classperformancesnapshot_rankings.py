@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_classperformancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classperformancesnapshot',
+            name='rankings',
+            field=models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Ranked student rows, kept apart from the header so it can be deferred.'),
+        ),
+    ]
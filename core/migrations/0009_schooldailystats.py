@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_classperformancesnapshot_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('results_count', models.PositiveIntegerField(default=0)),
+                ('marks_obtained', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('marks_possible', models.BigIntegerField(default=0)),
+                ('pass_count', models.PositiveIntegerField(default=0)),
+                ('sessions_count', models.PositiveIntegerField(default=0)),
+                ('completed_sessions', models.PositiveIntegerField(default=0)),
+                ('attendance_records', models.PositiveIntegerField(default=0)),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('is_dirty', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.school')),
+            ],
+            options={
+                'db_table': 'school_daily_stats',
+                'indexes': [models.Index(fields=['school', 'date'], name='school_dail_school__e0f1ce_idx'), models.Index(fields=['is_dirty'], name='school_dail_is_dirt_f91821_idx')],
+                'unique_together': {('school', 'date')},
+            },
+        ),
+    ]
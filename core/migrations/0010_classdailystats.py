@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_schooldailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('exams_count', models.PositiveIntegerField(default=0)),
+                ('exam_results_count', models.PositiveIntegerField(default=0)),
+                ('exam_pct_sum', models.FloatField(default=0)),
+                ('components_count', models.PositiveIntegerField(default=0)),
+                ('component_results_count', models.PositiveIntegerField(default=0)),
+                ('component_pct_sum', models.FloatField(default=0)),
+                ('sessions_count', models.PositiveIntegerField(default=0)),
+                ('attendance_records', models.PositiveIntegerField(default=0)),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('late_count', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('class_obj', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.class')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_daily_stats', to='core.school')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.subject')),
+            ],
+            options={
+                'db_table': 'class_daily_stats',
+                'indexes': [models.Index(fields=['class_obj', 'date'], name='class_daily_class_o_df892b_idx'), models.Index(fields=['subject', 'date'], name='class_daily_subject_51fcb8_idx'), models.Index(fields=['school', 'date'], name='class_daily_school__fea9ce_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSessionStats',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='live_stats', serialize=False, to='core.attendancesession')),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('late_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('excused_count', models.PositiveIntegerField(default=0)),
+                ('expected_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_session_stats', to='core.school')),
+            ],
+            options={
+                'db_table': 'attendance_session_stats',
+            },
+        ),
+    ]
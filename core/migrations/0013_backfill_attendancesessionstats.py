@@ -0,0 +1,62 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_session_stats(apps, schema_editor):
+    AttendanceSession = apps.get_model('core', 'AttendanceSession')
+    AttendanceSessionStats = apps.get_model('core', 'AttendanceSessionStats')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    SessionAttendance = apps.get_model('core', 'SessionAttendance')
+
+    expected = dict(
+        Enrollment.objects.filter(is_active=True)
+        .values('class_obj_id')
+        .annotate(n=Count('id'))
+        .values_list('class_obj_id', 'n')
+        .order_by()
+    )
+    sessions = AttendanceSession.objects.filter(live_stats__isnull=True).values_list(
+        'id', 'school_id', 'class_obj_id',
+    ).order_by('id')
+    # Each pass creates the rows of the sessions it read, so re-reading the
+    # first slice walks the whole backlog.
+    while True:
+        chunk = list(sessions[:1000])
+        if not chunk:
+            break
+        counts = {
+            row.pop('session_id'): row
+            for row in SessionAttendance.objects
+            .filter(session_id__in=[session_id for session_id, _, _ in chunk])
+            .values('session_id')
+            .annotate(
+                present_count=Count('id', filter=Q(status='present')),
+                late_count=Count('id', filter=Q(status='late')),
+                absent_count=Count('id', filter=Q(status='absent')),
+                excused_count=Count('id', filter=Q(status='excused')),
+            )
+            .order_by()
+        }
+        AttendanceSessionStats.objects.bulk_create(
+            [
+                AttendanceSessionStats(
+                    session_id=session_id,
+                    school_id=school_id,
+                    expected_count=expected.get(class_id, 0),
+                    **counts.get(session_id, {}),
+                )
+                for session_id, school_id, class_id in chunk
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_attendancesessionstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_session_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_backfill_attendancesessionstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sessionattendance',
+            name='marked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
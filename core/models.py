@@ -6,13 +6,16 @@ from django.core.validators import FileExtensionValidator
 import os
 import uuid
 import hashlib
+import hmac
 from datetime import timedelta
-from .managers import TenantAwareUserManager, TenantAwareManager, SimpleTenantAwareManager, DepartmentMembershipManager
+from .managers import TenantAwareUserManager, TenantAwareManager, SimpleTenantAwareManager, DepartmentMembershipManager, StudentComponentResultQuerySet
 from django.core.validators import RegexValidator
-from django.db import models, transaction
+from django.db import models, transaction, connection
 import secrets
 from datetime import date, datetime
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from .grading import GradeScale
 
 def school_logo_upload_path(instance, filename):
         ext = filename.split('.')[-1]
@@ -454,6 +457,91 @@ class StudentIndex(models.Model):
             self.school = self.class_obj.school
         super().save(*args, **kwargs)
 
+def _reserve_counter_block(model, key, count, seed, floor=0) -> int:
+    """
+    Add ``count`` to the ``last_value`` counter row identified by ``key`` in
+    one statement and return the first reserved value. A missing row is
+    created with INSERT ... ON CONFLICT, starting from ``seed()``.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    key_cols = [qn(col) for col in key]
+    key_vals = list(key.values())
+    where = " AND ".join(f"{col} = %s" for col in key_cols)
+    now = timezone.now()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET last_value = "
+            f"CASE WHEN last_value < %s THEN %s ELSE last_value END + %s, "
+            f"updated_at = %s WHERE {where} RETURNING last_value",
+            [floor, floor, count, now, *key_vals],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(key_cols)}, last_value, updated_at) "
+                f"VALUES ({', '.join(['%s'] * len(key_cols))}, %s, %s) "
+                f"ON CONFLICT ({', '.join(key_cols)}) DO UPDATE SET "
+                f"last_value = {table}.last_value + %s, updated_at = %s "
+                f"RETURNING last_value",
+                [*key_vals, max(seed(), floor) + count, now, count, now],
+            )
+            row = cursor.fetchone()
+
+    return row[0] - count + 1
+
+class ClassIndexSequence(models.Model):
+    """
+    Per-class counter for StudentIndex numbers. ``last_value`` is the last
+    number handed out; allocation bumps it in a single statement so
+    concurrent enrollments only contend on this one row.
+    """
+    class_obj = models.OneToOneField(
+        "Class", on_delete=models.CASCADE,
+        primary_key=True, related_name="index_sequence",
+    )
+    last_value = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "class_index_sequences"
+
+    def __str__(self):
+        return f"{self.class_obj_id}: {self.last_value}"
+
+    @classmethod
+    def _current_max(cls, class_obj) -> int:
+        from django.db.models import Max
+        from django.db.models.functions import Cast
+
+        current = StudentIndex.all_objects.filter(class_obj=class_obj).aggregate(
+            m=Max(Cast("index_number", models.IntegerField()))
+        )["m"]
+        return current or 0
+
+    @classmethod
+    def reserve(cls, class_obj, count: int = 1) -> int:
+        """
+        Atomically reserve ``count`` consecutive index numbers for the class
+        and return the first one. Never starts below ``index_start_from``.
+        """
+        return _reserve_counter_block(
+            cls, {"class_obj_id": class_obj.pk}, count,
+            seed=lambda: cls._current_max(class_obj),
+            floor=max(class_obj.index_start_from - 1, 0),
+        )
+
+    @classmethod
+    def bump_to(cls, class_obj, value: int) -> None:
+        """Make sure future allocations continue after a manually set number."""
+        cls.objects.filter(
+            class_obj=class_obj, last_value__lt=value,
+        ).update(last_value=value, updated_at=timezone.now())
+
 class User(AbstractUser):
     ROLE_CHOICES = [
         ('superadmin', 'Super Admin'),
@@ -680,8 +768,12 @@ class Class(models.Model):
 
     @property
     def next_index_preview(self):
-        last = self.student_indexes.order_by("-index_number").first()
-        next_num = int(last.index_number) + 1 if last else self.index_start_from
+        sequence = ClassIndexSequence.objects.filter(class_obj=self).first()
+        if sequence is not None:
+            last_num = sequence.last_value
+        else:
+            last_num = ClassIndexSequence._current_max(self)
+        next_num = max(last_num, self.index_start_from - 1) + 1
         return self.format_index(next_num)
 
     def save(self, *args, **kwargs):
@@ -906,8 +998,8 @@ class StudentComponentResult(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    objects = TenantAwareManager()
-    all_objects = models.Manager()
+    objects = TenantAwareManager.from_queryset(StudentComponentResultQuerySet)()
+    all_objects = models.Manager.from_queryset(StudentComponentResultQuerySet)()
 
     class Meta:
         db_table = 'student_component_results'
@@ -965,6 +1057,231 @@ class StudentComponentResult(models.Model):
         ).count()
         return current_attempts < self.component.max_retake_attempts
 
+class StudentSubjectStanding(models.Model):
+    """
+    Materialized per-(student, subject) standing.
+
+    Maintained by core.services.refresh_subject_standings whenever an exam
+    result or component attempt changes, and rebuilt in bulk by the
+    ``rebuild_subject_standings`` management command.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    school = models.ForeignKey(
+        'School', on_delete=models.CASCADE,
+        related_name='subject_standings',
+        null=True, blank=True,
+    )
+    student = models.ForeignKey(
+        'User', on_delete=models.CASCADE,
+        related_name='subject_standings',
+        limit_choices_to={'role': 'student'},
+    )
+    subject = models.ForeignKey(
+        Subject, on_delete=models.CASCADE,
+        related_name='standings',
+    )
+    class_obj = models.ForeignKey(
+        Class, on_delete=models.CASCADE,
+        related_name='subject_standings',
+    )
+    grading_mode = models.CharField(max_length=10, choices=GRADING_MODE_CHOICES, default='LEGACY')
+
+    exam_marks_obtained = models.DecimalField(
+        max_digits=9, decimal_places=2, default=0,
+        help_text='Sum of submitted exam result marks in this subject.',
+    )
+    exam_marks_possible = models.IntegerField(default=0)
+    exams_taken = models.PositiveIntegerField(default=0)
+
+    component_marks_obtained = models.DecimalField(
+        max_digits=9, decimal_places=2, default=0,
+        help_text='Sum of effective component attempt marks (POLICY only).',
+    )
+    component_marks_possible = models.IntegerField(default=0)
+    components_graded = models.PositiveIntegerField(default=0)
+    pending_components = models.PositiveIntegerField(default=0)
+
+    percentage = models.DecimalField(
+        max_digits=6, decimal_places=2, null=True, blank=True,
+        help_text='LEGACY: all exam marks / possible. POLICY: weighted percentage of graded components.',
+    )
+    final_exam_percentage = models.DecimalField(
+        max_digits=6, decimal_places=2, null=True, blank=True,
+    )
+    grade = models.CharField(max_length=5, blank=True)
+
+    is_complete = models.BooleanField(default=False)
+    is_passed = models.BooleanField(default=False)
+    reason = models.CharField(max_length=255, blank=True)
+    failed_critical = models.JSONField(default=list, blank=True)
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'student_subject_standings'
+        unique_together = ['student', 'subject']
+        indexes = [
+            models.Index(fields=['class_obj', 'student']),
+            models.Index(fields=['subject', 'is_passed']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.subject_id} ({self.percentage}%)"
+
+class ClassPerformanceSnapshot(models.Model):
+    """
+    Precomputed ClassPerformanceViewSet.summary payload for one class.
+
+    Rebuilt by the ``rebuild_class_performance_snapshot`` task, which is
+    scheduled (debounced) whenever results, component attempts, attendance
+    or enrollments in the class change.
+    """
+
+    class_obj = models.OneToOneField(
+        Class, on_delete=models.CASCADE,
+        primary_key=True, related_name='performance_snapshot',
+    )
+    school = models.ForeignKey(
+        'School', on_delete=models.CASCADE,
+        related_name='class_performance_snapshots',
+        null=True, blank=True,
+    )
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    rankings = models.JSONField(
+        default=list, encoder=DjangoJSONEncoder,
+        help_text='Ranked student rows, kept apart from the header so it can be deferred.',
+    )
+    computed_at = models.DateTimeField()
+    build_ms = models.PositiveIntegerField(default=0)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'class_performance_snapshots'
+
+    def __str__(self):
+        return f"{self.class_obj_id} @ {self.computed_at}"
+
+    @classmethod
+    def store(cls, class_obj, data, build_ms=0):
+        data = dict(data)
+        rankings = data.pop('all_students', [])
+        snapshot, _ = cls.all_objects.update_or_create(
+            class_obj=class_obj,
+            defaults={
+                'school_id': class_obj.school_id,
+                'data': data,
+                'rankings': rankings,
+                'computed_at': timezone.now(),
+                'build_ms': build_ms,
+            },
+        )
+        return snapshot
+
+    def as_payload(self):
+        return {**self.data, 'computed_at': self.computed_at}
+
+class SchoolDailyStats(models.Model):
+    """
+    Per-school, per-day rollup of exam results (by exam date) and attendance
+    (by session start date) behind the commandant dashboard.
+
+    Rows are rebuilt nightly by ``rollup_school_daily_stats``. Writes to
+    past days only flag the row ``is_dirty``; readers compute dirty days and
+    today live until the next rollup.
+    """
+
+    school = models.ForeignKey(
+        School, on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    date = models.DateField()
+
+    results_count = models.PositiveIntegerField(default=0)
+    marks_obtained = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    marks_possible = models.BigIntegerField(default=0)
+    pass_count = models.PositiveIntegerField(default=0)
+
+    sessions_count = models.PositiveIntegerField(default=0)
+    completed_sessions = models.PositiveIntegerField(default=0)
+    attendance_records = models.PositiveIntegerField(default=0)
+    present_count = models.PositiveIntegerField(default=0)
+
+    is_dirty = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'school_daily_stats'
+        unique_together = ['school', 'date']
+        indexes = [
+            models.Index(fields=['school', 'date']),
+            models.Index(fields=['is_dirty']),
+        ]
+
+    def __str__(self):
+        return f"{self.school_id} {self.date}"
+
+class ClassDailyStats(models.Model):
+    """
+    Per-class, per-subject, per-day rollup behind the bucketed performance
+    trends. ``subject`` is NULL for class-wide attendance sessions.
+
+    Percentages are stored as sums so rows add up into any week or month
+    bucket. Rebuilt alongside SchoolDailyStats, whose ``is_dirty`` flags
+    also mark these days for live computation.
+    """
+
+    school = models.ForeignKey(
+        School, on_delete=models.CASCADE,
+        related_name='class_daily_stats',
+    )
+    class_obj = models.ForeignKey(
+        'Class', on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    subject = models.ForeignKey(
+        'Subject', on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='daily_stats',
+    )
+    date = models.DateField()
+
+    exams_count = models.PositiveIntegerField(default=0)
+    exam_results_count = models.PositiveIntegerField(default=0)
+    exam_pct_sum = models.FloatField(default=0)
+    components_count = models.PositiveIntegerField(default=0)
+    component_results_count = models.PositiveIntegerField(default=0)
+    component_pct_sum = models.FloatField(default=0)
+
+    sessions_count = models.PositiveIntegerField(default=0)
+    attendance_records = models.PositiveIntegerField(default=0)
+    present_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'class_daily_stats'
+        indexes = [
+            models.Index(fields=['class_obj', 'date']),
+            models.Index(fields=['subject', 'date']),
+            models.Index(fields=['school', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.class_obj_id}/{self.subject_id} {self.date}"
+
 class Notice(models.Model):
 
     PRIORITY_CHOICES = [
@@ -1216,16 +1533,7 @@ class ExamResult(models.Model):
 
     @property
     def grade(self):
-        pct = self.percentage
-        if pct >= 91: return 'A'
-        if pct >= 86: return 'A-'
-        if pct >= 81: return 'B+'
-        if pct >= 76: return 'B'
-        if pct >= 71: return 'B-'
-        if pct >= 65: return 'C+'
-        if pct >= 60: return 'C'
-        if pct >= 50: return 'C-'
-        return 'F'
+        return GradeScale.for_school(self.school_id).classify(self.percentage)
     
 class Attendance(models.Model):
 
@@ -1500,24 +1808,31 @@ class AttendanceSession(models.Model):
             self.school = self.class_obj.school
         super().save(*args, **kwargs)
 
-    def generate_qr_token(self):
-        current_time = timezone.now()
-        time_window = int(current_time.timestamp() / self.qr_refresh_interval)
-        hash_input = f"{self.session_id}:{time_window}:{self.qr_code_secret}"
-        token = hashlib.sha256(hash_input.encode()).hexdigest()[:16]
-        self.qr_last_generated = current_time
-        self.qr_generation_count += 1
-        self.save(update_fields=['qr_last_generated', 'qr_generation_count'])
-        return token
+    def qr_time_window(self, at=None):
+        return int((at or timezone.now()).timestamp() // self.qr_refresh_interval)
+
+    def _qr_token_for_window(self, time_window):
+        message = f"{self.session_id}:{time_window}".encode()
+        return hmac.new(self.qr_code_secret.encode(), message, hashlib.sha256).hexdigest()[:16]
+
+    def generate_qr_token(self, at=None):
+        """
+        Token for the current QR window. Pure: the same session and window
+        always give the same token and nothing is written; displays are
+        counted separately by ``record_qr_generation``.
+        """
+        return self._qr_token_for_window(self.qr_time_window(at))
+
+    def qr_expires_in(self, at=None):
+        """Seconds until the current QR window, and so its token, rolls over."""
+        timestamp = (at or timezone.now()).timestamp()
+        return int(self.qr_refresh_interval - timestamp % self.qr_refresh_interval)
 
     def verify_qr_token(self, token, tolerance_windows=1):
-        current_time = timezone.now()
-        current_window = int(current_time.timestamp() / self.qr_refresh_interval)
+        current_window = self.qr_time_window()
         for offset in range(-tolerance_windows, tolerance_windows + 1):
-            time_window = current_window + offset
-            hash_input = f"{self.session_id}:{time_window}:{self.qr_code_secret}"
-            valid_token = hashlib.sha256(hash_input.encode()).hexdigest()[:16]
-            if token == valid_token:
+            valid_token = self._qr_token_for_window(current_window + offset)
+            if hmac.compare_digest(str(token), valid_token):
                 return True
         return False
 
@@ -1538,13 +1853,25 @@ class AttendanceSession(models.Model):
             return 'late'
         return 'absent'
 
+    @property
+    def stats(self):
+        """
+        The session's AttendanceSessionStats, or an unsaved row counted on
+        the fly for a session that has none yet.
+        """
+        try:
+            return self.live_stats
+        except AttendanceSessionStats.DoesNotExist:
+            from core.services import compute_session_stats
+            return compute_session_stats([self.pk]).get(self.pk) or AttendanceSessionStats(session_id=self.pk)
+
     @property
     def total_students(self):
-        return Enrollment.objects.filter(class_obj=self.class_obj, is_active=True).count()
+        return self.stats.expected_count
 
     @property
     def marked_count(self):
-        return self.session_attendances.count()
+        return self.stats.marked_count
 
     @property
     def attendance_percentage(self):
@@ -1579,7 +1906,7 @@ class SessionAttendance(models.Model):
     marked_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='attendances_marked_in_session')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='present')
     marking_method = models.CharField(max_length=20, choices=MARKING_METHOD_CHOICES)
-    marked_at = models.DateTimeField(auto_now_add=True)
+    marked_at = models.DateTimeField(default=timezone.now, editable=False)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     location_verified = models.BooleanField(default=False)
@@ -1712,6 +2039,60 @@ class BiometricRecord(models.Model):
         self.save()
         return attendance
 
+class AttendanceSessionStats(models.Model):
+    """
+    Per-status attendance counts and the expected (enrolled) headcount of
+    one session.
+
+    Maintained by core.services.refresh_session_stats whenever attendance
+    in the session or enrollment in its class changes, so session lists
+    and statistics read one row instead of counting.
+    """
+
+    session = models.OneToOneField(
+        AttendanceSession, on_delete=models.CASCADE,
+        primary_key=True, related_name='live_stats',
+    )
+    school = models.ForeignKey(
+        School, on_delete=models.CASCADE,
+        related_name='attendance_session_stats',
+        null=True, blank=True,
+    )
+    present_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    excused_count = models.PositiveIntegerField(default=0)
+    expected_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'attendance_session_stats'
+
+    def __str__(self):
+        return f"Stats for {self.session_id}"
+
+    @property
+    def marked_count(self):
+        return self.present_count + self.late_count + self.absent_count + self.excused_count
+
+    def as_dict(self):
+        marked = self.marked_count
+        expected = self.expected_count
+        return {
+            'present': self.present_count,
+            'late': self.late_count,
+            'absent': self.absent_count,
+            'excused': self.excused_count,
+            'marked': marked,
+            'expected': expected,
+            'unmarked': max(expected - marked, 0),
+            'attendance_rate': round(marked / expected * 100, 2) if expected else 0,
+            'on_time_rate': round(self.present_count / marked * 100, 2) if marked else 0,
+        }
+
 class AttendanceSessionLog(models.Model):
 
     ACTION_CHOICES = [
@@ -2011,14 +2392,19 @@ class Certificate(models.Model):
         super().save(*args, **kwargs)
 
     def _generate_number(self):
+        return Certificate.reserve_numbers(self.school, 1)[0]
+
+    @staticmethod
+    def reserve_numbers(school, count):
+        """Claim ``count`` consecutive certificate numbers for the school's current year."""
         import datetime as _dt
         year = _dt.date.today().year
-        school_code = self.school.code if self.school else 'GEN'
-        count = Certificate.all_objects.filter(
-            school=self.school,
-            issued_at__year=year,
-        ).count() + 1
-        return f"{school_code}/{year}/{count:04d}"
+        school_code = school.code if school else 'GEN'
+        first = CertificateNumberSequence.reserve(school_code, year, count)
+        return [
+            f"{school_code}/{year}/{n:04d}"
+            for n in range(first, first + count)
+        ]
 
     def _generate_verification_code(self):
 
@@ -2056,6 +2442,41 @@ class Certificate(models.Model):
     def verification_url(self):
         return f"/api/certificates/verify/{self.verification_code}/"
 
+class CertificateNumberSequence(models.Model):
+    """Per-(school code, year) counter behind Certificate.certificate_number."""
+
+    prefix = models.CharField(max_length=20)
+    year = models.PositiveIntegerField()
+    last_value = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'certificate_number_sequences'
+        unique_together = ['prefix', 'year']
+
+    def __str__(self):
+        return f"{self.prefix}/{self.year}: {self.last_value}"
+
+    @classmethod
+    def _current_max(cls, prefix, year) -> int:
+        stem = f"{prefix}/{year}/"
+        numbers = Certificate.all_objects.filter(
+            certificate_number__startswith=stem,
+        ).values_list('certificate_number', flat=True)
+        current = 0
+        for number in numbers:
+            suffix = number[len(stem):]
+            if suffix.isdigit():
+                current = max(current, int(suffix))
+        return current
+
+    @classmethod
+    def reserve(cls, prefix, year, count=1) -> int:
+        return _reserve_counter_block(
+            cls, {'prefix': prefix, 'year': year}, count,
+            seed=lambda: cls._current_max(prefix, year),
+        )
+
 class CertificateDownloadLog(models.Model):
 
     DOWNLOAD_TYPE_CHOICES = [
@@ -2126,6 +2547,180 @@ class CertificateDownloadLog(models.Model):
         db_table = 'certificate_download_logs'
         ordering = ['-downloaded_at']
 
+class CertificateIssuanceJob(models.Model):
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('completed_with_errors', 'Completed With Errors'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    school = models.ForeignKey(
+        School, on_delete=models.CASCADE,
+        related_name='certificate_jobs',
+        null=True, blank=True,
+    )
+    class_obj = models.ForeignKey(
+        Class, on_delete=models.CASCADE,
+        related_name='certificate_jobs',
+    )
+    template = models.ForeignKey(
+        CertificateTemplate, on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='issuance_jobs',
+    )
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='certificate_jobs_requested',
+    )
+    status = models.CharField(
+        max_length=30, choices=STATUS_CHOICES, default='pending',
+    )
+    total_students = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'certificate_issuance_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['class_obj', 'created_at']),
+            models.Index(fields=['school', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Certificate job {self.id} — {self.class_obj.name} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        if not self.school and self.class_obj:
+            self.school = self.class_obj.school
+        super().save(*args, **kwargs)
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'completed_with_errors', 'failed')
+
+class CertificateIssuanceJobItem(models.Model):
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending Render'),
+        ('rendered', 'Rendered'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+
+    job = models.ForeignKey(
+        CertificateIssuanceJob, on_delete=models.CASCADE,
+        related_name='items',
+    )
+    enrollment = models.ForeignKey(
+        Enrollment, on_delete=models.CASCADE,
+        related_name='certificate_job_items',
+    )
+    certificate = models.ForeignKey(
+        Certificate, on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='job_items',
+    )
+    student_svc_number = models.CharField(max_length=50, blank=True, default='')
+    student_name = models.CharField(max_length=300, blank=True, default='')
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending',
+    )
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'certificate_issuance_job_items'
+        ordering = ['job', 'student_svc_number']
+        indexes = [
+            models.Index(fields=['job', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_svc_number} ({self.status})"
+
+class ReportJob(models.Model):
+    """
+    A report endpoint run in the background via ``?async=1``.
+
+    The worker replays the original GET against the same view as the
+    requesting user and stores the response zlib-compressed in ``result``
+    (JSON payloads and file downloads alike) until ``expires_at``.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    school = models.ForeignKey(
+        School, on_delete=models.CASCADE,
+        related_name='report_jobs',
+        null=True, blank=True,
+    )
+    requested_by = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='report_jobs',
+    )
+    view = models.CharField(max_length=200)
+    action = models.CharField(max_length=100)
+    url = models.CharField(max_length=2000)
+    params = models.JSONField(default=dict, blank=True)
+    view_kwargs = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending',
+    )
+    progress = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+
+    result = models.BinaryField(null=True, blank=True, editable=False)
+    result_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    result_content_type = models.CharField(max_length=150, blank=True)
+    result_filename = models.CharField(max_length=255, blank=True)
+    result_size = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        db_table = 'report_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['requested_by', 'created_at']),
+            models.Index(fields=['status']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Report job {self.id} — {self.action} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+    @property
+    def is_json(self):
+        return self.result_content_type.startswith('application/json')
+
 class BiometricDevice(models.Model):
 
     STATUS_CHOICES = [
@@ -5,16 +5,14 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import (
-    Q, Count, Avg, Sum, Case, When, Value, F, FloatField, CharField,
-    Max, Min,
+    Q, Count, Avg, Case, When, Value, CharField,
 )
 from django.db import transaction
-from django.utils import timezone
 
 from .models import (
     User, School, Department, Course, Class, Subject,
     Enrollment, StudentIndex,
-    Exam, ExamResult, ExamReport, ExamReportRemark,
+    ExamResult, ExamReport, ExamReportRemark,
     AssessmentComponent, StudentComponentResult,
     Attendance, AttendanceSession, SessionAttendance,
     Certificate, Notice, SchoolMembership,
@@ -35,8 +33,10 @@ from .permissions import (
     IsAdminOrCommandant,
 )
 from .managers import get_current_school
-from django.db.models import ExpressionWrapper
 from collections import defaultdict
+from .services.oic_analytics import oic_overview, class_results_summary
+from .services.class_comparison import compare_classes_from_params
+from .services.report_jobs import async_report
 
 
 def _get_school(user):
@@ -238,163 +238,7 @@ class OICDashboardViewSet(viewsets.ViewSet):
 
             assigned_class_ids = _get_oic_class_ids(request=request)
 
-            my_remarks_count = OICRemark.all_objects.filter(
-                oic=user, school=school,
-            ).count()
-
-            if not assigned_class_ids:
-                return Response({
-                    'school': {
-                        'id': str(school.id),
-                        'name': school.name,
-                        'code': school.code,
-                    },
-                    'user_role': 'oic',
-                    'counts': {
-                        'assigned_classes': 0,
-                        'active_classes': 0,
-                        'total_enrollments': 0,
-                        'total_subjects': 0,
-                        'my_remarks': my_remarks_count,
-                        'pending_remarks': 0,
-                    },
-                    'attendance_summary': {
-                        'period': 'last_30_days',
-                        'total_sessions': 0,
-                        'completed_sessions': 0,
-                        'overall_attendance_rate': 0,
-                    },
-                    'exam_performance': {
-                        'total_results': 0,
-                        'average_performance': 0,
-                        'pass_rate': 0,
-                    },
-                    'pending_actions': {
-                        'reports_awaiting_your_remarks': 0,
-                    },
-                    'message': 'You have no classes assigned yet.',
-                })
-
-            classes_qs = Class.all_objects.filter(id__in=assigned_class_ids)
-            assigned_classes_count = classes_qs.count()
-
-            active_classes_count = classes_qs.filter(
-                is_active=True, is_closed=False,
-            ).count()
-
-            total_enrollments = Enrollment.all_objects.filter(
-                class_obj_id__in=assigned_class_ids,
-                is_active=True,
-            ).count()
-
-            total_subjects = Subject.all_objects.filter(
-                class_obj_id__in=assigned_class_ids,
-                is_active=True,
-            ).count()
-
-            results_qs = ExamResult.all_objects.filter(
-                exam__subject__class_obj_id__in=assigned_class_ids,
-                is_submitted=True,
-                marks_obtained__isnull=False,
-                exam__total_marks__gt=0,
-            )
-
-            result_agg = results_qs.aggregate(
-                result_count=Count('id'),
-                total_marks=Sum('marks_obtained'),
-                total_possible=Sum('exam__total_marks'),
-                pass_count=Count(
-                    'id',
-                    filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)
-                )
-            )
-
-            result_count = result_agg.get('result_count') or 0
-            total_marks = float(result_agg.get('total_marks') or 0)
-            total_possible = float(result_agg.get('total_possible') or 0)
-            pass_count = result_agg.get('pass_count') or 0
-
-            avg_performance = (
-                round((total_marks / total_possible) * 100, 2)
-                if total_possible > 0 else 0
-            )
-            pass_rate = (
-                round((pass_count / result_count) * 100, 2)
-                if result_count > 0 else 0
-            )
-
-        
-            thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-
-            recent_sessions_qs = AttendanceSession.all_objects.filter(
-                school=school,
-                class_obj_id__in=assigned_class_ids,
-                scheduled_start__gte=thirty_days_ago,
-            )
-
-            total_sessions = recent_sessions_qs.count()
-            completed_sessions = recent_sessions_qs.filter(
-                status='completed',
-            ).count()
-
-            att_agg = SessionAttendance.all_objects.filter(
-                session__school=school,
-                session__class_obj_id__in=assigned_class_ids,
-                session__scheduled_start__gte=thirty_days_ago,
-            ).aggregate(
-                total_records=Count('id'),
-                present_count=Count(
-                    'id',
-                    filter=Q(status__in=['present', 'late'])
-                ),
-            )
-
-            total_att_records = att_agg.get('total_records') or 0
-            present_count = att_agg.get('present_count') or 0
-
-            overall_attendance_rate = (
-                round((present_count / total_att_records) * 100, 2)
-                if total_att_records > 0 else 0
-            )
-
-            pending_remarks_count = ExamReport.all_objects.filter(
-                school=school,
-                class_obj_id__in=assigned_class_ids,
-            ).exclude(
-                remarks__author_role='oic',
-                remarks__author=user,
-            ).count()
-
-            return Response({
-                'school': {
-                    'id': str(school.id),
-                    'name': school.name,
-                    'code': school.code,
-                },
-                'user_role': 'oic',
-                'counts': {
-                    'assigned_classes': assigned_classes_count,
-                    'active_classes': active_classes_count,
-                    'total_enrollments': total_enrollments,
-                    'total_subjects': total_subjects,
-                    'my_remarks': my_remarks_count,
-                    'pending_remarks': pending_remarks_count,
-                },
-                'attendance_summary': {
-                    'period': 'last_30_days',
-                    'total_sessions': total_sessions,
-                    'completed_sessions': completed_sessions,
-                    'overall_attendance_rate': overall_attendance_rate,
-                },
-                'exam_performance': {
-                    'total_results': result_count,
-                    'average_performance': avg_performance,
-                    'pass_rate': pass_rate,
-                },
-                'pending_actions': {
-                    'reports_awaiting_your_remarks': pending_remarks_count,
-                },
-            })
+            return Response(oic_overview(user, school, assigned_class_ids))
 
         except Exception as e:
             import logging
@@ -485,135 +329,7 @@ class OICClassViewSet(viewsets.ReadOnlyModelViewSet):
         if class_obj.id not in _get_oic_class_ids(request):
             raise PermissionDenied("Not allowed")
 
-        subjects = Subject.all_objects.filter(
-            class_obj=class_obj,
-            is_active=True,
-        ).select_related('instructor')
-
-        base_results_qs = ExamResult.all_objects.filter(
-            exam__subject__class_obj=class_obj,
-            exam__subject__is_active=True,
-            is_submitted=True,
-            marks_obtained__isnull=False,
-            exam__total_marks__gt=0,
-        ).annotate(
-            percentage=ExpressionWrapper(
-                (F('marks_obtained') * 100.0) / F('exam__total_marks'),
-                output_field=FloatField()
-            )
-        )
-
-        subject_agg = (
-            base_results_qs
-            .values('exam__subject_id')
-            .annotate(
-                total_marks=Sum('marks_obtained'),
-                total_possible=Sum('exam__total_marks'),
-                result_count=Count('id'),
-                pass_count=Count(
-                    'id',
-                    filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)
-                )
-            )
-        )
-        agg_map = {row['exam__subject_id']: row for row in subject_agg}
-
-        exam_counts = (
-            Exam.objects.filter(
-                subject__class_obj=class_obj,
-                subject__is_active=True,
-                is_active=True,
-            )
-            .values('subject_id')
-            .annotate(exam_count=Count('id'))
-        )
-        exam_count_map = {row['subject_id']: row['exam_count'] for row in exam_counts}
-
-        minmax_agg = (
-            base_results_qs
-            .values('exam__subject_id')
-            .annotate(
-                max_pct=Max('percentage'),
-                min_pct=Min('percentage')
-            )
-        )
-        minmax_map = {row['exam__subject_id']: row for row in minmax_agg}
-
-        subject_performance = []
-
-        for subject in subjects:
-            agg = agg_map.get(subject.id)
-            mm = minmax_map.get(subject.id)
-
-            if not agg or agg['result_count'] == 0:
-                subject_performance.append({
-                    'subject_id': str(subject.id),
-                    'subject_name': subject.name,
-                    'instructor': subject.instructor.get_full_name() if subject.instructor else None,
-                    'total_exams': exam_count_map.get(subject.id, 0),
-                    'total_results': 0,
-                    'average_percentage': 0,
-                    'pass_rate': 0,
-                    'highest_score': 0,
-                    'lowest_score': 0,
-                })
-                continue
-
-            total_m = float(agg['total_marks'] or 0)
-            total_p = float(agg['total_possible'] or 0)
-
-            avg_pct = round((total_m / total_p) * 100, 2) if total_p > 0 else 0
-            pass_rate = round((agg['pass_count'] / agg['result_count']) * 100, 2)
-
-            subject_performance.append({
-                'subject_id': str(subject.id),
-                'subject_name': subject.name,
-                'instructor': subject.instructor.get_full_name() if subject.instructor else None,
-                'total_exams': exam_count_map.get(subject.id, 0),
-                'total_results': agg['result_count'],
-                'average_percentage': avg_pct,
-                'pass_rate': pass_rate,
-                'highest_score': round(mm['max_pct'], 2) if mm and mm['max_pct'] else 0,
-                'lowest_score': round(mm['min_pct'], 2) if mm and mm['min_pct'] else 0,
-            })
-
-        overall_agg = base_results_qs.aggregate(
-            total_marks=Sum('marks_obtained'),
-            total_possible=Sum('exam__total_marks'),
-            result_count=Count('id'),
-            pass_count=Count(
-                'id',
-                filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)
-            )
-        )
-
-        overall_count = overall_agg.get('result_count') or 0
-
-        if overall_count > 0:
-            total_m = float(overall_agg.get('total_marks') or 0)
-            total_p = float(overall_agg.get('total_possible') or 0)
-
-            overall_avg = round((total_m / total_p) * 100, 2) if total_p > 0 else 0
-            overall_pass_rate = round(
-                (overall_agg.get('pass_count') or 0) / overall_count * 100, 2
-            )
-        else:
-            overall_avg = 0
-            overall_pass_rate = 0
-
-        return Response({
-            'class': {
-                'id': str(class_obj.id),
-                'name': class_obj.name,
-                'course': class_obj.course.name,
-            },
-            'overall_statistics': {
-                'average_percentage': overall_avg,
-                'pass_rate': overall_pass_rate,
-                'total_results': overall_count,
-            },
-            'subject_performance': subject_performance,
-        })
+        return Response(class_results_summary(class_obj))
 
     @action(detail=True, methods=['get'])
     def attendance_summary(self, request, pk=None):
@@ -691,140 +407,78 @@ class OICComparisonViewSet(viewsets.ViewSet):
 
     permission_classes = [IsAuthenticated, IsOIC]
 
+    def _compare(self, request, default_ordering):
+        """
+        Comparison rows for the OIC's assigned classes, optionally narrowed
+        with ``?course_id=``, sorted and paged per the query params.
+        Returns ``(rows, meta, error_response)``.
+        """
+        class_ids = _get_oic_class_ids(request=request)
+        course_id = request.query_params.get('course_id')
+        if class_ids and course_id:
+            class_ids = list(
+                Class.all_objects.filter(id__in=class_ids, course_id=course_id)
+                .values_list('id', flat=True)
+            )
+        try:
+            rows, meta = compare_classes_from_params(
+                class_ids, request.query_params, default_ordering=default_ordering,
+            )
+        except ValueError as exc:
+            return None, None, Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return rows, meta, None
+
     @action(detail=False, methods=['get'])
     def performance(self, request):
-        assigned_class_ids = _get_oic_class_ids(request=request)
-
-        if not assigned_class_ids:
+        if not _get_oic_class_ids(request=request):
             return Response({'message': 'No classes assigned.', 'classes': []})
 
-        classes = Class.all_objects.filter(
-            id__in=assigned_class_ids,
-        ).select_related('course', 'instructor')
+        rows, meta, error = self._compare(request, '-average_percentage')
+        if error:
+            return error
 
-        results_by_class = (
-            ExamResult.all_objects.filter(
-                exam__subject__class_obj_id__in=assigned_class_ids,
-                is_submitted=True,
-                marks_obtained__isnull=False,
-                exam__total_marks__gt=0,
-            )
-            .annotate(
-                percentage=ExpressionWrapper(
-                    (F('marks_obtained') * 100.0) / F('exam__total_marks'),
-                    output_field=FloatField()
-                )
-            )
-            .values('exam__subject__class_obj_id')
-            .annotate(
-                total_marks=Sum('marks_obtained'),
-                total_possible=Sum('exam__total_marks'),
-                result_count=Count('id'),
-                pass_count=Count(
-                    'id',
-                    filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)
-                )
-            )
-        )
-        result_map = {row['exam__subject__class_obj_id']: row for row in results_by_class}
-
-        enrollment_by_class = (
-            Enrollment.all_objects.filter(
-                class_obj_id__in=assigned_class_ids,
-                is_active=True,
-            )
-            .values('class_obj_id')
-            .annotate(enrolled=Count('id'))
-        )
-        enrollment_map = {row['class_obj_id']: row['enrolled'] for row in enrollment_by_class}
-
-        comparison = []
-        for cls in classes:
-            rdata = result_map.get(cls.id)
-            enrolled = enrollment_map.get(cls.id, 0)
-
-            if rdata and rdata['result_count'] > 0:
-                total_m = float(rdata['total_marks'] or 0)
-                total_p = float(rdata['total_possible'] or 0)
-                avg_pct = round(total_m / total_p * 100, 2) if total_p > 0 else 0
-                pass_rate = round(rdata['pass_count'] / rdata['result_count'] * 100, 2)
-                total_results = rdata['result_count']
-            else:
-                avg_pct = 0
-                pass_rate = 0
-                total_results = 0
-
-            comparison.append({
-                'class_id': str(cls.id),
-                'class_name': cls.name,
-                'course_name': cls.course.name,
-                'instructor_name': cls.instructor.get_full_name() if cls.instructor else None,
-                'instructor_rank': cls.instructor.get_rank_display() if cls.instructor and cls.instructor.rank else None,
-                'instructor_svc_number': cls.instructor.svc_number if cls.instructor else None,
-                'enrolled_students': enrolled,
-                'total_results': total_results,
-                'average_percentage': avg_pct,
-                'pass_rate': pass_rate,
-            })
-
-        comparison.sort(key=lambda x: x['average_percentage'], reverse=True)
-        return Response({'total_classes': len(comparison), 'classes': comparison})
+        return Response({
+            **meta,
+            'classes': [
+                {
+                    'class_id': str(row['class_id']),
+                    'class_name': row['class_name'],
+                    'course_name': row['course'],
+                    'instructor_name': row['instructor'],
+                    'instructor_rank': row['instructor_rank'],
+                    'instructor_svc_number': row['instructor_svc_number'],
+                    'enrolled_students': row['enrolled_students'],
+                    'total_results': row['total_results'],
+                    'average_percentage': row['average_percentage'],
+                    'pass_rate': row['pass_rate'],
+                }
+                for row in rows
+            ],
+        })
 
     @action(detail=False, methods=['get'])
     def attendance(self, request):
-        assigned_class_ids = _get_oic_class_ids(request=request)
-
-        if not assigned_class_ids:
+        if not _get_oic_class_ids(request=request):
             return Response({'message': 'No classes assigned.', 'classes': []})
 
-        classes = Class.all_objects.filter(
-            id__in=assigned_class_ids,
-        ).select_related('course')
+        rows, meta, error = self._compare(request, '-attendance_rate')
+        if error:
+            return error
 
-        sessions_by_class = (
-            AttendanceSession.all_objects.filter(class_obj_id__in=assigned_class_ids)
-            .values('class_obj_id')
-            .annotate(session_count=Count('id'))
-        )
-        session_map = {row['class_obj_id']: row['session_count'] for row in sessions_by_class}
-
-        enrollment_by_class = (
-            Enrollment.all_objects.filter(class_obj_id__in=assigned_class_ids, is_active=True)
-            .values('class_obj_id')
-            .annotate(enrolled=Count('id'))
-        )
-        enrollment_map = {row['class_obj_id']: row['enrolled'] for row in enrollment_by_class}
-
-        att_by_class = (
-            SessionAttendance.all_objects.filter(session__class_obj_id__in=assigned_class_ids)
-            .values('session__class_obj_id')
-            .annotate(
-                total_records=Count('id'),
-                present_count=Count('id', filter=Q(status__in=['present', 'late'])),
-            )
-        )
-        att_map = {row['session__class_obj_id']: row for row in att_by_class}
-
-        comparison = []
-        for cls in classes:
-            total_sessions = session_map.get(cls.id, 0)
-            enrolled = enrollment_map.get(cls.id, 0)
-            att = att_map.get(cls.id, {'total_records': 0, 'present_count': 0})
-            total_records = att['total_records']
-            present = att['present_count']
-            rate = round(present / total_records * 100, 2) if total_records > 0 else 0
-
-            comparison.append({
-                'class_id': str(cls.id),
-                'class_name': cls.name,
-                'course_name': cls.course.name,
-                'enrolled_students': enrolled,
-                'total_sessions': total_sessions,
-                'attendance_rate': rate,
-            })
-
-        comparison.sort(key=lambda x: x['attendance_rate'], reverse=True)
-        return Response({'total_classes': len(comparison), 'classes': comparison})
+        return Response({
+            **meta,
+            'classes': [
+                {
+                    'class_id': str(row['class_id']),
+                    'class_name': row['class_name'],
+                    'course_name': row['course'],
+                    'enrolled_students': row['enrolled_students'],
+                    'total_sessions': row['total_sessions'],
+                    'attendance_rate': row['attendance_rate'],
+                }
+                for row in rows
+            ],
+        })
 
 
 class OICExamReportViewSet(viewsets.ReadOnlyModelViewSet):
@@ -850,6 +504,7 @@ class OICExamReportViewSet(viewsets.ReadOnlyModelViewSet):
         ).prefetch_related('remarks', 'exams')
 
     @action(detail=True, methods=['get'])
+    @async_report
     def detailed(self, request, pk=None):
         report = self.get_object()
         school = _get_school(request.user)
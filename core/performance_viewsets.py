@@ -4,35 +4,40 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from django.db.models import (
     Avg, Count, Q, F, Sum, Max, Min,
-    FloatField, CharField, Case, When, Value,
-    Subquery, OuterRef,
+    FloatField,
 )
 from django.utils import timezone
-from django.core.cache import cache
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.text import slugify
 from datetime import timedelta
+import logging
+import tempfile
+import time
+
+import numpy as np
 
 from .models import (
     Exam, ExamResult, Subject, Class, Enrollment, User,
     Attendance, AttendanceSession, SessionAttendance,
-    AssessmentComponent, StudentComponentResult,
+    AssessmentComponent, StudentComponentResult, ClassPerformanceSnapshot,
 )
 from .serializers import (
     ExamSerializer, ExamResultSerializer, SubjectSerializer, EnrollmentSerializer,
 )
 from .permissions import IsAdminOrInstructor, IsAdminOrCommandant
-from .models import OICAssignment
+from .services import get_subject_standings
+from .grading import GradeScale
+from .caching import single_flight, single_flight_cached
+from .services.class_comparison import compare_classes_from_params
+from .services.trends import BUCKETS as TREND_BUCKETS, trend_series, trend_series_summary
+from .services.report_export import class_report_sections, iter_csv, write_xlsx
+from .services.report_jobs import async_report
+from .views import PageSizeAwarePagination
+from .models import OICAssignment, Course
+from . import analytics
 
-def _calculate_grade(percentage):
-    if percentage >= 91: return 'A'
-    if percentage >= 86: return 'A-'
-    if percentage >= 81: return 'B+'
-    if percentage >= 76: return 'B'
-    if percentage >= 71: return 'B-'
-    if percentage >= 65: return 'C+'
-    if percentage >= 60: return 'C'
-    if percentage >= 50: return 'C-'
-    return 'F'
 
+logger = logging.getLogger(__name__)
 
 def _interpret_correlation(correlation):
     abs_corr = abs(correlation)
@@ -45,22 +50,15 @@ def _interpret_correlation(correlation):
 
 PCT_EXPR = F('marks_obtained') * 100.0 / F('exam__total_marks')
 
-GRADE_BUCKET_EXPR = Case(
-    When(marks_obtained__gte=F('exam__total_marks') * 0.91, then=Value('A')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.86, then=Value('A-')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.81, then=Value('B+')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.76, then=Value('B')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.71, then=Value('B-')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.65, then=Value('C+')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.60, then=Value('C')),
-    When(marks_obtained__gte=F('exam__total_marks') * 0.50, then=Value('C-')),
-    default=Value('F'),
-    output_field=CharField(),
-)
-
-def _grade_distribution_sql(result_qs):
-    rows = result_qs.annotate(gb=GRADE_BUCKET_EXPR).values('gb').annotate(c=Count('id'))
-    dist = {'A': 0, 'A-': 0, 'B+': 0, 'B': 0, 'B-': 0, 'C+': 0, 'C': 0, 'C-': 0, 'F': 0}
+def _grade_distribution_sql(result_qs, grade_scale):
+    rows = (
+        result_qs
+        .annotate(gb=grade_scale.sql_case_marks())
+        .values('gb')
+        .annotate(c=Count('id'))
+        .order_by()
+    )
+    dist = grade_scale.empty_distribution()
     for r in rows:
         if r['gb'] in dist:
             dist[r['gb']] = r['c']
@@ -77,18 +75,6 @@ def _student_exam_map(result_qs):
     return {r['student_id']: r for r in rows}
 
 
-def _student_subject_exam_map(result_qs):
-    rows = result_qs.values('student_id', 'exam__subject_id').annotate(
-        total_marks=Sum('marks_obtained'),
-        total_possible=Sum('exam__total_marks'),
-        exams_taken=Count('id'),
-    )
-    out = {}
-    for r in rows:
-        out.setdefault(r['student_id'], {})[r['exam__subject_id']] = r
-    return out
-
-
 def _student_att_map(att_qs):
     rows = att_qs.values('student_id').annotate(
         attended=Count('id'),
@@ -126,45 +112,32 @@ def _get_policy_subject_stats(policy_subjects):
     subject_stats = {}
     student_marks = {}
 
-    for subj in policy_subjects:
-        latest_ids = list(
-            StudentComponentResult.all_objects
-            .filter(
-                component__subject=subj,
-                component__is_active=True,
-                is_submitted=True,
-                marks_obtained__isnull=False,
-                attempt_number=Subquery(
-                    StudentComponentResult.all_objects.filter(
-                        student_id=OuterRef('student_id'),
-                        component_id=OuterRef('component_id'),
-                        is_submitted=True,
-                        marks_obtained__isnull=False,
-                    ).order_by('-attempt_number').values('attempt_number')[:1]
-                ),
-            )
-            .values_list('id', flat=True)
-        )
-        comp_rows = list(
-            StudentComponentResult.all_objects
-            .filter(id__in=latest_ids)
-            .values('student_id', 'component__weight', 'percentage',
-                    'marks_obtained', 'component__total_marks')
+    comp_rows = (
+        StudentComponentResult.all_objects
+        .filter(
+            component__subject__in=policy_subjects,
+            component__is_active=True,
         )
+        .effective()
+        .values('student_id', 'component__subject_id', 'component__weight',
+                'percentage', 'marks_obtained', 'component__total_marks')
+    )
 
-        student_wdata = {}
-        for r in comp_rows:
-            s_id = r['student_id']
-            if s_id not in student_wdata:
-                student_wdata[s_id] = {'ws': 0.0, 'wt': 0.0, 'marks': 0.0, 'possible': 0.0}
-            w = float(r['component__weight'] or 0)
-            student_wdata[s_id]['ws'] += float(r['percentage'] or 0) * w
-            student_wdata[s_id]['wt'] += w
-            student_wdata[s_id]['marks'] += float(r['marks_obtained'] or 0)
-            student_wdata[s_id]['possible'] += float(r['component__total_marks'] or 0)
+    wdata_by_subject = {subj.id: {} for subj in policy_subjects}
+    for r in comp_rows:
+        student_wdata = wdata_by_subject[r['component__subject_id']]
+        s_id = r['student_id']
+        if s_id not in student_wdata:
+            student_wdata[s_id] = {'ws': 0.0, 'wt': 0.0, 'marks': 0.0, 'possible': 0.0}
+        w = float(r['component__weight'] or 0)
+        student_wdata[s_id]['ws'] += float(r['percentage'] or 0) * w
+        student_wdata[s_id]['wt'] += w
+        student_wdata[s_id]['marks'] += float(r['marks_obtained'] or 0)
+        student_wdata[s_id]['possible'] += float(r['component__total_marks'] or 0)
 
+    for subj in policy_subjects:
         student_pcts = []
-        for s_id, wdata in student_wdata.items():
+        for s_id, wdata in wdata_by_subject[subj.id].items():
             if wdata['wt'] > 0:
                 pct = wdata['ws'] / wdata['wt']
                 if s_id not in student_marks:
@@ -188,6 +161,39 @@ def _get_policy_subject_stats(policy_subjects):
     return subject_stats, student_marks
 
 
+def _effective_component_aggregates(component_ids):
+    if not component_ids:
+        return {}
+    rows = (
+        StudentComponentResult.all_objects
+        .filter(component_id__in=component_ids)
+        .effective()
+        .values('component_id')
+        .annotate(avg_pct=Avg('percentage'), cnt=Count('id'))
+    )
+    return {r['component_id']: r for r in rows}
+
+
+def _policy_subject_stats_from_standings(policy_subjects, standings):
+
+    pcts_by_subject = {subj.id: [] for subj in policy_subjects}
+    for (_, subject_id), st in standings.items():
+        if subject_id in pcts_by_subject and st.components_graded and st.percentage is not None:
+            pcts_by_subject[subject_id].append(float(st.percentage))
+
+    subject_stats = {}
+    for subject_id, student_pcts in pcts_by_subject.items():
+        n = len(student_pcts)
+        subject_stats[subject_id] = {
+            'avg': (sum(student_pcts) / n) if n else 0,
+            'pass_rate': (sum(1 for p in student_pcts if p >= 50) / n * 100) if n else 0,
+            'highest': max(student_pcts, default=0),
+            'lowest': min(student_pcts, default=0),
+            'student_count': n,
+        }
+    return subject_stats
+
+
 def _get_school_from_request(request):
     return getattr(request, 'school', None)
 
@@ -247,11 +253,6 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             return Response({'error': 'subject_id parameter is required'}, status=400)
 
         school = _get_school_from_request(request)
-        cache_key = f'subj_perf:{subject_id}:{school.id if school else "all"}'
-        cached = cache.get(cache_key)
-        if cached:
-            return Response(cached)
-
         try:
             qs = Subject.objects.select_related('instructor', 'class_obj', 'class_obj__course')
             if school:
@@ -268,6 +269,12 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 status=403,
             )
 
+        return Response(self._subject_summary(subject))
+
+    @single_flight_cached(lambda self, subject: f'subj_perf:{subject.id}', timeout=120)
+    def _subject_summary(self, subject):
+        class_obj = subject.class_obj
+        grade_scale = GradeScale.for_school(class_obj.school_id)
         enrollments = Enrollment.objects.filter(
             class_obj=class_obj, is_active=True
         ).select_related('student')
@@ -297,7 +304,7 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         actual_att = att_qs.count()
         att_rate_overall = (actual_att / expected_att * 100) if expected_att else 0
 
-        grade_dist = _grade_distribution_sql(results_qs)
+        grade_dist = _grade_distribution_sql(results_qs, grade_scale)
 
         exam_map = _student_exam_map(results_qs)
         att_map_data = _student_att_map(att_qs)
@@ -336,7 +343,7 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 'attendance_rate': round(ar, 2),
                 'punctuality_rate': round(pr, 2),
                 'combined_score': round(combined, 2),
-                'performance_grade': _calculate_grade(combined),
+                'performance_grade': grade_scale.classify(combined),
             })
 
         students.sort(key=lambda x: x['combined_score'], reverse=True)
@@ -392,29 +399,14 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 subject=subject, is_active=True,
             ).order_by('sort_order', 'name')
 
-            # UUID PKs can't use MAX(); match on max attempt_number per (student, component)
-            latest_result_ids = list(
+            effective_results = (
                 StudentComponentResult.all_objects
-                .filter(
-                    component__subject=subject,
-                    component__is_active=True,
-                    is_submitted=True,
-                    marks_obtained__isnull=False,
-                    attempt_number=Subquery(
-                        StudentComponentResult.all_objects.filter(
-                            student_id=OuterRef('student_id'),
-                            component_id=OuterRef('component_id'),
-                            is_submitted=True,
-                            marks_obtained__isnull=False,
-                        ).order_by('-attempt_number').values('attempt_number')[:1]
-                    ),
-                )
-                .values_list('id', flat=True)
+                .filter(component__subject=subject, component__is_active=True)
+                .effective()
             )
 
             comp_stats = (
-                StudentComponentResult.all_objects
-                .filter(id__in=latest_result_ids)
+                effective_results
                 .values('component_id')
                 .annotate(
                     total_count=Count('id'),
@@ -448,8 +440,7 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 })
 
             comp_rows = list(
-                StudentComponentResult.all_objects
-                .filter(id__in=latest_result_ids)
+                effective_results
                 .values('student_id', 'component__weight', 'percentage')
             )
 
@@ -470,13 +461,13 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 student_weighted[sid]['weighted_sum'] += float(r['percentage'] or 0) * w
                 student_weighted[sid]['total_weight'] += w
 
-            policy_grade_dist = {'A': 0, 'A-': 0, 'B+': 0, 'B': 0, 'B-': 0, 'C+': 0, 'C': 0, 'C-': 0, 'F': 0}
+            policy_grade_dist = grade_scale.empty_distribution()
             policy_students = []
             for sid, wdata in student_weighted.items():
                 if wdata['total_weight'] == 0:
                     continue
                 weighted_avg = wdata['weighted_sum'] / wdata['total_weight']
-                grade = _calculate_grade(weighted_avg)
+                grade = grade_scale.classify(weighted_avg)
                 policy_grade_dist[grade] = policy_grade_dist.get(grade, 0) + 1
                 sinfo = student_info.get(sid, {})
                 policy_students.append({
@@ -526,8 +517,7 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             'session_breakdown': session_breakdown,
         }
 
-        cache.set(cache_key, data, timeout=120)
-        return Response(data)
+        return data
 
     @action(detail=False, methods=['get'])
     def compare_subjects(self, request):
@@ -536,11 +526,6 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             return Response({'error': 'class_id parameter is required'}, status=400)
 
         school = _get_school_from_request(request)
-        cache_key = f'compare_subj:{class_id}:{school.id if school else "all"}'
-        cached = cache.get(cache_key)
-        if cached:
-            return Response(cached)
-
         try:
             qs = Class.objects.select_related('course')
             if school:
@@ -552,6 +537,10 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         if not self._has_class_access(request, class_obj):
             return Response({'error': 'You do not have permission to view this class.'}, status=403)
 
+        return Response(self._compare_subjects(class_obj))
+
+    @single_flight_cached(lambda self, class_obj: f'compare_subj:{class_obj.id}', timeout=120)
+    def _compare_subjects(self, class_obj):
         subjects = Subject.objects.filter(class_obj=class_obj, is_active=True).select_related('instructor')
         enrolled = Enrollment.objects.filter(class_obj=class_obj, is_active=True).count()
 
@@ -641,15 +630,18 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             'total_subjects': len(comparison),
             'subjects': comparison,
         }
-        cache.set(cache_key, data, timeout=120)
-        return Response(data)
+        return data
 
     @action(detail=False, methods=['get'])
+    @async_report
     def trend_analysis(self, request):
         subject_id = request.query_params.get('subject_id')
         days = int(request.query_params.get('days', 90))
+        bucket = request.query_params.get('bucket')
         if not subject_id:
             return Response({'error': 'subject_id parameter is required'}, status=400)
+        if bucket and bucket not in TREND_BUCKETS:
+            return Response({'error': f'bucket must be one of: {", ".join(TREND_BUCKETS)}'}, status=400)
 
         school = _get_school_from_request(request)
         try:
@@ -666,6 +658,28 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         cutoff = timezone.now().date() - timedelta(days=days)
         enrolled = Enrollment.objects.filter(class_obj=subject.class_obj, is_active=True).count()
 
+        if bucket:
+            today = timezone.now().date()
+            points = trend_series(
+                subject.class_obj, subject=subject, kind=bucket,
+                date_from=cutoff, date_to=today, enrolled=enrolled,
+            )
+            return Response({
+                'subject': {
+                    'id': subject.id,
+                    'name': subject.name,
+                    'code': getattr(subject, 'subject_code', getattr(subject, 'code', subject.name)),
+                },
+                'period': {
+                    'start_date': cutoff,
+                    'end_date': today,
+                    'days': days,
+                },
+                'bucket': bucket,
+                'summary': trend_series_summary(points, enrolled),
+                'trend': points,
+            })
+
         exam_trend = (
             ExamResult.objects
             .filter(
@@ -686,7 +700,7 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         } for e in exam_trend]
 
         if subject.grading_mode == 'POLICY':
-            component_exams = (
+            component_exams = list(
                 Exam.objects
                 .filter(
                     subject=subject,
@@ -697,28 +711,12 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 .select_related('component')
                 .order_by('exam_date')
             )
+            comp_aggs = _effective_component_aggregates(
+                {e.component_id for e in component_exams}
+            )
             for comp_exam in component_exams:
-                latest_ids = list(
-                    StudentComponentResult.all_objects
-                    .filter(
-                        component=comp_exam.component,
-                        is_submitted=True,
-                        marks_obtained__isnull=False,
-                        attempt_number=Subquery(
-                            StudentComponentResult.all_objects.filter(
-                                student_id=OuterRef('student_id'),
-                                component_id=OuterRef('component_id'),
-                                is_submitted=True,
-                                marks_obtained__isnull=False,
-                            ).order_by('-attempt_number').values('attempt_number')[:1]
-                        ),
-                    )
-                    .values_list('id', flat=True)
-                )
-                agg = StudentComponentResult.all_objects.filter(
-                    id__in=latest_ids
-                ).aggregate(avg_pct=Avg('percentage'), cnt=Count('id'))
-                if agg['cnt']:
+                agg = comp_aggs.get(comp_exam.component_id)
+                if agg:
                     trend.append({
                         'date': comp_exam.exam_date,
                         'type': 'exam',
@@ -760,250 +758,366 @@ class SubjectPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             'trend': trend,
         })
 
+def build_class_performance_summary(class_obj):
+    """
+    Full class performance report: overall statistics, grade distribution,
+    student rankings and per-subject breakdown. Stored as a
+    ClassPerformanceSnapshot and served by ClassPerformanceViewSet.summary.
+    """
+    grade_scale = GradeScale.for_school(class_obj.school_id)
+    enrollments = Enrollment.objects.filter(
+        class_obj=class_obj, is_active=True
+    ).select_related('student')
+    total_students = enrollments.count()
+    subjects = list(
+        Subject.objects.filter(class_obj=class_obj, is_active=True).select_related('instructor')
+    )
+
+    results_qs = ExamResult.objects.filter(
+        exam__subject__class_obj=class_obj, is_submitted=True, marks_obtained__isnull=False,
+    )
+    att_qs = SessionAttendance.objects.filter(session__class_obj=class_obj)
+
+    ov = results_qs.aggregate(
+        tm=Sum('marks_obtained'),
+        tp=Sum('exam__total_marks'),
+        tc=Count('id'),
+        pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
+    )
+    _tm = float(ov['tm'] or 0)
+    _tp = ov['tp'] or 0
+    _tc = ov['tc'] or 0
+    _pc = ov['pc'] or 0
+    class_avg = (_tm / _tp * 100) if _tp else 0
+    pass_rate = (_pc / _tc * 100) if _tc else 0
+
+
+    total_sessions = AttendanceSession.objects.filter(class_obj=class_obj).count()
+    expected_att = total_students * total_sessions
+    actual_att = att_qs.count()
+    class_att_rate = (actual_att / expected_att * 100) if expected_att else 0
+
+
+    grade_dist = _grade_distribution_sql(results_qs, grade_scale)
+
+    enrollments = list(enrollments)
+    standings = get_subject_standings(
+        class_obj, [e.student_id for e in enrollments], subjects=subjects,
+    )
+    att_map_data = _student_att_map(att_qs)
+    subj_att_data = _student_subject_att_map(att_qs)
+    ssc = _subject_session_counts(class_obj)
+
+    policy_subj_stats = _policy_subject_stats_from_standings(
+        [s for s in subjects if s.grading_mode == 'POLICY'], standings,
+    )
+
+    rankings = []
+    for enr in enrollments:
+        sid = enr.student_id
+        s = enr.student
+        ad = att_map_data.get(sid, {})
+        exams_taken = 0
+
+        attended = ad.get('attended', 0)
+        ar = (attended / total_sessions * 100) if total_sessions else 0
+
+        ssa = subj_att_data.get(sid, {})
+        sb = []
+        for subj in subjects:
+            sa = ssa.get(subj.id, {})
+            ssess = ssc.get(subj.id, 0)
+            satt = sa.get('attended', 0)
+            sar = (satt / ssess * 100) if ssess else 0
+
+            st = standings.get((sid, subj.id))
+            stm, spct = 0, 0
+            if st is not None:
+                exams_taken += st.exams_taken
+                if subj.grading_mode == 'POLICY':
+                    stm = float(st.component_marks_obtained)
+                else:
+                    stm = float(st.exam_marks_obtained)
+                spct = float(st.percentage) if st.percentage is not None else 0
+
+            if stm > 0 or satt > 0:
+             
+                sb.append({
+                    'subject_name': subj.name,
+                    'subject_code': getattr(subj, 'subject_code', getattr(subj, 'code', subj.name)),
+                    'marks_obtained': round(spct, 2),
+                    'total_possible': 100.0,
+                    'exam_percentage': round(spct, 2),
+                    'attendance_rate': round(sar, 2),
+                    'combined_score': round(float(spct) * 0.7 + float(sar) * 0.3, 2),
+                })
+
+      
+        total_marks_obtained = round(sum(item['marks_obtained'] for item in sb), 2)
+        total_marks_possible = float(len(sb) * 100)
+        ep = (total_marks_obtained / total_marks_possible * 100) if total_marks_possible else 0
+        combined = float(ep) * 0.7 + float(ar) * 0.3
+
+        rankings.append({
+            'student_id': s.id,
+            'student_name': s.get_full_name(),
+            'svc_number': getattr(s, 'svc_number', None),
+            'total_exams_taken': exams_taken,
+            'total_marks_obtained': total_marks_obtained,
+            'total_marks_possible': total_marks_possible,
+            'exam_percentage': round(ep, 2),
+            'total_sessions': total_sessions,
+            'sessions_attended': attended,
+            'attendance_rate': round(ar, 2),
+            'combined_score': round(combined, 2),
+            'overall_grade': grade_scale.classify(ep),
+            'subject_breakdown': sb,
+        })
+
+    rankings.sort(key=lambda x: x['combined_score'], reverse=True)
+    for i, r in enumerate(rankings, 1):
+        r['rank'] = i
+
+    subj_exam_agg = results_qs.values('exam__subject_id').annotate(
+        tm=Sum('marks_obtained'),
+        tp=Sum('exam__total_marks'),
+        rc=Count('id'),
+        pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
+        highest=Max(PCT_EXPR, output_field=FloatField()),
+        lowest=Min(PCT_EXPR, output_field=FloatField()),
+    )
+    sea_map = {r['exam__subject_id']: r for r in subj_exam_agg}
+
+    subj_att_agg = att_qs.values('session__subject_id').annotate(actual=Count('id'))
+    saa_map = {r['session__subject_id']: r['actual'] for r in subj_att_agg}
+
+    exam_counts = dict(
+        Exam.objects.filter(subject__class_obj=class_obj, is_active=True)
+        .values('subject_id').annotate(n=Count('id'))
+        .values_list('subject_id', 'n')
+    )
+
+    subject_perf = []
+    for subj in subjects:
+        sc = ssc.get(subj.id, 0)
+        sexp = total_students * sc
+        sact = saa_map.get(subj.id, 0)
+        sar = (sact / sexp * 100) if sexp else 0
+
+        if subj.grading_mode == 'POLICY':
+            ps = policy_subj_stats.get(subj.id, {})
+            savg = ps.get('avg', 0)
+            spr = ps.get('pass_rate', 0)
+            src = ps.get('student_count', 0)
+            highest = ps.get('highest', 0)
+            lowest = ps.get('lowest', 0)
+        else:
+            es = sea_map.get(subj.id, {})
+            stm = float(es.get('tm', 0) or 0)
+            stp = es.get('tp', 0) or 0
+            src = es.get('rc', 0)
+            spc = es.get('pc', 0)
+            savg = (stm / stp * 100) if stp else 0
+            spr = (spc / src * 100) if src else 0
+            highest = float(es.get('highest') or 0)
+            lowest = float(es.get('lowest') or 0)
+
+        subject_perf.append({
+            'subject_id': subj.id,
+            'subject_name': subj.name,
+            'subject_code': getattr(subj, 'subject_code', getattr(subj, 'code', subj.name)),
+            'instructor': subj.instructor.get_full_name() if subj.instructor else None,
+            'total_exams': exam_counts.get(subj.id, 0),
+            'results_count': src,
+            'exam_average': round(savg, 2),
+            'pass_rate': round(spr, 2),
+            'highest_score': round(highest, 2),
+            'lowest_score': round(lowest, 2),
+            'total_sessions': sc,
+            'attendance_rate': round(sar, 2),
+            'combined_performance': round(float(savg) * 0.7 + float(sar) * 0.3, 2),
+        })
+    subject_perf.sort(key=lambda x: x['combined_performance'], reverse=True)
+
+    data = {
+        'class': {
+            'id': class_obj.id,
+            'name': class_obj.name,
+            'course': class_obj.course.name if hasattr(class_obj, 'course') and class_obj.course else None,
+            'instructor': class_obj.instructor.get_full_name() if hasattr(class_obj, 'instructor') and class_obj.instructor else None,
+        },
+        'overall_statistics': {
+            'total_students': total_students,
+            'total_subjects': len(subjects),
+            'total_exams': sum(exam_counts.values()),
+            'total_results_submitted': _tc,
+            'class_exam_average': round(class_avg, 2),
+            'exam_pass_rate': round(pass_rate, 2),
+            'total_sessions': total_sessions,
+            'expected_attendances': expected_att,
+            'actual_attendances': actual_att,
+            'class_attendance_rate': round(class_att_rate, 2),
+            'overall_performance': round(float(class_avg) * 0.7 + float(class_att_rate) * 0.3, 2),
+        },
+        'grade_distribution': grade_dist,
+
+        'top_performers': rankings[:3],
+        'all_students': rankings,
+        'subject_performance': subject_perf,
+    }
+
+    return data
+
+
 class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
     permission_classes = [IsAnalyticsViewer]
 
-    @action(detail=False, methods=['get'])
-    def summary(self, request):
+    RANKING_FIELDS = (
+        'rank', 'student_id', 'student_name', 'svc_number',
+        'total_exams_taken', 'total_marks_obtained', 'total_marks_possible',
+        'exam_percentage', 'total_sessions', 'sessions_attended',
+        'attendance_rate', 'combined_score', 'overall_grade', 'subject_breakdown',
+    )
+    RANKING_ORDERING = (
+        'rank', 'student_name', 'svc_number', 'total_exams_taken',
+        'exam_percentage', 'attendance_rate', 'combined_score',
+    )
+
+    def _get_class(self, request):
         class_id = request.query_params.get('class_id')
         if not class_id:
-            return Response({'error': 'class_id parameter is required'}, status=400)
+            return None, Response({'error': 'class_id parameter is required'}, status=400)
 
         school = _get_school_from_request(request)
-        cache_key = f'class_perf_v2:{class_id}:{school.id if school else "all"}'
-        cached = cache.get(cache_key)
-        if cached:
-            return Response(cached)
-
         try:
             qs = Class.objects.select_related('course', 'instructor')
             if school:
                 qs = qs.filter(school=school)
             class_obj = qs.get(id=class_id, is_active=True)
-        except Class.DoesNotExist:
-            return Response({'error': 'Class Not found'}, status=404)
+        except (Class.DoesNotExist, ValueError):
+            return None, Response({'error': 'Class Not found'}, status=404)
 
         if not self._has_class_access(request, class_obj):
-            return Response(
+            return None, Response(
                 {'error': 'You do not have permission to view this class.'},
                 status=403,
             )
+        return class_obj, None
+
+    def _get_snapshot(self, request, class_obj, with_rankings=False):
+        """
+        Stored performance snapshot for the class. Built on demand when none
+        exists yet; ``?fresh=1`` forces a rebuild.
+        """
+        def _rebuild():
+            started = time.monotonic()
+            data = build_class_performance_summary(class_obj)
+            return ClassPerformanceSnapshot.store(
+                class_obj, data, build_ms=int((time.monotonic() - started) * 1000),
+            )
+
+        if request.query_params.get('fresh', '').lower() in ('1', 'true'):
+            return _rebuild()
 
+        qs = ClassPerformanceSnapshot.all_objects.filter(class_obj=class_obj)
+        if not with_rankings:
+            qs = qs.defer('rankings')
+        snapshot = qs.first()
+        if snapshot is not None:
+            return snapshot
+        # No snapshot yet: let one request build it while the rest wait.
+        return single_flight(f'class_perf_cold:{class_obj.id}', _rebuild, timeout=30)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Class header: overall statistics, grade distribution, top three and
+        per-subject performance. The full student list lives under
+        ``rankings``; pass ``?include=all_students`` to inline it.
+        """
+        class_obj, error = self._get_class(request)
+        if error is not None:
+            return error
+
+        include = set(filter(None, request.query_params.get('include', '').split(',')))
         try:
-            return self._compute_summary(request, class_obj, cache_key)
+            snapshot = self._get_snapshot(
+                request, class_obj, with_rankings='all_students' in include,
+            )
         except Exception as exc:
-            import logging
-            logging.getLogger(__name__).error(
+            logger.error(
                 'ClassPerformanceViewSet.summary failed for class %s: %s',
-                class_id, exc, exc_info=True,
+                class_obj.id, exc, exc_info=True,
             )
             return Response(
                 {'error': 'Failed to compute class performance summary. Please try again.'},
                 status=500,
             )
 
-    def _compute_summary(self, request, class_obj, cache_key):
-        enrollments = Enrollment.objects.filter(
-            class_obj=class_obj, is_active=True
-        ).select_related('student')
-        total_students = enrollments.count()
-        subjects = list(
-            Subject.objects.filter(class_obj=class_obj, is_active=True).select_related('instructor')
-        )
-
-        results_qs = ExamResult.objects.filter(
-            exam__subject__class_obj=class_obj, is_submitted=True, marks_obtained__isnull=False,
-        )
-        att_qs = SessionAttendance.objects.filter(session__class_obj=class_obj)
-
-        ov = results_qs.aggregate(
-            tm=Sum('marks_obtained'),
-            tp=Sum('exam__total_marks'),
-            tc=Count('id'),
-            pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
-        )
-        _tm = float(ov['tm'] or 0)
-        _tp = ov['tp'] or 0
-        _tc = ov['tc'] or 0
-        _pc = ov['pc'] or 0
-        class_avg = (_tm / _tp * 100) if _tp else 0
-        pass_rate = (_pc / _tc * 100) if _tc else 0
-
+        payload = snapshot.as_payload()
+        if 'all_students' in include:
+            payload['all_students'] = snapshot.rankings
+        return Response(payload)
 
-        total_sessions = AttendanceSession.objects.filter(class_obj=class_obj).count()
-        expected_att = total_students * total_sessions
-        actual_att = att_qs.count()
-        class_att_rate = (actual_att / expected_att * 100) if expected_att else 0
-
-
-        grade_dist = _grade_distribution_sql(results_qs)
-
-        exam_map = _student_exam_map(results_qs)
-        att_map_data = _student_att_map(att_qs)
-        subj_exam_data = _student_subject_exam_map(results_qs)
-        subj_att_data = _student_subject_att_map(att_qs)
-        ssc = _subject_session_counts(class_obj)
-
-        policy_subjects_list = [s for s in subjects if s.grading_mode == 'POLICY']
-        policy_subj_stats, policy_student_marks = (
-            _get_policy_subject_stats(policy_subjects_list)
-            if policy_subjects_list else ({}, {})
-        )
-
-        rankings = []
-        for enr in enrollments:
-            sid = enr.student_id
-            s = enr.student
-            ed = exam_map.get(sid, {})
-            ad = att_map_data.get(sid, {})
-
-            policy_sid_data = policy_student_marks.get(sid, {})
-
-            attended = ad.get('attended', 0)
-            ar = (attended / total_sessions * 100) if total_sessions else 0
-
-            sse = subj_exam_data.get(sid, {})
-            ssa = subj_att_data.get(sid, {})
-            sb = []
-            for subj in subjects:
-                sa = ssa.get(subj.id, {})
-                ssess = ssc.get(subj.id, 0)
-                satt = sa.get('attended', 0)
-                sar = (satt / ssess * 100) if ssess else 0
-
-                if subj.grading_mode == 'POLICY':
-                    ps_data = policy_sid_data.get(subj.id, {})
-                    stm = ps_data.get('marks', 0)
-                    stp = ps_data.get('possible', 0)
-                    spct = ps_data.get('pct', 0)
-                else:
-                    se = sse.get(subj.id, {})
-                    stm = float(se.get('total_marks', 0) or 0)
-                    stp = se.get('total_possible', 0) or 0
-                    spct = (stm / stp * 100) if stp else 0
-
-                if stm > 0 or satt > 0:
-                 
-                    sb.append({
-                        'subject_name': subj.name,
-                        'subject_code': getattr(subj, 'subject_code', getattr(subj, 'code', subj.name)),
-                        'marks_obtained': round(spct, 2),
-                        'total_possible': 100.0,
-                        'exam_percentage': round(spct, 2),
-                        'attendance_rate': round(sar, 2),
-                        'combined_score': round(float(spct) * 0.7 + float(sar) * 0.3, 2),
-                    })
-
-          
-            total_marks_obtained = round(sum(item['marks_obtained'] for item in sb), 2)
-            total_marks_possible = float(len(sb) * 100)
-            ep = (total_marks_obtained / total_marks_possible * 100) if total_marks_possible else 0
-            combined = float(ep) * 0.7 + float(ar) * 0.3
-
-            rankings.append({
-                'student_id': s.id,
-                'student_name': s.get_full_name(),
-                'svc_number': getattr(s, 'svc_number', None),
-                'total_exams_taken': ed.get('exams_taken', 0),
-                'total_marks_obtained': total_marks_obtained,
-                'total_marks_possible': total_marks_possible,
-                'exam_percentage': round(ep, 2),
-                'total_sessions': total_sessions,
-                'sessions_attended': attended,
-                'attendance_rate': round(ar, 2),
-                'combined_score': round(combined, 2),
-                'overall_grade': _calculate_grade(ep),
-                'subject_breakdown': sb,
-            })
-
-        rankings.sort(key=lambda x: x['combined_score'], reverse=True)
-        for i, r in enumerate(rankings, 1):
-            r['rank'] = i
-
-        subj_exam_agg = results_qs.values('exam__subject_id').annotate(
-            tm=Sum('marks_obtained'),
-            tp=Sum('exam__total_marks'),
-            rc=Count('id'),
-            pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
-            highest=Max(PCT_EXPR, output_field=FloatField()),
-            lowest=Min(PCT_EXPR, output_field=FloatField()),
-        )
-        sea_map = {r['exam__subject_id']: r for r in subj_exam_agg}
+    @action(detail=False, methods=['get'])
+    def rankings(self, request):
+        """
+        Paginated student rankings from the class snapshot.
+
+        Query params: ``ordering`` (one of RANKING_ORDERING, ``-`` prefix for
+        descending; default ``rank``), ``fields`` (comma-separated subset of
+        RANKING_FIELDS), ``page`` and ``page_size``.
+        """
+        class_obj, error = self._get_class(request)
+        if error is not None:
+            return error
+
+        ordering = request.query_params.get('ordering', 'rank')
+        descending = ordering.startswith('-')
+        order_field = ordering.lstrip('-')
+        if order_field not in self.RANKING_ORDERING:
+            return Response(
+                {'error': f'ordering must be one of: {", ".join(self.RANKING_ORDERING)}'},
+                status=400,
+            )
 
-        subj_att_agg = att_qs.values('session__subject_id').annotate(actual=Count('id'))
-        saa_map = {r['session__subject_id']: r['actual'] for r in subj_att_agg}
+        fields = [f for f in request.query_params.get('fields', '').split(',') if f]
+        unknown = set(fields) - set(self.RANKING_FIELDS)
+        if unknown:
+            return Response(
+                {'error': f'Unknown fields: {", ".join(sorted(unknown))}'},
+                status=400,
+            )
 
-        subject_perf = []
-        for subj in subjects:
-            sc = ssc.get(subj.id, 0)
-            sexp = total_students * sc
-            sact = saa_map.get(subj.id, 0)
-            sar = (sact / sexp * 100) if sexp else 0
+        try:
+            snapshot = self._get_snapshot(request, class_obj, with_rankings=True)
+        except Exception as exc:
+            logger.error(
+                'ClassPerformanceViewSet.rankings failed for class %s: %s',
+                class_obj.id, exc, exc_info=True,
+            )
+            return Response(
+                {'error': 'Failed to compute class rankings. Please try again.'},
+                status=500,
+            )
 
-            if subj.grading_mode == 'POLICY':
-                ps = policy_subj_stats.get(subj.id, {})
-                savg = ps.get('avg', 0)
-                spr = ps.get('pass_rate', 0)
-                src = ps.get('student_count', 0)
-                highest = ps.get('highest', 0)
-                lowest = ps.get('lowest', 0)
+        rows = snapshot.rankings
+        if order_field != 'rank' or descending:
+            if order_field in ('student_name', 'svc_number'):
+                sort_key = lambda r: (r.get(order_field) or '').lower()
             else:
-                es = sea_map.get(subj.id, {})
-                stm = float(es.get('tm', 0) or 0)
-                stp = es.get('tp', 0) or 0
-                src = es.get('rc', 0)
-                spc = es.get('pc', 0)
-                savg = (stm / stp * 100) if stp else 0
-                spr = (spc / src * 100) if src else 0
-                highest = float(es.get('highest') or 0)
-                lowest = float(es.get('lowest') or 0)
-
-            subject_perf.append({
-                'subject_id': subj.id,
-                'subject_name': subj.name,
-                'subject_code': getattr(subj, 'subject_code', getattr(subj, 'code', subj.name)),
-                'instructor': subj.instructor.get_full_name() if subj.instructor else None,
-                'total_exams': Exam.objects.filter(subject=subj, is_active=True).count(),
-                'results_count': src,
-                'exam_average': round(savg, 2),
-                'pass_rate': round(spr, 2),
-                'highest_score': round(highest, 2),
-                'lowest_score': round(lowest, 2),
-                'total_sessions': sc,
-                'attendance_rate': round(sar, 2),
-                'combined_performance': round(float(savg) * 0.7 + float(sar) * 0.3, 2),
-            })
-        subject_perf.sort(key=lambda x: x['combined_performance'], reverse=True)
-
-        data = {
-            'class': {
-                'id': class_obj.id,
-                'name': class_obj.name,
-                'course': class_obj.course.name if hasattr(class_obj, 'course') and class_obj.course else None,
-                'instructor': class_obj.instructor.get_full_name() if hasattr(class_obj, 'instructor') and class_obj.instructor else None,
-            },
-            'overall_statistics': {
-                'total_students': total_students,
-                'total_subjects': len(subjects),
-                'total_exams': Exam.objects.filter(subject__class_obj=class_obj, is_active=True).count(),
-                'total_results_submitted': _tc,
-                'class_exam_average': round(class_avg, 2),
-                'exam_pass_rate': round(pass_rate, 2),
-                'total_sessions': total_sessions,
-                'expected_attendances': expected_att,
-                'actual_attendances': actual_att,
-                'class_attendance_rate': round(class_att_rate, 2),
-                'overall_performance': round(float(class_avg) * 0.7 + float(class_att_rate) * 0.3, 2),
-            },
-            'grade_distribution': grade_dist,
+                sort_key = lambda r: r.get(order_field) or 0
+            rows = sorted(rows, key=sort_key, reverse=descending)
 
-            'top_performers': rankings[:3],
-            'all_students': rankings,
-            'subject_performance': subject_perf,
-        }
+        paginator = PageSizeAwarePagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        if fields:
+            page = [{f: row.get(f) for f in fields} for row in page]
 
-        cache.set(cache_key, data, timeout=120)
-        return Response(data)
+        response = paginator.get_paginated_response(page)
+        response.data['computed_at'] = snapshot.computed_at
+        response.data['ordering'] = ordering
+        return response
 
     @action(detail=False, methods=['get'])
     def top_performers(self, request):
@@ -1024,6 +1138,8 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         if not self._has_class_access(request, class_obj):
             return Response({'error': 'You do not have permission to view this class.'}, status=403)
 
+        grade_scale = GradeScale.for_school(class_obj.school_id)
+
         enrollments = Enrollment.objects.filter(
             class_obj=class_obj, is_active=True,
         ).select_related('student')
@@ -1056,7 +1172,7 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
                 'exam_percentage': round(ep, 2),
                 'attendance_rate': round(ar, 2),
                 'combined_score': round(combined, 2),
-                'overall_grade': _calculate_grade(ep),
+                'overall_grade': grade_scale.classify(ep),
             })
 
         performers.sort(key=lambda x: x['combined_score'], reverse=True)
@@ -1070,6 +1186,7 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @async_report
     def compare_classes(self, request):
 
         user_role = getattr(request.user, 'active_role', None) or request.user.role
@@ -1083,139 +1200,121 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
 
         course_id = request.query_params.get('course_id')
         class_ids = request.query_params.get('class_ids', '')
+        include_inactive = request.query_params.get('include_inactive') in ('1', 'true')
 
         if course_id:
-            qs = Class.objects.filter(course_id=course_id, is_active=True)
+            qs = Class.objects.filter(course_id=course_id)
         elif class_ids:
             ids = [i.strip() for i in class_ids.split(',') if i.strip()]
-            qs = Class.objects.filter(id__in=ids, is_active=True)
+            qs = Class.objects.filter(id__in=ids)
         else:
-            qs = Class.objects.filter(is_active=True)
+            qs = Class.objects.all()
 
+        if not include_inactive:
+            qs = qs.filter(is_active=True)
         if school:
             qs = qs.filter(school=school)
-        classes = list(qs.select_related('course', 'instructor'))
-
-        if not classes:
-            return Response({'total_classes': 0, 'classes': []})
 
-        class_id_list = [cls.id for cls in classes]
-
-        enrollment_counts = {
-            row['class_obj_id']: row['cnt']
-            for row in Enrollment.objects.filter(
-                class_obj_id__in=class_id_list, is_active=True,
-            ).values('class_obj_id').annotate(cnt=Count('id'))
-        }
-
-        exam_aggs = {
-            row['class_id']: row
-            for row in ExamResult.objects.filter(
-                exam__subject__class_obj_id__in=class_id_list,
-                is_submitted=True, marks_obtained__isnull=False,
-            ).values(class_id=F('exam__subject__class_obj_id')).annotate(
-                tm=Sum('marks_obtained'),
-                tp=Sum('exam__total_marks'),
-                tc=Count('id'),
-                pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
+        try:
+            rows, meta = compare_classes_from_params(
+                qs.values_list('id', flat=True),
+                request.query_params,
+                aliases={
+                    'total_students': 'enrolled_students',
+                    'attendance_rate': 'expected_attendance_rate',
+                },
             )
-        }
-
-        session_counts = {
-            row['class_obj_id']: row['cnt']
-            for row in AttendanceSession.objects.filter(
-                class_obj_id__in=class_id_list,
-            ).values('class_obj_id').annotate(cnt=Count('id'))
-        }
-
-        attendance_counts = {
-            row['class_id']: row['cnt']
-            for row in SessionAttendance.objects.filter(
-                session__class_obj_id__in=class_id_list,
-            ).values(class_id=F('session__class_obj_id')).annotate(cnt=Count('id'))
-        }
-
-        comparison = []
-        for cls in classes:
-            cid = cls.id
-            enrolled = enrollment_counts.get(cid, 0)
-            agg = exam_aggs.get(cid, {})
-            _tm = float(agg.get('tm') or 0)
-            _tp = agg.get('tp') or 0
-            _tc = agg.get('tc') or 0
-            _pc = agg.get('pc') or 0
-            avg = (_tm / _tp * 100) if _tp else 0
-            pr = (_pc / _tc * 100) if _tc else 0
-
-            ts = session_counts.get(cid, 0)
-            act = attendance_counts.get(cid, 0)
-            exp = enrolled * ts
-            ar = (act / exp * 100) if exp else 0
-
-            comparison.append({
-                'class_id': cid,
-                'class_name': cls.name,
-                'course': cls.course.name if cls.course else None,
-                'instructor': cls.instructor.get_full_name() if cls.instructor else None,
-                'total_students': enrolled,
-                'total_results': _tc,
-                'average_percentage': round(avg, 2),
-                'pass_rate': round(pr, 2),
-                'attendance_rate': round(ar, 2),
-                'combined_performance': round(float(avg) * 0.7 + float(ar) * 0.3, 2),
-            })
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
 
-        comparison.sort(key=lambda x: x.get('average_percentage', 0), reverse=True)
         return Response({
-            'total_classes': len(comparison),
-            'classes': comparison,
+            **meta,
+            'classes': [
+                {
+                    'class_id': row['class_id'],
+                    'class_name': row['class_name'],
+                    'course': row['course'],
+                    'instructor': row['instructor'],
+                    'total_students': row['enrolled_students'],
+                    'total_results': row['total_results'],
+                    'average_percentage': row['average_percentage'],
+                    'pass_rate': row['pass_rate'],
+                    'attendance_rate': row['expected_attendance_rate'],
+                    'combined_performance': row['combined_performance'],
+                }
+                for row in rows
+            ],
         })
 
     @action(detail=False, methods=['get'])
+    @async_report
     def export_report(self, request):
-        class_id = request.query_params.get('class_id')
-        report_format = request.query_params.get('format', 'summary')
+        """
+        Download the class performance report built from the class
+        snapshot: overview, grade distribution, subject performance and
+        student rankings.
+
+        Query params: ``output`` (``csv``, streamed, or ``xlsx``, written
+        through a write-only workbook; default ``csv``) and ``report``
+        (``summary`` or ``detailed``, which adds one row per student and
+        subject).
+        """
+        output = request.query_params.get('output', 'csv').lower()
+        report_type = request.query_params.get('report', 'summary').lower()
+        if output not in ('csv', 'xlsx'):
+            return Response({'error': 'output must be csv or xlsx'}, status=400)
+        if report_type not in ('summary', 'detailed'):
+            return Response({'error': 'report must be summary or detailed'}, status=400)
+
+        class_obj, error = self._get_class(request)
+        if error is not None:
+            return error
 
-        if not class_id:
-            return Response({'error': 'class_id parameter is required'}, status=400)
-
-        school = _get_school_from_request(request)
         try:
-            qs = Class.objects.select_related('instructor')
-            if school:
-                qs = qs.filter(school=school)
-            class_obj = qs.get(id=class_id, is_active=True)
-        except Class.DoesNotExist:
-            return Response({'error': 'Class Not found'}, status=404)
-
-        if not self._has_class_access(request, class_obj):
-            return Response({'error': 'You do not have permission to view this class.'}, status=403)
+            snapshot = self._get_snapshot(request, class_obj, with_rankings=True)
+        except Exception as exc:
+            logger.error(
+                'ClassPerformanceViewSet.export_report failed for class %s: %s',
+                class_obj.id, exc, exc_info=True,
+            )
+            return Response(
+                {'error': 'Failed to compute class performance report. Please try again.'},
+                status=500,
+            )
 
-        summary_response = self.summary(request)
+        sections = class_report_sections(snapshot, detailed=report_type == 'detailed')
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'class_report_{slugify(class_obj.name) or class_obj.id}_{timestamp}.{output}'
+
+        if output == 'xlsx':
+            tmp = tempfile.TemporaryFile()
+            try:
+                write_xlsx(sections, tmp)
+            except ImportError:
+                tmp.close()
+                return Response({'error': 'XLSX export is not available on this server.'}, status=400)
+            tmp.seek(0)
+            return FileResponse(
+                tmp,
+                as_attachment=True,
+                filename=filename,
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
 
-        if report_format == 'detailed':
-            return Response({
-                **summary_response.data,
-                'report_generated_at': timezone.now(),
-                'report_type': 'detailed',
-            })
-        else:
-            return Response({
-                'class': summary_response.data.get('class'),
-                'overall_statistics': summary_response.data.get('overall_statistics'),
-                'grade_distribution': summary_response.data.get('grade_distribution'),
-                'top_performers': summary_response.data.get('top_performers'),
-                'subject_performance': summary_response.data.get('subject_performance'),
-                'report_generated_at': timezone.now(),
-                'report_type': 'summary',
-            })
+        response = StreamingHttpResponse(iter_csv(sections), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
     @action(detail=False, methods=['get'])
+    @async_report
     def trend_analysis(self, request):
         class_id = request.query_params.get('class_id')
         days = int(request.query_params.get('days', 90))
+        bucket = request.query_params.get('bucket')
         if not class_id:
             return Response({'error': 'class_id parameter is required'}, status=400)
+        if bucket and bucket not in TREND_BUCKETS:
+            return Response({'error': f'bucket must be one of: {", ".join(TREND_BUCKETS)}'}, status=400)
 
         school = _get_school_from_request(request)
         try:
@@ -1232,6 +1331,27 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         cutoff = timezone.now().date() - timedelta(days=days)
         enrolled = Enrollment.objects.filter(class_obj=class_obj, is_active=True).count()
 
+        if bucket:
+            today = timezone.now().date()
+            points = trend_series(
+                class_obj, kind=bucket, date_from=cutoff, date_to=today, enrolled=enrolled,
+            )
+            return Response({
+                'class': {
+                    'id': class_obj.id,
+                    'name': class_obj.name,
+                    'course': class_obj.course.name if hasattr(class_obj, 'course') else None,
+                },
+                'period': {
+                    'start_date': cutoff,
+                    'end_date': today,
+                    'days': days,
+                },
+                'bucket': bucket,
+                'summary': trend_series_summary(points, enrolled),
+                'trend': points,
+            })
+
         exam_trend = (
             ExamResult.objects
             .filter(
@@ -1253,53 +1373,35 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             'participation_rate': round((e['cnt'] / enrolled * 100), 2) if enrolled else 0,
         } for e in exam_trend]
 
-        policy_subjects = Subject.objects.filter(
-            class_obj=class_obj, is_active=True, grading_mode='POLICY'
-        )
-        for policy_subj in policy_subjects:
-            component_exams = (
-                Exam.objects
-                .filter(
-                    subject=policy_subj,
-                    component__isnull=False,
-                    is_active=True,
-                    exam_date__gte=cutoff,
-                )
-                .select_related('component', 'subject')
-                .order_by('exam_date')
+        component_exams = list(
+            Exam.objects
+            .filter(
+                subject__class_obj=class_obj,
+                subject__is_active=True,
+                subject__grading_mode='POLICY',
+                component__isnull=False,
+                is_active=True,
+                exam_date__gte=cutoff,
             )
-            for comp_exam in component_exams:
-                latest_ids = list(
-                    StudentComponentResult.all_objects
-                    .filter(
-                        component=comp_exam.component,
-                        is_submitted=True,
-                        marks_obtained__isnull=False,
-                        attempt_number=Subquery(
-                            StudentComponentResult.all_objects.filter(
-                                student_id=OuterRef('student_id'),
-                                component_id=OuterRef('component_id'),
-                                is_submitted=True,
-                                marks_obtained__isnull=False,
-                            ).order_by('-attempt_number').values('attempt_number')[:1]
-                        ),
-                    )
-                    .values_list('id', flat=True)
-                )
-                agg = StudentComponentResult.all_objects.filter(id__in=latest_ids).aggregate(
-                    avg_pct=Avg('percentage'), cnt=Count('id')
-                )
-                if agg['cnt']:
-                    trend.append({
-                        'date': comp_exam.exam_date,
-                        'type': 'exam',
-                        'exam_title': comp_exam.title,
-                        'subject': policy_subj.name,
-                        'exam_type': comp_exam.exam_type,
-                        'average_percentage': round(float(agg['avg_pct'] or 0), 2),
-                        'students_attempted': agg['cnt'],
-                        'participation_rate': round((agg['cnt'] / enrolled * 100), 2) if enrolled else 0,
-                    })
+            .select_related('component', 'subject')
+            .order_by('exam_date')
+        )
+        comp_aggs = _effective_component_aggregates(
+            {e.component_id for e in component_exams}
+        )
+        for comp_exam in component_exams:
+            agg = comp_aggs.get(comp_exam.component_id)
+            if agg:
+                trend.append({
+                    'date': comp_exam.exam_date,
+                    'type': 'exam',
+                    'exam_title': comp_exam.title,
+                    'subject': comp_exam.subject.name,
+                    'exam_type': comp_exam.exam_type,
+                    'average_percentage': round(float(agg['avg_pct'] or 0), 2),
+                    'students_attempted': agg['cnt'],
+                    'participation_rate': round((agg['cnt'] / enrolled * 100), 2) if enrolled else 0,
+                })
 
         sess_att = (
             SessionAttendance.objects
@@ -1355,6 +1457,7 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @async_report
     def attendance_correlation(self, request):
         class_id = request.query_params.get('class_id')
         if not class_id:
@@ -1411,21 +1514,11 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
         n = len(correlation_data)
         correlation = 0
         if n >= 2:
-            x_vals = [d['attendance_rate'] for d in correlation_data]
-            y_vals = [d['exam_percentage'] for d in correlation_data]
-
-            sum_x = sum(x_vals)
-            sum_y = sum(y_vals)
-            sum_xy = sum(a * e for a, e in zip(x_vals, y_vals))
-            sum_x2 = sum(a ** 2 for a in x_vals)
-            sum_y2 = sum(e ** 2 for e in y_vals)
-
-            numerator = (n * sum_xy) - (sum_x * sum_y)
-            denom_a = (n * sum_x2) - (sum_x ** 2)
-            denom_b = (n * sum_y2) - (sum_y ** 2)
-            denominator = (denom_a * denom_b) ** 0.5
-
-            correlation = round(numerator / denominator, 4) if denominator != 0 else 0
+            r = analytics.pearson(
+                [d['attendance_rate'] for d in correlation_data],
+                [d['exam_percentage'] for d in correlation_data],
+            )
+            correlation = round(r, 4) if r is not None else 0
 
         return Response({
             'class': {
@@ -1438,4 +1531,177 @@ class ClassPerformanceViewSet(_ClassAccessMixin, viewsets.ViewSet):
             'data_points': n,
             'total_sessions': total_sessions,
             'correlation_data': correlation_data,
-        })
\ No newline at end of file
+        })
+
+class PerformanceStatisticsViewSet(_ClassAccessMixin, viewsets.ViewSet):
+    """
+    Cross-student statistics over a class, a course or the whole school,
+    computed on the NumPy feature matrix from core.analytics.
+
+    Scope params: ``scope=class&class_id=``, ``scope=course&course_id=`` or
+    ``scope=school``. Course and school scopes are limited to school-wide
+    roles.
+    """
+    permission_classes = [IsAnalyticsViewer]
+
+    SCHOOL_WIDE_ROLES = ('superadmin', 'admin', 'commandant', 'chief_instructor')
+    FEATURE_GROUPS = ('attendance_rate', 'late_rate', 'exam_percentage', 'subjects', 'components')
+
+    def _resolve_scope(self, request):
+        scope = request.query_params.get('scope', 'class')
+        school = _get_school_from_request(request)
+        user = request.user
+        user_role = getattr(user, 'active_role', None) or user.role
+
+        if scope == 'class':
+            class_id = request.query_params.get('class_id')
+            if not class_id:
+                return None, None, Response({'error': 'class_id parameter is required'}, status=400)
+            qs = Class.objects.all()
+            if school:
+                qs = qs.filter(school=school)
+            class_obj = qs.filter(id=class_id, is_active=True).first() if class_id.isdigit() else None
+            if class_obj is None:
+                return None, None, Response({'error': 'Class not found'}, status=404)
+            if not self._has_class_access(request, class_obj):
+                return None, None, Response({'error': 'You do not have permission to view this class.'}, status=403)
+            return [class_obj.id], {'scope': 'class', 'id': class_obj.id, 'name': class_obj.name}, None
+
+        if scope not in ('course', 'school'):
+            return None, None, Response({'error': 'scope must be class, course or school'}, status=400)
+        if user_role not in self.SCHOOL_WIDE_ROLES:
+            return None, None, Response(
+                {'error': f'You do not have permission to view {scope}-wide statistics.'},
+                status=403,
+            )
+        if school is None:
+            return None, None, Response({'error': 'No school context found.'}, status=400)
+
+        classes = Class.objects.filter(school=school, is_active=True)
+        if scope == 'course':
+            course_id = request.query_params.get('course_id')
+            if not course_id:
+                return None, None, Response({'error': 'course_id parameter is required'}, status=400)
+            course = Course.objects.filter(school=school, id=course_id).first() if course_id.isdigit() else None
+            if course is None:
+                return None, None, Response({'error': 'Course not found'}, status=404)
+            classes = classes.filter(course=course)
+            info = {'scope': 'course', 'id': course.id, 'name': course.name}
+        else:
+            info = {'scope': 'school', 'id': str(school.id), 'name': school.name}
+        return list(classes.values_list('id', flat=True)), info, None
+
+    @staticmethod
+    @single_flight_cached(
+        lambda info, class_ids, subjects, components: (
+            f"perf_stats:{info['scope']}:{info['id']}:{int(subjects)}{int(components)}"
+        ),
+        timeout=300,
+    )
+    def _features(info, class_ids, subjects, components):
+        return analytics.build_feature_matrix(
+            class_ids, include_subjects=subjects, include_components=components,
+        )
+
+    @action(detail=False, methods=['get'])
+    @async_report
+    def correlations(self, request):
+        """
+        Correlation matrix between per-student features.
+
+        ``features``: comma-separated subset of attendance_rate, late_rate,
+        exam_percentage, subjects, components (default: the first three,
+        plus subjects for a single class).
+        """
+        class_ids, info, error = self._resolve_scope(request)
+        if error is not None:
+            return error
+
+        default = 'attendance_rate,late_rate,exam_percentage'
+        if info['scope'] == 'class':
+            default += ',subjects'
+        groups = [g for g in request.query_params.get('features', default).split(',') if g]
+        unknown = set(groups) - set(self.FEATURE_GROUPS)
+        if unknown:
+            return Response({'error': f'Unknown features: {", ".join(sorted(unknown))}'}, status=400)
+
+        matrix = self._features(info, class_ids, 'subjects' in groups, 'components' in groups)
+        keys = [
+            key for key, _ in matrix.columns
+            if key in groups
+            or (key.startswith('subject:') and 'subjects' in groups)
+            or (key.startswith('component:') and 'components' in groups)
+        ]
+        selected = matrix.select(keys)
+        r, n = analytics.correlation_matrix(selected.values)
+
+        pairs = []
+        for i in range(len(keys)):
+            for j in range(i + 1, len(keys)):
+                if not np.isnan(r[i, j]):
+                    pairs.append({
+                        'a': keys[i], 'b': keys[j],
+                        'r': round(float(r[i, j]), 4), 'n': int(n[i, j]),
+                    })
+        pairs.sort(key=lambda p: abs(p['r']), reverse=True)
+
+        return Response({
+            **info,
+            'students': len(selected),
+            'features': [{'key': k, 'label': label} for k, label in selected.columns],
+            'matrix': [[analytics.to_json_float(v) for v in row] for row in r],
+            'pair_counts': n.tolist(),
+            'strongest_pairs': pairs[:10],
+        })
+
+    @action(detail=False, methods=['get'])
+    @async_report
+    def distribution(self, request):
+        """
+        Descriptive statistics, percentiles and a histogram for one feature
+        (``metric``: attendance_rate, late_rate, exam_percentage,
+        subject:<id> or component:<id>). ``bins`` sets the histogram
+        resolution over 0-100; ``include_students=1`` adds per-student
+        values with z-scores and percentile ranks.
+        """
+        class_ids, info, error = self._resolve_scope(request)
+        if error is not None:
+            return error
+
+        metric = request.query_params.get('metric', 'exam_percentage')
+        try:
+            bins = max(1, min(int(request.query_params.get('bins', 10)), 100))
+        except ValueError:
+            return Response({'error': 'bins must be an integer'}, status=400)
+
+        matrix = self._features(
+            info, class_ids, metric.startswith('subject:'), metric.startswith('component:'),
+        )
+        if not matrix.has(metric):
+            return Response({'error': f'No data for metric {metric!r} in this scope'}, status=404)
+
+        values = matrix.column(metric)
+        data = {
+            **info,
+            'metric': metric,
+            'label': dict(matrix.columns)[metric],
+            'statistics': analytics.describe(values),
+            'histogram': analytics.histogram(values, bins=bins),
+        }
+
+        if request.query_params.get('include_students', '').lower() in ('1', 'true'):
+            z = analytics.z_scores(values)
+            ranks = analytics.percentile_ranks(values)
+            students = [
+                {
+                    **row,
+                    'value': analytics.to_json_float(values[i], 2),
+                    'z_score': analytics.to_json_float(z[i], 3),
+                    'percentile_rank': analytics.to_json_float(ranks[i], 1),
+                }
+                for i, row in enumerate(matrix.rows)
+            ]
+            students.sort(key=lambda s: (s['value'] is None, -(s['value'] or 0)))
+            data['students'] = students
+
+        return Response(data)
@@ -7,6 +7,7 @@ from .models import (
     ResultEditRequest, SessionAttendance, AttendanceSessionLog,
     ExamResultNotificationReadStatus, SchoolAdmin, School, SchoolMembership,
     Certificate, CertificateTemplate, CertificateDownloadLog,
+    CertificateIssuanceJob, CertificateIssuanceJobItem, ReportJob,
     OICAssignment, OICRemark, BiometricDevice, BiometricUserMapping, AssessmentComponent, StudentComponentResult
 )
 from django.contrib.auth.password_validation import validate_password
@@ -14,6 +15,7 @@ import uuid
 from django.utils import timezone
 from django.db import transaction
 from datetime import date as _date, datetime as _datetime
+from core.services.qr_scans import qr_scan_context
 
 class SchoolThemeSerializer(serializers.Serializer):
     primary_color = serializers.CharField()
@@ -1434,6 +1436,7 @@ class AttendanceSessionSerializer(serializers.ModelSerializer):
     total_students = serializers.IntegerField(read_only=True)
     marked_count = serializers.IntegerField(read_only=True)
     attendance_percentage = serializers.FloatField(read_only=True)
+    stats = serializers.SerializerMethodField(read_only=True)
     current_qr_token = serializers.SerializerMethodField(read_only=True)
     qr_expires_in = serializers.SerializerMethodField(read_only=True)
     can_mark = serializers.SerializerMethodField(read_only=True)
@@ -1450,6 +1453,9 @@ class AttendanceSessionSerializer(serializers.ModelSerializer):
     def get_created_by_name(self, obj):
         return obj.created_by.get_full_name() if obj.created_by else None
 
+    def get_stats(self, obj):
+        return obj.stats.as_dict()
+
     def get_current_qr_token(self, obj):
         if obj.status == 'active' and obj.enable_qr_scan:
             return obj.generate_qr_token()
@@ -1462,10 +1468,8 @@ class AttendanceSessionSerializer(serializers.ModelSerializer):
         return obj.is_within_schedule()
 
     def get_qr_expires_in(self, obj):
-        if obj.status == 'active' and obj.qr_last_generated:
-            elapsed = (timezone.now() - obj.qr_last_generated).total_seconds()
-            remaining = obj.qr_refresh_interval - elapsed
-            return max(0, int(remaining))
+        if obj.status == 'active' and obj.enable_qr_scan:
+            return obj.qr_expires_in()
         return 0
 
     def validate(self, attrs):
@@ -1503,11 +1507,15 @@ class AttendanceSessionListSerializer(serializers.ModelSerializer):
     marked_count = serializers.IntegerField(read_only=True)
     total_students = serializers.IntegerField(read_only=True)
     attendance_percentage = serializers.FloatField(read_only=True)
+    stats = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = AttendanceSession
         fields = '__all__'
 
+    def get_stats(self, obj):
+        return obj.stats.as_dict()
+
 class SessionAttendanceSerializer(serializers.ModelSerializer):
     session_title = serializers.CharField(source='session.title', read_only=True)
     session_type = serializers.CharField(source='session.get_session_type_display', read_only=True)
@@ -1577,13 +1585,12 @@ class QRAttendanceMarkSerializer(serializers.Serializer):
     longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
 
     def validate(self, attrs):
-        try:
-            session = AttendanceSession.objects.get(
-                session_id=attrs['session_id'],
-                is_active=True
-            )
-        except AttendanceSession.DoesNotExist:
+        # Scans arrive in bursts; everything below is checked against the
+        # cached session context without touching the database.
+        context = qr_scan_context(attrs['session_id'])
+        if context is None:
             raise serializers.ValidationError({"session_id": "Invalid or inactive session."})
+        session = context['session']
 
         if not session.verify_qr_token(attrs['qr_token']):
             raise serializers.ValidationError({
@@ -1607,6 +1614,7 @@ class QRAttendanceMarkSerializer(serializers.Serializer):
                 })
         
         attrs['session'] = session
+        attrs['context'] = context
         return attrs
 
 class BulkSessionAttendanceSerializer(serializers.Serializer):
@@ -1855,7 +1863,82 @@ class CertificateTemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = CertificateTemplate
         fields = "__all__"
+
+class CertificateIssuanceJobItemSerializer(serializers.ModelSerializer):
+
+    certificate_number = serializers.CharField(
+        source='certificate.certificate_number', read_only=True, allow_null=True,
+    )
+
+    class Meta:
+        model = CertificateIssuanceJobItem
+        fields = [
+            'id', 'enrollment', 'certificate', 'certificate_number',
+            'student_svc_number', 'student_name',
+            'status', 'error', 'updated_at',
+        ]
+
+class CertificateIssuanceJobSerializer(serializers.ModelSerializer):
+
+    class_name = serializers.CharField(source='class_obj.name', read_only=True)
+    template_name = serializers.CharField(
+        source='template.name', read_only=True, allow_null=True,
+    )
+    requested_by_name = serializers.SerializerMethodField(read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    is_finished = serializers.BooleanField(read_only=True)
+    progress = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = CertificateIssuanceJob
+        fields = [
+            'id', 'school', 'class_obj', 'class_name',
+            'template', 'template_name',
+            'requested_by', 'requested_by_name',
+            'status', 'status_display', 'is_finished',
+            'total_students', 'progress', 'error_message',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_requested_by_name(self, obj):
+        return obj.requested_by.get_full_name() if obj.requested_by else None
+
+    def get_progress(self, obj):
+        from .services import certificate_job_progress
+        return certificate_job_progress(obj)
+
+class CertificateIssuanceJobDetailSerializer(CertificateIssuanceJobSerializer):
+
+    items = CertificateIssuanceJobItemSerializer(many=True, read_only=True)
+
+    class Meta(CertificateIssuanceJobSerializer.Meta):
+        fields = CertificateIssuanceJobSerializer.Meta.fields + ['items']
+        read_only_fields = fields
         
+class ReportJobSerializer(serializers.ModelSerializer):
+
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    is_finished = serializers.BooleanField(read_only=True)
+    download_url = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'action', 'params', 'view_kwargs',
+            'status', 'status_display', 'is_finished', 'progress', 'error_message',
+            'result_status', 'result_content_type', 'result_filename', 'result_size',
+            'download_url',
+            'created_at', 'started_at', 'finished_at', 'expires_at',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.result_status is None:
+            return None
+        from rest_framework.reverse import reverse
+        return reverse('core:report-job-download', args=[obj.id], request=self.context.get('request'))
+
 class CertificateVerificationSerializer(serializers.Serializer):
 
     is_valid = serializers.BooleanField()
@@ -1,27 +1,30 @@
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Q, Exists, OuterRef, Subquery
+from django.db.models import Q, F, Exists, OuterRef, Subquery, Count, Sum, Case, When, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.core.cache import cache
+from collections import defaultdict
+from datetime import timedelta
 from core.models import (
     Subject, Enrollment, Exam, ExamResult, Class, Certificate,
     CertificateTemplate, CertificateDownloadLog, SchoolMembership,
-    AttendanceSession, SessionAttendance, StudentIndex, AssessmentComponent, StudentComponentResult)
+    AttendanceSession, SessionAttendance, StudentIndex, AssessmentComponent, StudentComponentResult,
+    CertificateIssuanceJob, CertificateIssuanceJobItem, StudentSubjectStanding,
+    ClassIndexSequence, SchoolDailyStats, User, AttendanceSessionStats)
+from core.grading import GradeScale
 from django.conf import settings
 import io
 import os
 import base64
 import logging
+import threading
+import uuid
 logger = logging.getLogger(__name__)
 from decimal import Decimal
 from pathlib import Path
 from typing import Optional, Dict, Any, Tuple
 
-def get_subject_completion_status(subject, student):
-    
-    final_exam = Exam.all_objects.filter(
-        subject=subject,
-        exam_type='final',
-        is_active=True
-    ).first()
+def _legacy_subject_status(subject, final_exam, result):
 
     if not final_exam:
         return {
@@ -33,14 +36,6 @@ def get_subject_completion_status(subject, student):
             'result': None
         }
 
-
-    result = ExamResult.all_objects.filter(
-        exam=final_exam,
-        student=student,
-        is_submitted=True,
-        marks_obtained__isnull = False,
-    ).first()
-
     return {
         'subject_id': subject.id,
         'subject_name': subject.name,
@@ -58,14 +53,30 @@ def get_subject_completion_status(subject, student):
 
     }
 
-def get_class_completion_status(class_obj, student):
-
-    subjects = Subject.all_objects.filter(
-        class_obj= class_obj,
+def get_subject_completion_status(subject, student):
+    
+    final_exam = Exam.all_objects.filter(
+        subject=subject,
+        exam_type='final',
         is_active=True
-    )
+    ).first()
+
+    if not final_exam:
+        return _legacy_subject_status(subject, None, None)
+
+
+    result = ExamResult.all_objects.filter(
+        exam=final_exam,
+        student=student,
+        is_submitted=True,
+        marks_obtained__isnull = False,
+    ).first()
+
+    return _legacy_subject_status(subject, final_exam, result)
 
-    if not subjects.exists():
+def _class_completion_payload(class_obj, subject_statuses):
+
+    if not subject_statuses:
         return {
             'class_id': class_obj.id,
             'class_name': class_obj.name,
@@ -77,11 +88,6 @@ def get_class_completion_status(class_obj, student):
             'completed_subjects': 0
         }
 
-    subject_statuses = []
-    for subject in subjects:
-        status = get_subject_completion_status_v2(subject, student)
-        subject_statuses.append(status)
-
     completed_count = sum(1 for s in subject_statuses if s ['is_complete'])
     total_count = len(subject_statuses)
     all_complete = completed_count == total_count
@@ -96,17 +102,887 @@ def get_class_completion_status(class_obj, student):
         'subjects': subject_statuses,
     }
 
+def get_class_completion_status(class_obj, student):
+
+    subjects = Subject.all_objects.filter(
+        class_obj= class_obj,
+        is_active=True
+    )
+
+    subject_statuses = []
+    for subject in subjects:
+        status = get_subject_completion_status_v2(subject, student)
+        subject_statuses.append(status)
+
+    return _class_completion_payload(class_obj, subject_statuses)
+
+def _load_grading_inputs(subjects, student_ids) -> Dict[str, Any]:
+    """
+    Load everything needed to grade ``subjects`` for ``student_ids`` in a
+    fixed number of queries: LEGACY final exams and their results, POLICY
+    components and every component attempt.
+    """
+    legacy_ids = [s.id for s in subjects if s.grading_mode == 'LEGACY']
+    policy_ids = [s.id for s in subjects if s.grading_mode != 'LEGACY']
+
+    final_exams = {}
+    if legacy_ids:
+        for exam in Exam.all_objects.filter(
+            subject_id__in=legacy_ids,
+            exam_type='final',
+            is_active=True,
+        ).order_by('created_at', 'id'):
+            final_exams.setdefault(exam.subject_id, exam)
+
+    final_results = {}
+    if final_exams:
+        exams_by_id = {e.id: e for e in final_exams.values()}
+        for result in ExamResult.all_objects.filter(
+            exam_id__in=exams_by_id.keys(),
+            student_id__in=student_ids,
+            is_submitted=True,
+            marks_obtained__isnull=False,
+        ):
+            result.exam = exams_by_id[result.exam_id]
+            final_results[(result.exam_id, result.student_id)] = result
+
+    components = defaultdict(list)
+    attempts = defaultdict(list)
+    if policy_ids:
+        for comp in AssessmentComponent.all_objects.filter(
+            subject_id__in=policy_ids,
+            is_active=True,
+        ).order_by('sort_order', 'name'):
+            components[comp.subject_id].append(comp)
+
+        for attempt in StudentComponentResult.all_objects.filter(
+            component__subject_id__in=policy_ids,
+            component__is_active=True,
+            student_id__in=student_ids,
+        ).order_by():
+            attempts[(attempt.component_id, attempt.student_id)].append(attempt)
+
+    return {
+        'final_exams': final_exams,
+        'final_results': final_results,
+        'components': components,
+        'attempts': attempts,
+    }
+
+def _subject_status_from_inputs(subject, student_id, inputs):
+
+    if subject.grading_mode == 'LEGACY':
+        final_exam = inputs['final_exams'].get(subject.id)
+        result = (
+            inputs['final_results'].get((final_exam.id, student_id))
+            if final_exam else None
+        )
+        return _legacy_subject_status(subject, final_exam, result)
+
+    return _policy_completion_status(
+        subject,
+        _evaluate_policy_components(
+            subject, _policy_component_results(subject, student_id, inputs),
+        ),
+    )
+
+def _policy_component_results(subject, student_id, inputs):
+
+    component_results = []
+    for comp in inputs['components'].get(subject.id, []):
+        comp_attempts = inputs['attempts'].get((comp.id, student_id), [])
+        component_results.append(_component_result_entry(
+            comp,
+            _pick_effective_attempt(comp, comp_attempts),
+            len(comp_attempts),
+        ))
+    return component_results
+
+def get_class_completion_statuses(class_obj, student_ids) -> Dict[Any, Dict[str, Any]]:
+    """
+    Batch version of get_class_completion_status.
+
+    Loads the subjects, final exams, final exam results, components and
+    component attempts for the whole class up front (a fixed number of
+    queries regardless of class size) and returns the same payload per
+    student, keyed by student id.
+    """
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+
+    subjects = list(Subject.all_objects.filter(
+        class_obj=class_obj,
+        is_active=True,
+    ))
+    inputs = _load_grading_inputs(subjects, student_ids)
+
+    statuses = {}
+    for student_id in student_ids:
+        subject_statuses = [
+            _subject_status_from_inputs(subject, student_id, inputs)
+            for subject in subjects
+        ]
+        statuses[student_id] = _class_completion_payload(class_obj, subject_statuses)
+
+    return statuses
+
+STANDING_UPDATE_FIELDS = [
+    'school', 'class_obj', 'grading_mode',
+    'exam_marks_obtained', 'exam_marks_possible', 'exams_taken',
+    'component_marks_obtained', 'component_marks_possible',
+    'components_graded', 'pending_components',
+    'percentage', 'final_exam_percentage', 'grade',
+    'is_complete', 'is_passed', 'reason', 'failed_critical', 'computed_at',
+]
+
+def _decimal_2(value) -> Optional[Decimal]:
+    if value is None:
+        return None
+    return Decimal(str(round(float(value), 2)))
+
+def _build_standing(subject, student_id, status, exam_totals):
+
+    exam_marks = float(exam_totals.get('total_marks') or 0)
+    exam_possible = exam_totals.get('total_possible') or 0
+
+    standing = StudentSubjectStanding(
+        school_id=subject.school_id,
+        student_id=student_id,
+        subject_id=subject.id,
+        class_obj_id=subject.class_obj_id,
+        grading_mode=subject.grading_mode,
+        exam_marks_obtained=_decimal_2(exam_marks),
+        exam_marks_possible=exam_possible,
+        exams_taken=exam_totals.get('exams_taken') or 0,
+        is_complete=status['is_complete'],
+        reason=(status.get('reason') or '')[:255],
+    )
+
+    if subject.grading_mode == 'LEGACY':
+        result = status.get('result')
+        standing.is_passed = status['is_complete']
+        standing.percentage = (
+            _decimal_2(exam_marks / exam_possible * 100) if exam_possible else None
+        )
+        standing.final_exam_percentage = (
+            _decimal_2(result['percentage']) if result else None
+        )
+    else:
+        component_results = status.get('component_results') or []
+        graded = [c for c in component_results if c['effective_result']]
+        standing.is_passed = status['is_passed']
+        # Weighted over graded components only, so a component still awaiting
+        # results does not pull the running percentage down. is_passed keeps
+        # using the all-component figure from the completion rules.
+        graded_weight = sum(c['weight'] for c in graded)
+        standing.percentage = (
+            _decimal_2(
+                sum(c['effective_result']['percentage'] * c['weight'] for c in graded)
+                / graded_weight
+            )
+            if graded_weight > 0 else None
+        )
+        standing.failed_critical = status.get('failed_critical') or []
+        standing.components_graded = len(graded)
+        standing.pending_components = len(component_results) - len(graded)
+        standing.component_marks_obtained = _decimal_2(
+            sum(c['effective_result']['marks_obtained'] for c in graded)
+        )
+        standing.component_marks_possible = sum(
+            c['total_marks'] for c in graded
+        )
+
+    standing.grade = GradeScale.for_school(subject.school_id).classify(standing.percentage)
+    return standing
+
+def refresh_subject_standings(subjects, student_ids) -> list:
+    """
+    Recompute and upsert the StudentSubjectStanding rows for every
+    (student, subject) pair. Runs a fixed number of queries for any number
+    of subjects and students.
+    """
+    subjects = [s for s in subjects if s.is_active]
+    student_ids = list(student_ids)
+    if not subjects or not student_ids:
+        return []
+
+    inputs = _load_grading_inputs(subjects, student_ids)
+
+    exam_totals = {}
+    for row in ExamResult.all_objects.filter(
+        exam__subject_id__in=[s.id for s in subjects],
+        student_id__in=student_ids,
+        is_submitted=True,
+        marks_obtained__isnull=False,
+    ).values('student_id', 'exam__subject_id').annotate(
+        total_marks=Sum('marks_obtained'),
+        total_possible=Sum('exam__total_marks'),
+        exams_taken=Count('id'),
+    ):
+        exam_totals[(row['student_id'], row['exam__subject_id'])] = row
+
+    standings = [
+        _build_standing(
+            subject, student_id,
+            _subject_status_from_inputs(subject, student_id, inputs),
+            exam_totals.get((student_id, subject.id), {}),
+        )
+        for subject in subjects
+        for student_id in student_ids
+    ]
+
+    StudentSubjectStanding.all_objects.bulk_create(
+        standings,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['student', 'subject'],
+        update_fields=STANDING_UPDATE_FIELDS,
+    )
+    return standings
+
+def refresh_class_standings(class_obj, student_ids=None) -> list:
+
+    if student_ids is None:
+        student_ids = Enrollment.all_objects.filter(
+            class_obj=class_obj, is_active=True,
+        ).values_list('student_id', flat=True)
+
+    subjects = list(Subject.all_objects.filter(class_obj=class_obj, is_active=True))
+    return refresh_subject_standings(subjects, student_ids)
+
+def get_subject_standings(class_obj, student_ids, *, subjects=None) -> Dict[Tuple[Any, Any], Any]:
+    """
+    Return ``{(student_id, subject_id): StudentSubjectStanding}`` for the
+    class's active subjects, materializing any pair that has no row yet.
+    """
+    student_ids = list(student_ids)
+    if subjects is None:
+        subjects = list(Subject.all_objects.filter(class_obj=class_obj, is_active=True))
+    if not student_ids or not subjects:
+        return {}
+
+    standings = {
+        (s.student_id, s.subject_id): s
+        for s in StudentSubjectStanding.all_objects.filter(
+            subject_id__in=[s.id for s in subjects],
+            student_id__in=student_ids,
+        )
+    }
+
+    missing_students = {
+        student_id
+        for student_id in student_ids
+        for subject in subjects
+        if (student_id, subject.id) not in standings
+    }
+    if missing_students:
+        missing_subjects = [
+            subject for subject in subjects
+            if any((sid, subject.id) not in standings for sid in missing_students)
+        ]
+        for standing in refresh_subject_standings(missing_subjects, missing_students):
+            standings.setdefault((standing.student_id, standing.subject_id), standing)
+
+    return standings
+
+def get_class_standing_statuses(class_obj, student_ids) -> Dict[Any, Dict[str, Any]]:
+    """
+    Lightweight certificate-eligibility payload read from the materialized
+    standings. Same top-level shape as get_class_completion_statuses, but
+    each subject carries only its verdict. Falls back to the full live
+    computation while any of the class's subjects has stale standings.
+    """
+    student_ids = list(student_ids)
+    subjects = list(Subject.all_objects.filter(class_obj=class_obj, is_active=True))
+    if stale_standing_subjects([subject.id for subject in subjects]):
+        # A refresh is still queued or has failed; grade from the source rows.
+        return get_class_completion_statuses(class_obj, student_ids)
+    standings = get_subject_standings(class_obj, student_ids, subjects=subjects)
+
+    statuses = {}
+    for student_id in student_ids:
+        subject_statuses = []
+        for subject in subjects:
+            standing = standings.get((student_id, subject.id))
+            subject_statuses.append({
+                'subject_id': subject.id,
+                'subject_name': subject.name,
+                'grading_mode': subject.grading_mode,
+                'is_complete': bool(standing and standing.is_complete),
+                'is_passed': bool(standing and standing.is_passed),
+                'reason': standing.reason if standing else 'not_graded',
+                'overall_percentage': (
+                    float(standing.percentage)
+                    if standing and standing.percentage is not None else None
+                ),
+            })
+        statuses[student_id] = _class_completion_payload(class_obj, subject_statuses)
+
+    return statuses
+
+STANDING_REFRESH_PENDING_KEY = 'standing_refresh_pending:{subject_id}'
+STANDING_STALE_KEY = 'standing_stale:{subject_id}'
+STANDING_STALE_TIMEOUT = 60 * 60 * 24
+
+def schedule_standing_refresh(subject_id):
+    """
+    Rebuild a subject's standings in a Celery task once the current
+    transaction commits; nothing is queued if it rolls back. The subject is
+    flagged stale until the task succeeds, and writes within the debounce
+    window collapse into a single task.
+    """
+    transaction.on_commit(lambda: _dispatch_standing_refresh(subject_id))
+
+def _dispatch_standing_refresh(subject_id):
+    from core.tasks import refresh_subject_standings_task
+
+    # A fresh token per write lets the task clear only the flag it has seen.
+    cache.set(STANDING_STALE_KEY.format(subject_id=subject_id), uuid.uuid4().hex, STANDING_STALE_TIMEOUT)
+
+    delay = settings.STUDENT_STANDING_REFRESH_DELAY
+    pending_key = STANDING_REFRESH_PENDING_KEY.format(subject_id=subject_id)
+    if not cache.add(pending_key, 1, timeout=delay * 4):
+        return
+    try:
+        refresh_subject_standings_task.apply_async((subject_id,), countdown=delay)
+    except Exception as e:
+        cache.delete(pending_key)
+        logger.error(f"Failed to schedule standings refresh for subject {subject_id}: {e}")
+
+def stale_standing_subjects(subject_ids) -> set:
+    """Subjects whose standings have writes not yet applied by a refresh."""
+    keys = {STANDING_STALE_KEY.format(subject_id=subject_id): subject_id for subject_id in subject_ids}
+    if not keys:
+        return set()
+    return {keys[key] for key in cache.get_many(list(keys))}
+
+CLASS_SNAPSHOT_PENDING_KEY = 'class_perf_snapshot_pending:{class_id}'
+
+_snapshot_refresh_state = threading.local()
+
+def schedule_class_snapshot_refresh(class_id=None, *, subject_id=None):
+    """
+    Mark a class performance snapshot dirty once the current transaction
+    commits. Accepts either the class id or a subject id (resolved in bulk
+    at flush time). Repeated writes within the debounce window collapse
+    into a single rebuild task.
+    """
+    pending = getattr(_snapshot_refresh_state, 'pending', None)
+    if pending is None:
+        pending = _snapshot_refresh_state.pending = {'classes': set(), 'subjects': set()}
+
+    if class_id is not None:
+        pending['classes'].add(class_id)
+    if subject_id is not None:
+        pending['subjects'].add(subject_id)
+
+    transaction.on_commit(flush_class_snapshot_refreshes)
+
+def flush_class_snapshot_refreshes():
+    from core.tasks import rebuild_class_performance_snapshot
+
+    pending = getattr(_snapshot_refresh_state, 'pending', None)
+    if not pending or not (pending['classes'] or pending['subjects']):
+        return
+    _snapshot_refresh_state.pending = {'classes': set(), 'subjects': set()}
+
+    class_ids = set(pending['classes'])
+    if pending['subjects']:
+        class_ids.update(
+            Subject.all_objects.filter(id__in=pending['subjects'])
+            .values_list('class_obj_id', flat=True)
+        )
+
+    debounce = settings.CLASS_PERFORMANCE_SNAPSHOT_DEBOUNCE
+    for class_id in class_ids:
+        # The pending key is cleared by the task before it starts building, so
+        # writes that land mid-build schedule a follow-up rebuild.
+        if not cache.add(CLASS_SNAPSHOT_PENDING_KEY.format(class_id=class_id), 1, timeout=debounce * 4):
+            continue
+        try:
+            rebuild_class_performance_snapshot.apply_async((class_id,), countdown=debounce)
+        except Exception as e:
+            cache.delete(CLASS_SNAPSHOT_PENDING_KEY.format(class_id=class_id))
+            logger.error(f"Failed to schedule snapshot rebuild for class {class_id}: {e}")
+
+SCHOOL_STATS_FIELDS = [
+    'results_count', 'marks_obtained', 'marks_possible', 'pass_count',
+    'sessions_count', 'completed_sessions', 'attendance_records', 'present_count',
+]
+
+def _date_filter(lookup, dates=None, date_from=None, date_to=None):
+    q = Q()
+    if dates is not None:
+        q &= Q(**{f'{lookup}__in': dates})
+    if date_from is not None:
+        q &= Q(**{f'{lookup}__gte': date_from})
+    if date_to is not None:
+        q &= Q(**{f'{lookup}__lte': date_to})
+    return q
+
+def compute_school_daily_stats(school_id, *, dates=None, date_from=None, date_to=None):
+    """
+    Per-day SchoolDailyStats figures aggregated straight from the source
+    tables, as ``{date: {field: value}}``. Three grouped queries regardless
+    of the number of days.
+    """
+    days = defaultdict(lambda: dict.fromkeys(SCHOOL_STATS_FIELDS, 0))
+
+    results = (
+        ExamResult.all_objects
+        .filter(school_id=school_id, is_submitted=True, marks_obtained__isnull=False)
+        .filter(_date_filter('exam__exam_date', dates, date_from, date_to))
+        .values('exam__exam_date')
+        .annotate(
+            rc=Count('id'),
+            tm=Sum('marks_obtained'),
+            tp=Sum('exam__total_marks'),
+            pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
+        )
+        .order_by()
+    )
+    for r in results:
+        day = days[r['exam__exam_date']]
+        day['results_count'] = r['rc']
+        day['marks_obtained'] = r['tm'] or Decimal('0')
+        day['marks_possible'] = r['tp'] or 0
+        day['pass_count'] = r['pc']
+
+    sessions = (
+        AttendanceSession.all_objects
+        .filter(school_id=school_id)
+        .annotate(day=TruncDate('scheduled_start'))
+        .filter(_date_filter('day', dates, date_from, date_to))
+        .values('day')
+        .annotate(sc=Count('id'), cc=Count('id', filter=Q(status='completed')))
+        .order_by()
+    )
+    for r in sessions:
+        day = days[r['day']]
+        day['sessions_count'] = r['sc']
+        day['completed_sessions'] = r['cc']
+
+    attendance = (
+        SessionAttendance.all_objects
+        .filter(session__school_id=school_id)
+        .annotate(day=TruncDate('session__scheduled_start'))
+        .filter(_date_filter('day', dates, date_from, date_to))
+        .values('day')
+        .annotate(ar=Count('id'), pc=Count('id', filter=Q(status__in=['present', 'late'])))
+        .order_by()
+    )
+    for r in attendance:
+        day = days[r['day']]
+        day['attendance_records'] = r['ar']
+        day['present_count'] = r['pc']
+
+    return dict(days)
+
+def rebuild_school_daily_stats(school_id, *, dates=None, date_from=None, date_to=None) -> int:
+    """
+    Recompute SchoolDailyStats rows for the given days (or range) and drop
+    rows for days that no longer have any data. Returns the row count.
+    """
+    stats = compute_school_daily_stats(
+        school_id, dates=dates, date_from=date_from, date_to=date_to,
+    )
+    now = timezone.now()
+    rows = [
+        SchoolDailyStats(
+            school_id=school_id, date=day, is_dirty=False, computed_at=now, **values,
+        )
+        for day, values in stats.items()
+    ]
+    with transaction.atomic():
+        SchoolDailyStats.all_objects.filter(
+            _date_filter('date', dates, date_from, date_to), school_id=school_id,
+        ).exclude(date__in=list(stats)).delete()
+        SchoolDailyStats.all_objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['school', 'date'],
+            update_fields=SCHOOL_STATS_FIELDS + ['is_dirty', 'computed_at'],
+        )
+    return len(rows)
+
+def school_stats_live_from():
+    """First day always computed live: the nightly rollup covers up to the day before yesterday."""
+    return timezone.localdate() - timedelta(days=1)
+
+def school_stats_summary(school_id, date_from=None, date_to=None) -> dict:
+    """
+    Totals over ``[date_from, date_to]`` (either end open). Settled days come
+    from SchoolDailyStats; recent, future and dirty days are aggregated live.
+    Until the first rollup for a school exists, everything is live.
+    """
+    live_from = school_stats_live_from()
+    rollup = SchoolDailyStats.all_objects.filter(school_id=school_id)
+    totals = dict.fromkeys(SCHOOL_STATS_FIELDS, 0)
+
+    def _add(values):
+        for field in SCHOOL_STATS_FIELDS:
+            totals[field] += values[field] or 0
+
+    if not rollup.exists():
+        for values in compute_school_daily_stats(
+            school_id, date_from=date_from, date_to=date_to,
+        ).values():
+            _add(values)
+    else:
+        settled = rollup.filter(
+            _date_filter('date', date_from=date_from, date_to=date_to), date__lt=live_from,
+        )
+        _add(settled.filter(is_dirty=False).aggregate(
+            **{field: Sum(field) for field in SCHOOL_STATS_FIELDS}
+        ))
+
+        dirty_days = list(settled.filter(is_dirty=True).values_list('date', flat=True))
+        if dirty_days:
+            for values in compute_school_daily_stats(school_id, dates=dirty_days).values():
+                _add(values)
+
+        if date_to is None or date_to >= live_from:
+            recent_from = max(date_from, live_from) if date_from else live_from
+            for values in compute_school_daily_stats(
+                school_id, date_from=recent_from, date_to=date_to,
+            ).values():
+                _add(values)
+
+    results, possible = totals['results_count'], float(totals['marks_possible'])
+    records = totals['attendance_records']
+    return {
+        **totals,
+        'marks_obtained': float(totals['marks_obtained']),
+        'average_performance': round(float(totals['marks_obtained']) / possible * 100, 2) if possible else 0,
+        'pass_rate': round(totals['pass_count'] / results * 100, 2) if results else 0,
+        'attendance_rate': round(totals['present_count'] / records * 100, 2) if records else 0,
+    }
+
+_school_stats_dirty_state = threading.local()
+
+def mark_school_stats_dirty(school_id, day):
+    """
+    Flag a settled SchoolDailyStats day for recomputation once the current
+    transaction commits. Recent days are always live and are ignored.
+    """
+    if school_id is None or day is None or day >= school_stats_live_from():
+        return
+    pending = getattr(_school_stats_dirty_state, 'pending', None)
+    if pending is None:
+        pending = _school_stats_dirty_state.pending = defaultdict(set)
+    pending[school_id].add(day)
+    transaction.on_commit(flush_school_stats_dirty)
+
+def flush_school_stats_dirty():
+    pending = getattr(_school_stats_dirty_state, 'pending', None)
+    if not pending:
+        return
+    _school_stats_dirty_state.pending = defaultdict(set)
+    for school_id, days in pending.items():
+        if not SchoolDailyStats.all_objects.filter(school_id=school_id).exists():
+            continue
+        # Days that had no data yet get an empty dirty row so readers pick them up live.
+        SchoolDailyStats.all_objects.bulk_create(
+            [SchoolDailyStats(school_id=school_id, date=day, is_dirty=True) for day in days],
+            update_conflicts=True,
+            unique_fields=['school', 'date'],
+            update_fields=['is_dirty'],
+        )
+
+_session_stats_state = threading.local()
+
+def schedule_session_stats_refresh(session_id=None, *, class_id=None):
+    """
+    Recount AttendanceSessionStats once the current transaction commits:
+    the attendance counts of one session, or with ``class_id`` the expected
+    headcount of every session of that class.
+    """
+    pending = getattr(_session_stats_state, 'pending', None)
+    if pending is None:
+        pending = _session_stats_state.pending = {'sessions': set(), 'classes': set()}
+
+    if session_id is not None:
+        pending['sessions'].add(session_id)
+    if class_id is not None:
+        pending['classes'].add(class_id)
+
+    transaction.on_commit(flush_session_stats_refreshes)
+
+def flush_session_stats_refreshes():
+    pending = getattr(_session_stats_state, 'pending', None)
+    if not pending or not (pending['sessions'] or pending['classes']):
+        return
+    _session_stats_state.pending = {'sessions': set(), 'classes': set()}
+
+    try:
+        if pending['sessions']:
+            refresh_session_stats(pending['sessions'])
+        for class_id in pending['classes']:
+            refresh_class_session_expected(class_id)
+    except Exception as e:
+        logger.error(f"Failed to refresh session stats: {e}", exc_info=True)
+
+def compute_session_stats(session_ids) -> Dict[Any, AttendanceSessionStats]:
+    """
+    Count attendance for the given sessions with one grouped query per source
+    table, without saving. Completed sessions keep the expected headcount
+    already recorded for them; open sessions use current enrollment.
+    Returns unsaved rows by session id.
+    """
+    sessions = list(
+        AttendanceSession.all_objects.filter(id__in=list(session_ids))
+        .values_list('id', 'school_id', 'class_obj_id', 'status')
+    )
+    if not sessions:
+        return {}
+
+    counts = {
+        row.pop('session_id'): row
+        for row in SessionAttendance.all_objects
+        .filter(session_id__in=[session_id for session_id, _, _, _ in sessions])
+        .values('session_id')
+        .annotate(
+            present_count=Count('id', filter=Q(status='present')),
+            late_count=Count('id', filter=Q(status='late')),
+            absent_count=Count('id', filter=Q(status='absent')),
+            excused_count=Count('id', filter=Q(status='excused')),
+        )
+        .order_by()
+    }
+    expected = dict(
+        Enrollment.all_objects
+        .filter(class_obj_id__in={class_id for _, _, class_id, _ in sessions}, is_active=True)
+        .values('class_obj_id')
+        .annotate(n=Count('id'))
+        .values_list('class_obj_id', 'n')
+        .order_by()
+    )
+    recorded = dict(
+        AttendanceSessionStats.all_objects
+        .filter(session_id__in=[
+            session_id for session_id, _, _, status in sessions if status == 'completed'
+        ])
+        .values_list('session_id', 'expected_count')
+    )
+
+    return {
+        session_id: AttendanceSessionStats(
+            session_id=session_id,
+            school_id=school_id,
+            expected_count=recorded.get(session_id, expected.get(class_id, 0)),
+            **counts.get(session_id, {}),
+        )
+        for session_id, school_id, class_id, _ in sessions
+    }
+
+def refresh_session_stats(session_ids) -> Dict[Any, AttendanceSessionStats]:
+    """
+    Recount AttendanceSessionStats for the given sessions and save them with
+    a single upsert. Returns the rows by session id.
+    """
+    rows = compute_session_stats(session_ids)
+    AttendanceSessionStats.all_objects.bulk_create(
+        list(rows.values()),
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['session'],
+        update_fields=[
+            'present_count', 'late_count', 'absent_count', 'excused_count',
+            'expected_count', 'updated_at',
+        ],
+    )
+    return rows
+
+def refresh_class_session_expected(class_id) -> int:
+    """
+    Reset the expected headcount of the scheduled and active sessions of a
+    class; completed sessions keep the headcount they ended with.
+    """
+    enrolled = Enrollment.all_objects.filter(class_obj_id=class_id, is_active=True).count()
+    return AttendanceSessionStats.all_objects.filter(
+        session__class_obj_id=class_id,
+        session__status__in=['scheduled', 'active'],
+    ).update(expected_count=enrolled, updated_at=timezone.now())
+
+def bulk_mark_session_attendance(session, records, marked_by, school) -> Tuple[int, int, list]:
+    """
+    Apply manual attendance marks for many students of one session.
+
+    Students are validated against active school membership and class
+    enrollment in two queries, then every mark is written by one
+    ``INSERT ... ON CONFLICT (session, student) DO UPDATE`` inside a single
+    transaction. Later records for the same student win; ``errors`` keeps
+    the messages of the row-by-row endpoint. Returns ``(created, updated,
+    errors)``.
+    """
+    from core.services.qr_scans import hold_qr_marks
+
+    parsed = []
+    for record in records:
+        try:
+            parsed.append((int(record['student_id']), record))
+        except (TypeError, ValueError):
+            parsed.append((None, record))
+    marks = {student_id: record for student_id, record in parsed if student_id is not None}
+
+    students = {
+        row[0]: f'{row[1]} {row[2]}'.strip()
+        for row in User.all_objects.filter(
+            id__in=list(marks),
+            role='student',
+            school_memberships__school=school,
+            school_memberships__status='active',
+        ).values_list('id', 'first_name', 'last_name').distinct()
+    }
+    enrolled = set(
+        Enrollment.all_objects.filter(
+            class_obj_id=session.class_obj_id, is_active=True, student_id__in=list(students),
+        ).values_list('student_id', flat=True)
+    )
+
+    errors = []
+    marked = 0
+    for student_id, record in parsed:
+        if student_id not in students:
+            errors.append(f"Student ID {record['student_id']} not found")
+        elif student_id not in enrolled:
+            errors.append(f"Student {students[student_id]} is not enrolled.")
+        else:
+            marked += 1
+
+    rows = [
+        SessionAttendance(
+            school=session.school,
+            session=session,
+            student_id=student_id,
+            status=record['status'],
+            marking_method='manual',
+            marked_by=marked_by,
+            remarks=(record.get('remarks') or '').strip() or None,
+        )
+        for student_id, record in marks.items()
+        if student_id in enrolled
+    ]
+    if not rows:
+        return 0, 0, errors
+
+    with transaction.atomic():
+        existing = set(
+            SessionAttendance.all_objects.select_for_update()
+            .filter(session=session, student_id__in=[row.student_id for row in rows])
+            .values_list('student_id', flat=True)
+        )
+        SessionAttendance.all_objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['session', 'student'],
+            update_fields=['status', 'marking_method', 'marked_by', 'remarks'],
+        )
+        # bulk_create skips the post_save receivers that keep derived data fresh.
+        schedule_class_snapshot_refresh(session.class_obj_id)
+        schedule_session_stats_refresh(session.id)
+        mark_school_stats_dirty(session.school_id, timezone.localdate(session.scheduled_start))
+        hold_qr_marks(session.pk, [row.student_id for row in rows])
+
+    # Repeated records for one student count as updates, as they would row by row.
+    created = len(rows) - len(existing)
+    return created, marked - created, errors
+
+def mark_unmarked_absent(sessions, *, marked_by=None, remarks=None) -> Dict[Any, int]:
+    """
+    Create an ``absent`` row for every actively enrolled student of each
+    session who has no mark yet. The missing (session, student) pairs come
+    from one anti-join query and are inserted with
+    ``bulk_create(ignore_conflicts=True)``, so concurrent marks and repeated
+    runs never duplicate. Students whose QR scan is still queued are left
+    for the flush to record. Returns the number of absentees per session id.
+    """
+    from core.services.qr_scans import claimed_qr_marks
+
+    session_ids = [getattr(session, 'pk', session) for session in sessions]
+    if not session_ids:
+        return {}
+
+    missing = list(
+        Enrollment.all_objects
+        .filter(
+            class_obj__attendance_sessions__id__in=session_ids,
+            is_active=True, student__role='student', student__is_active=True,
+        )
+        .annotate(
+            session_pk=F('class_obj__attendance_sessions__id'),
+            session_school_id=F('class_obj__attendance_sessions__school_id'),
+            session_class_id=F('class_obj__attendance_sessions__class_obj_id'),
+            session_start=F('class_obj__attendance_sessions__scheduled_start'),
+        )
+        .exclude(Exists(
+            SessionAttendance.all_objects.filter(
+                session_id=OuterRef('session_pk'), student_id=OuterRef('student_id'),
+            )
+        ))
+        .values_list('session_pk', 'session_school_id', 'session_class_id', 'session_start', 'student_id')
+        # Enrollment.Meta.ordering would add enrollment_date to the DISTINCT.
+        .order_by()
+        .distinct()
+    )
+    # Scans still waiting in the queue are real marks, not absences.
+    queued = claimed_qr_marks((row[0], row[4]) for row in missing)
+    missing = [row for row in missing if (row[0], row[4]) not in queued]
+    if not missing:
+        return {}
+
+    counts = defaultdict(int)
+    sessions_seen = {}
+    rows = []
+    for session_id, school_id, class_id, scheduled_start, student_id in missing:
+        counts[session_id] += 1
+        sessions_seen[session_id] = (school_id, class_id, scheduled_start)
+        rows.append(SessionAttendance(
+            school_id=school_id,
+            session_id=session_id,
+            student_id=student_id,
+            status='absent',
+            marking_method='admin',
+            marked_by=marked_by,
+            remarks=remarks,
+        ))
+
+    with transaction.atomic():
+        SessionAttendance.all_objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+        # bulk_create skips the post_save receivers that keep derived data fresh.
+        for session_id, (school_id, class_id, scheduled_start) in sessions_seen.items():
+            schedule_class_snapshot_refresh(class_id)
+            schedule_session_stats_refresh(session_id)
+            mark_school_stats_dirty(school_id, timezone.localdate(scheduled_start))
+    return dict(counts)
+
+def mark_absent_for_completed_sessions(*, ended_from, ended_to=None, remarks=None) -> Dict[Any, int]:
+    """:func:`mark_unmarked_absent` for every session completed in a time range."""
+    sessions = AttendanceSession.all_objects.filter(
+        status='completed', is_active=True, actual_end__gte=ended_from,
+    )
+    if ended_to is not None:
+        sessions = sessions.filter(actual_end__lte=ended_to)
+    return mark_unmarked_absent(sessions.values_list('id', flat=True), remarks=remarks)
+
 def check_class_completion_for_all_students(class_obj):
 
-    enrollments = Enrollment.all_objects.filter(
+    enrollments = list(Enrollment.all_objects.filter(
         class_obj=class_obj,
         is_active=True
-    ).select_related('student')
+    ).select_related('student'))
+
+    statuses = get_class_completion_statuses(
+        class_obj, [e.student_id for e in enrollments],
+    )
 
     results = []
 
     for enrollment in enrollments:
-        status = get_class_completion_status(class_obj, enrollment.student)
+        status = statuses[enrollment.student_id]
         status['student_id'] = enrollment.student.id
         status['student_name'] = enrollment.student.get_full_name()
         status['svc_number'] = enrollment.student.svc_number
@@ -117,20 +993,56 @@ def check_class_completion_for_all_students(class_obj):
     return results
 
 def _get_effective_result(component, student):
-    attempts  = StudentComponentResult.all_objects.filter(
+    return StudentComponentResult.all_objects.filter(
         component=component,
         student=student,
-        is_submitted=True,
-        marks_obtained__isnull=False,
-    )
+    ).effective().first()
 
-    if not attempts.exists():
+def _pick_effective_attempt(component, attempts):
+    """In-memory equivalent of _get_effective_result over preloaded attempts."""
+    graded = [
+        a for a in attempts
+        if a.is_submitted and a.marks_obtained is not None
+    ]
+    if not graded:
         return None
 
     if component.retake_evaluation == 'best':
-        return attempts.order_by('-percentage').first()
-    else:
-        return attempts.order_by('-attempt_number').first()
+        return max(graded, key=lambda a: (a.percentage or 0, a.attempt_number))
+    return max(graded, key=lambda a: a.attempt_number)
+
+def _component_result_entry(comp, effective, all_attempts_count):
+
+    effective_data = None
+    is_passed = False
+    is_pending =True
+
+    if effective:
+        is_pending =False
+        is_passed = effective.status =='PASS'
+        effective_data = {
+            'result_id': str(effective.id),
+            'attempt_number': effective.attempt_number,
+            'marks_obtained':float(effective.marks_obtained),
+            'percentage':float(effective.percentage) if effective.percentage else 0,
+            'status': effective.status,
+            'graded_at': effective.graded_at,
+        }
+
+    return {
+        'component_id': str(comp.id),
+        'component_name': comp.name,
+        'component_type':comp.component_type,
+        'is_critical': comp.is_critical,
+        'weight': float(comp.weight),
+        'total_marks': comp.total_marks,
+        'pass_mark': float(comp.pass_mark),
+        'retake_allowed': comp.retake_allowed,
+        'effective_result': effective_data,
+        'all_attempts_count': all_attempts_count,
+        'is_passed': is_passed,
+        'is_pending': is_pending
+    }
 
 def compute_component_results(subject, student):
     components = AssessmentComponent.all_objects.filter(
@@ -146,35 +1058,7 @@ def compute_component_results(subject, student):
             component = comp, student=student,
         ).count()
 
-        effective_data = None
-        is_passed = False
-        is_pending =True
-
-        if effective:
-            is_pending =False
-            is_passed = effective.status =='PASS'
-            effective_data = {
-                'result_id': str(effective.id),
-                'attempt_number': effective.attempt_number,
-                'marks_obtained':float(effective.marks_obtained),
-                'percentage':float(effective.percentage) if effective.percentage else 0,
-                'status': effective.status,
-                'graded_at': effective.graded_at,
-            }
-
-        results.append({
-            'component_id': str(comp.id),
-            'component_name': comp.name,
-            'component_type':comp.component_type,
-            'is_critical': comp.is_critical,
-            'weight': float(comp.weight),
-            'pass_mark': float(comp.pass_mark),
-            'retake_allowed': comp.retake_allowed,
-            'effective_result': effective_data,
-            'all_attempts_count': all_attempts_count,
-            'is_passed': is_passed,
-            'is_pending': is_pending
-        })
+        results.append(_component_result_entry(comp, effective, all_attempts_count))
 
     return results
 
@@ -200,7 +1084,12 @@ def evaluate_subject_pass_fail(subject, student):
 
         }
 
-    component_results = compute_component_results(subject, student)
+    inputs = _load_grading_inputs([subject], [student.id])
+    return _evaluate_policy_components(
+        subject, _policy_component_results(subject, student.id, inputs),
+    )
+
+def _evaluate_policy_components(subject, component_results):
 
     if not component_results:
         return{
@@ -274,18 +1163,13 @@ def evaluate_subject_pass_fail(subject, student):
         'reason': reason,
     }
 
-def determine_retake_requirements(subject, student):
+def _retake_entries(component_results, components_by_id):
 
-    if subject.grading_mode != 'POLICY':
-        return []
-
-    component_results = compute_component_results(subject, student)
     retakes = []
-
     for c in component_results:
         effective = c['effective_result']
         if effective and effective['status'] in ('FAIL', 'RETAKE_REQUIRED'):
-            comp = AssessmentComponent.all_objects.get(id=c['component_id'])
+            comp = components_by_id[c['component_id']]
             can_retake = comp.retake_allowed
             if can_retake and comp.max_retake_attempts > 0:
                 can_retake = c['all_attempts_count'] < comp.max_retake_attempts
@@ -302,12 +1186,71 @@ def determine_retake_requirements(subject, student):
 
     return retakes
 
+def determine_retake_requirements(subject, student):
+
+    if subject.grading_mode != 'POLICY':
+        return []
+
+    inputs = _load_grading_inputs([subject], [student.id])
+    return _retake_entries(
+        _policy_component_results(subject, student.id, inputs),
+        {str(comp.id): comp for comp in inputs['components'].get(subject.id, [])},
+    )
+
+def get_retake_requirements(class_obj, *, subject=None) -> list:
+    """
+    Every active student in the class (optionally one subject) whose
+    effective attempt on a POLICY component is FAIL or RETAKE_REQUIRED.
+    Runs a constant number of queries regardless of class size.
+    """
+    subjects = Subject.all_objects.filter(
+        class_obj=class_obj, is_active=True, grading_mode='POLICY',
+    ).order_by('name')
+    if subject is not None:
+        subjects = subjects.filter(pk=subject.pk)
+    subjects = list(subjects)
+
+    enrollments = list(
+        Enrollment.all_objects.filter(class_obj=class_obj, is_active=True)
+        .select_related('student')
+        .order_by('student__svc_number')
+    )
+    if not subjects or not enrollments:
+        return []
+
+    inputs = _load_grading_inputs(subjects, [e.student_id for e in enrollments])
+
+    rows = []
+    for subj in subjects:
+        components_by_id = {
+            str(comp.id): comp for comp in inputs['components'].get(subj.id, [])
+        }
+        for enrollment in enrollments:
+            student = enrollment.student
+            component_results = _policy_component_results(subj, student.id, inputs)
+            for entry in _retake_entries(component_results, components_by_id):
+                comp = components_by_id[entry['component_id']]
+                rows.append({
+                    'student_id': student.id,
+                    'svc_number': student.svc_number,
+                    'student_name': student.get_full_name(),
+                    'subject_id': subj.id,
+                    'subject_name': subj.name,
+                    'is_critical': comp.is_critical,
+                    **entry,
+                })
+
+    return rows
+
 def get_subject_completion_status_v2(subject, student):
 
     if subject.grading_mode == 'LEGACY':
         return get_subject_completion_status(subject, student)
 
     eval_result = evaluate_subject_pass_fail(subject, student)
+    return _policy_completion_status(subject, eval_result)
+
+def _policy_completion_status(subject, eval_result):
 
     return {
         'subject_id': str(subject.id),
@@ -327,49 +1270,33 @@ def get_subject_completion_status_v2(subject, student):
         } if eval_result['is_complete'] else None,
     }
 
-def calculate_student_grade(class_obj, student) -> Dict[str, Any]:
+def calculate_student_grades(class_obj, student_ids) -> Dict[Any, Dict[str, Any]]:
+    """
+    Overall exam grade per student (sum of submitted exam marks over the
+    class's subjects), read from the materialized subject standings.
+    """
+    student_ids = list(student_ids)
+    totals = {sid: [0.0, 0] for sid in student_ids}
+    for standing in get_subject_standings(class_obj, student_ids).values():
+        totals[standing.student_id][0] += float(standing.exam_marks_obtained)
+        totals[standing.student_id][1] += standing.exam_marks_possible
+
+    grade_scale = GradeScale.for_school(class_obj.school_id)
+    grades = {}
+    for sid, (total_marks, total_possible) in totals.items():
+        if not total_possible:
+            grades[sid] = {'grade': '', 'percentage': None}
+            continue
+        pct = (total_marks / total_possible) * 100
+        grades[sid] = {
+            'grade': grade_scale.classify(pct),
+            'percentage': Decimal(str(round(pct, 2))),
+        }
+    return grades
 
-    results = ExamResult.all_objects.filter(
-        student=student,
-        exam__subject__class_obj=class_obj,
-        is_submitted=True,
-        marks_obtained__isnull=False,
-    ).select_related('exam')
-
-    if not results.exists():
-        return {'grade': '', 'percentage': None}
-
-    total_marks = sum(float(r.marks_obtained) for r in results)
-    total_possible = sum(r.exam.total_marks for r in results)
-
-    if total_possible == 0:
-        return {'grade': '', 'percentage': None}
-
-    pct = (total_marks / total_possible) * 100
-
-    if pct >= 91:
-        grade = 'A'
-    elif pct >= 86:
-        grade = 'A-'
-    elif pct >= 81:
-        grade = 'B+'
-    elif pct >= 76:
-        grade = 'B'
-    elif pct >= 71:
-        grade = 'B-'
-    elif pct >= 65:
-        grade = 'C+'
-    elif pct >= 60:
-        grade = 'C'
-    elif pct >= 50:
-        grade = 'C-'
-    else:
-        grade = 'F'
+def calculate_student_grade(class_obj, student) -> Dict[str, Any]:
 
-    return {
-        'grade': grade,
-        'percentage': Decimal(str(round(pct, 2))),
-    }
+    return calculate_student_grades(class_obj, [student.id])[student.id]
 
 def calculate_attendance_percentage(class_obj, student) -> Optional[Decimal]:
 
@@ -388,13 +1315,17 @@ def calculate_attendance_percentage(class_obj, student) -> Optional[Decimal]:
 
     return Decimal(str(round((attended / total_sessions) * 100, 2)))
 
-def issue_certificate(enrollment, issued_by, *, template: CertificateTemplate = None, generate_pdf: bool = True, ):
+def issue_certificate(enrollment, issued_by, *, template: CertificateTemplate = None, generate_pdf: bool = True, completion_status: Optional[Dict[str, Any]] = None, grade_data: Optional[Dict[str, Any]] = None, certificate_number: Optional[str] = None, ):
     if hasattr(enrollment, 'certificate'):
         return None, 'Certificate already issued for this enrollment.'
 
     class_obj = enrollment.class_obj
 
-    status = get_class_completion_status(class_obj, enrollment.student)
+    status = completion_status
+    if status is None:
+        status = get_class_standing_statuses(
+            class_obj, [enrollment.student_id],
+        )[enrollment.student_id]
     if not status['is_academically_complete']:
         incomplete = [
             s['subject_name'] for s in status['subjects'] if not s['is_complete']
@@ -404,7 +1335,8 @@ def issue_certificate(enrollment, issued_by, *, template: CertificateTemplate =
     if not template:
         template = _resolve_default_template(enrollment.school)
 
-    grade_data = calculate_student_grade(class_obj, enrollment.student)
+    if grade_data is None:
+        grade_data = calculate_student_grade(class_obj, enrollment.student)
     attendance_pct = calculate_attendance_percentage(class_obj, enrollment.student)
 
     certificate = Certificate.objects.create(
@@ -414,6 +1346,7 @@ def issue_certificate(enrollment, issued_by, *, template: CertificateTemplate =
         school=enrollment.school,
         template=template,
         issued_by=issued_by,
+        certificate_number=certificate_number or '',
         completion_date=timezone.now().date(),
         final_grade=grade_data.get('grade', ''),
         final_percentage=grade_data.get('percentage'),
@@ -447,10 +1380,12 @@ def _resolve_default_template(school) -> Optional[CertificateTemplate]:
     qs = CertificateTemplate.objects.filter(school=school, is_active=True)
     return qs.filter(is_default=True).first() or qs.first()
 
-def close_class(class_obj, closed_by):
+CLASS_CLOSURE_REPORT_KEY = 'class_closure:{class_id}'
+
+def class_closure_blocker(class_obj) -> Optional[str]:
 
     if class_obj.is_closed:
-        return False, 'Class is already closed.'
+        return 'Class is already closed.'
 
     active_without_cert = Enrollment.all_objects.filter(
         class_obj=class_obj, is_active=True,
@@ -459,36 +1394,129 @@ def close_class(class_obj, closed_by):
     ).count()
 
     if active_without_cert > 0:
-        return False, (
+        return (
             f'{active_without_cert} student(s) still have active enrollments '
             'without certificates. Issue certificates to all eligible students '
             'before closing the class.'
         )
+    return None
 
-    class_obj.is_closed = True
-    class_obj.is_active = False
-    class_obj.closed_at = timezone.now()
-    class_obj.closed_by = closed_by
-    class_obj.save(update_fields=['is_closed', 'is_active','closed_at', 'closed_by'])
+def close_class(class_obj, closed_by) -> Tuple[bool, Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Close a class and complete its enrollments in bulk.
 
-    enrollments = Enrollment.all_objects.filter(class_obj=class_obj, is_active=True)
-    for enrollment in enrollments:
-        enrollment.is_active = False
-        if not enrollment.completion_date:
-            enrollment.completion_date = timezone.now().date()
-        if not enrollment.completed_via:
-            enrollment.completed_via = 'admin_closure'
-        enrollment.save(update_fields=['is_active', 'completion_date', 'completed_via'])
+    Enrollments are closed with a single UPDATE and every SchoolMembership
+    left without an active enrollment is completed in one set-based pass.
+    Returns ``(success, error, report)``.
+    """
+    from core.services.qr_scans import invalidate_class_qr_scan_contexts
 
-        _try_complete_membership(enrollment)
+    error = class_closure_blocker(class_obj)
+    if error:
+        return False, error, None
 
-    return True, None
+    now = timezone.now()
+    today = now.date()
+
+    with transaction.atomic():
+        class_obj.is_closed = True
+        class_obj.is_active = False
+        class_obj.closed_at = now
+        class_obj.closed_by = closed_by
+        class_obj.save(update_fields=['is_closed', 'is_active','closed_at', 'closed_by'])
+
+        enrollments = Enrollment.all_objects.filter(class_obj=class_obj, is_active=True)
+        closing = list(enrollments.values_list('student_id', 'membership_id', 'school_id'))
+
+        enrollments_closed = enrollments.update(
+            is_active=False,
+            completion_date=Coalesce('completion_date', Value(today)),
+            completed_via=Case(
+                When(Q(completed_via__isnull=True) | Q(completed_via=''), then=Value('admin_closure')),
+                default=F('completed_via'),
+            ),
+        )
+        # The UPDATE skips the Enrollment receivers that keep derived data fresh.
+        schedule_session_stats_refresh(class_id=class_obj.id)
+        schedule_class_snapshot_refresh(class_obj.id)
+
+        membership_ids = {m for _, m, _ in closing if m}
+        orphan_students = defaultdict(set)
+        for student_id, membership_id, school_id in closing:
+            if not membership_id and school_id:
+                orphan_students[school_id].add(student_id)
+
+        completable = Q(
+            id__in=membership_ids,
+        ) & ~Exists(Enrollment.all_objects.filter(
+            membership_id=OuterRef('pk'), is_active=True,
+        ))
+        for school_id, student_ids in orphan_students.items():
+            completable |= Q(
+                school_id=school_id, user_id__in=student_ids,
+            ) & ~Exists(Enrollment.all_objects.filter(
+                student_id=OuterRef('user_id'),
+                school_id=OuterRef('school_id'),
+                is_active=True,
+            ))
+
+        completed = list(
+            SchoolMembership.all_objects
+            .filter(status=SchoolMembership.Status.ACTIVE)
+            .filter(completable)
+            .values_list('id', 'user_id', 'school_id')
+        )
+        if completed:
+            SchoolMembership.all_objects.filter(
+                id__in=[m[0] for m in completed],
+            ).update(
+                status=SchoolMembership.Status.COMPLETED,
+                ended_at=now,
+                completion_date=today,
+                updated_at=now,
+            )
+
+    invalidate_class_qr_scan_contexts(class_obj.id)
+    school_ids = {school_id for _, _, school_id in closing if school_id}
+    if class_obj.school_id:
+        school_ids.add(class_obj.school_id)
+    cache.delete_many(
+        [f'school_stats:{sid}' for sid in school_ids]
+        + [f'membership:{user_id}:{school_id}' for _, user_id, school_id in completed]
+    )
+
+    report = {
+        'status': 'completed',
+        'class_id': class_obj.id,
+        'class_name': class_obj.name,
+        'closed_at': now.isoformat(),
+        'closed_by': closed_by.id if closed_by else None,
+        'enrollments_closed': enrollments_closed,
+        'memberships_completed': len(completed),
+        'memberships_still_active': len(
+            {s for s, _, _ in closing} - {user_id for _, user_id, _ in completed}
+        ),
+    }
+    cache.set(CLASS_CLOSURE_REPORT_KEY.format(class_id=class_obj.id), report, timeout=60 * 60 * 24)
+    return True, None, report
 
 def bulk_issue_certificates(class_obj, issued_by, *, template=None, generate_pdf=True):
 
-    enrollments = Enrollment.all_objects.filter(
+    enrollments = list(Enrollment.all_objects.filter(
         class_obj=class_obj, is_active=True,
-    ).select_related('student')
+    ).select_related('student', 'class_obj', 'school', 'certificate'))
+
+    pending_ids = [e.student_id for e in enrollments if not hasattr(e, 'certificate')]
+    statuses = get_class_standing_statuses(class_obj, pending_ids)
+    grades = calculate_student_grades(class_obj, pending_ids)
+
+    eligible_count = sum(
+        1 for sid in pending_ids if statuses[sid]['is_academically_complete']
+    )
+    numbers = iter(
+        Certificate.reserve_numbers(class_obj.school, eligible_count)
+        if eligible_count else []
+    )
 
     issued = []
     skipped = []
@@ -498,6 +1526,8 @@ def bulk_issue_certificates(class_obj, issued_by, *, template=None, generate_pdf
         if hasattr(enrollment, 'certificate'):
             skipped.append({
                 'student': enrollment.student.svc_number,
+                'student_name': enrollment.student.get_full_name(),
+                'enrollment_id': enrollment.id,
                 'reason': 'already_issued',
             })
             continue
@@ -506,16 +1536,27 @@ def bulk_issue_certificates(class_obj, issued_by, *, template=None, generate_pdf
             enrollment, issued_by,
             template=template,
             generate_pdf=generate_pdf,
+            completion_status=statuses.get(enrollment.student_id),
+            grade_data=grades.get(enrollment.student_id),
+            certificate_number=(
+                next(numbers, None)
+                if statuses[enrollment.student_id]['is_academically_complete'] else None
+            ),
         )
 
         if certificate:
             issued.append({
                 'student': enrollment.student.svc_number,
+                'student_name': enrollment.student.get_full_name(),
+                'enrollment_id': enrollment.id,
+                'certificate_id': str(certificate.id),
                 'certificate_number': certificate.certificate_number,
             })
         else:
             failed.append({
                 'student': enrollment.student.svc_number,
+                'student_name': enrollment.student.get_full_name(),
+                'enrollment_id': enrollment.id,
                 'reason': error,
             })
 
@@ -528,6 +1569,160 @@ def bulk_issue_certificates(class_obj, issued_by, *, template=None, generate_pdf
         'failed': failed,
     }
 
+def start_certificate_issuance_job(class_obj, issued_by, *, template=None):
+    """
+    Create every Certificate row for the class in one transaction and queue
+    the PDF rendering as a background job. Returns (job, issuance_report).
+    """
+    from core.tasks import run_certificate_issuance_job
+
+    with transaction.atomic():
+        report = bulk_issue_certificates(
+            class_obj, issued_by, template=template, generate_pdf=False,
+        )
+
+        job = CertificateIssuanceJob.objects.create(
+            school=class_obj.school,
+            class_obj=class_obj,
+            template=template,
+            requested_by=issued_by,
+            total_students=(
+                report['issued_count'] + report['skipped_count'] + report['failed_count']
+            ),
+        )
+
+        items = [
+            CertificateIssuanceJobItem(
+                job=job,
+                enrollment_id=entry['enrollment_id'],
+                certificate_id=entry['certificate_id'],
+                student_svc_number=entry['student'] or '',
+                student_name=entry['student_name'],
+                status='pending',
+            )
+            for entry in report['issued']
+        ]
+        items += [
+            CertificateIssuanceJobItem(
+                job=job,
+                enrollment_id=entry['enrollment_id'],
+                student_svc_number=entry['student'] or '',
+                student_name=entry['student_name'],
+                status='skipped',
+                error=entry['reason'],
+            )
+            for entry in report['skipped']
+        ]
+        items += [
+            CertificateIssuanceJobItem(
+                job=job,
+                enrollment_id=entry['enrollment_id'],
+                student_svc_number=entry['student'] or '',
+                student_name=entry['student_name'],
+                status='failed',
+                error=entry['reason'],
+            )
+            for entry in report['failed']
+        ]
+        CertificateIssuanceJobItem.objects.bulk_create(items)
+
+        transaction.on_commit(
+            lambda: run_certificate_issuance_job.delay(str(job.id))
+        )
+
+    return job, report
+
+def render_certificate_job_items(job_id, item_ids):
+
+    items = CertificateIssuanceJobItem.objects.filter(
+        job_id=job_id, id__in=item_ids, status='pending',
+    ).select_related(
+        'certificate', 'certificate__school',
+        'certificate__template', 'certificate__class_obj',
+    )
+
+    for item in items:
+        try:
+            CertificateGenerator(item.certificate).save_to_model()
+            item.status = 'rendered'
+            item.error = ''
+        except Exception as e:
+            logger.error(
+                f"PDF generation failed for {item.certificate.certificate_number}: {e}",
+                exc_info=True,
+            )
+            item.status = 'failed'
+            item.error = str(e)
+        item.save(update_fields=['status', 'error', 'updated_at'])
+
+    return finalize_certificate_job(job_id)
+
+def fail_certificate_job_items(job_id, item_ids, error) -> bool:
+    """
+    Give up on a chunk whose task exhausted its retries: its pending items
+    are marked failed so the job can still finish.
+    """
+    CertificateIssuanceJobItem.objects.filter(
+        job_id=job_id, id__in=item_ids, status='pending',
+    ).update(status='failed', error=str(error), updated_at=timezone.now())
+    return finalize_certificate_job(job_id)
+
+def finalize_certificate_job(job_id) -> bool:
+
+    counts = dict(
+        CertificateIssuanceJobItem.objects.filter(job_id=job_id)
+        .values_list('status')
+        .annotate(n=Count('id'))
+        .values_list('status', 'n')
+    )
+    if counts.get('pending'):
+        return False
+
+    final_status = 'completed_with_errors' if counts.get('failed') else 'completed'
+    CertificateIssuanceJob.all_objects.filter(
+        id=job_id, finished_at__isnull=True,
+    ).update(status=final_status, finished_at=timezone.now())
+    return True
+
+CERTIFICATE_JOB_ITEM_STATUSES = ('pending', 'rendered', 'failed', 'skipped')
+
+def annotate_certificate_job_progress(queryset):
+    """
+    Annotate per-status item counts on a CertificateIssuanceJob queryset so
+    certificate_job_progress does not query once per job.
+    """
+    return queryset.annotate(**{
+        f'items_{item_status}': Count('items', filter=Q(items__status=item_status))
+        for item_status in CERTIFICATE_JOB_ITEM_STATUSES
+    })
+
+def certificate_job_progress(job) -> Dict[str, int]:
+
+    if hasattr(job, 'items_pending'):
+        counts = {
+            item_status: getattr(job, f'items_{item_status}')
+            for item_status in CERTIFICATE_JOB_ITEM_STATUSES
+        }
+    else:
+        counts = dict(
+            job.items.values_list('status')
+            .annotate(n=Count('id'))
+            .values_list('status', 'n')
+        )
+    rendered = counts.get('rendered', 0)
+    pending = counts.get('pending', 0)
+    return {
+        'total': job.total_students,
+        'pending': pending,
+        'rendered': rendered,
+        'failed': counts.get('failed', 0),
+        'skipped': counts.get('skipped', 0),
+        'percent_complete': (
+            round(100 * (job.total_students - pending) / job.total_students, 1)
+            if job.total_students else 100.0
+        ),
+    }
+
 def _try_complete_membership(enrollment):
 
     membership = enrollment.membership
@@ -563,21 +1758,12 @@ def assign_student_index(enrollment: Enrollment) -> StudentIndex:
         )
 
     with transaction.atomic():
-        existing = (
-            StudentIndex.all_objects.select_for_update().filter(class_obj=enrollment.class_obj).order_by("-index_number")
-        )
-        if existing.exists():
-            last_num = int(existing.first().index_number)
-            next_num = last_num + 1
-        else:
-            next_num = enrollment.class_obj.index_start_from
-
-        index_str =  str(next_num).zfill(3)
+        next_num = ClassIndexSequence.reserve(enrollment.class_obj)
 
         student_index = StudentIndex.objects.create(
             enrollment = enrollment,
             class_obj = enrollment.class_obj,
-            index_number = index_str,
+            index_number = str(next_num).zfill(3),
             school = enrollment.school,
         )
     return student_index
@@ -589,32 +1775,27 @@ def bulk_assign_indexes(class_obj) -> list[StudentIndex]:
             class_obj = class_obj
         ).values_list("enrollment_id", flat=True)
 
-        un_indexed = Enrollment.all_objects.filter(
+        un_indexed = list(Enrollment.all_objects.filter(
             class_obj=class_obj,
             is_active=True,
         ).exclude(
             id__in=existing_enrollment_ids
-        ).select_for_update().order_by("enrollment_date", "id")
+        ).select_for_update().order_by("enrollment_date", "id"))
 
-        last = (
-            StudentIndex.all_objects
-            .filter(class_obj=class_obj)
-            .order_by("-index_number")
-            .first()
-        )
-        next_num = int(last.index_number) + 1 if last else class_obj.index_start_from
+        if not un_indexed:
+            return []
 
-        created = []
-        for enrollment in un_indexed:
-            idx = StudentIndex(
+        first_num = ClassIndexSequence.reserve(class_obj, len(un_indexed))
+
+        created = StudentIndex.all_objects.bulk_create([
+            StudentIndex(
                 enrollment=enrollment,
                 class_obj=class_obj,
-                index_number=str(next_num).zfill(3),
+                index_number=str(first_num + offset).zfill(3),
                 school=class_obj.school,
             )
-            idx.save()
-            created.append(idx)
-            next_num += 1
+            for offset, enrollment in enumerate(un_indexed)
+        ])
 
     return created
 
@@ -728,6 +1909,55 @@ CERTIFICATE_HTML_TEMPLATE = """<!DOCTYPE html>
 </html>"""
 
 
+class CertificateAssetCache:
+    """
+    Process-wide cache of base64 data URIs for certificate images (school
+    logos, signatures, the watermark). Entries are keyed on the file path
+    and invalidated when the file's mtime or size changes, so a batch of
+    certificates for the same school/template encodes each image once.
+    """
+
+    _entries: Dict[str, Tuple[Tuple[int, int], str]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def data_uri(cls, file_path: str) -> Optional[str]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+        entry = cls._entries.get(file_path)
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        mime = CertificateImageResolver._mime_type(file_path)
+        uri = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+        with cls._lock:
+            cls._entries[file_path] = (fingerprint, uri)
+        return uri
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+
+_font_config = None
+_font_config_pid = None
+
+def _get_font_config():
+    """One WeasyPrint FontConfiguration per worker process (created after fork)."""
+    global _font_config, _font_config_pid
+    if _font_config is None or _font_config_pid != os.getpid():
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+        _font_config_pid = os.getpid()
+    return _font_config
+
 class CertificateImageResolver:
 
     def __init__(self, school=None):
@@ -742,10 +1972,7 @@ class CertificateImageResolver:
             if not file_path or not os.path.exists(file_path):
                 logger.warning(f"Image file not found: {image_field.name}")
                 return None
-            with open(file_path, 'rb') as f:
-                data = f.read()
-            mime = self._mime_type(file_path)
-            return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+            return CertificateAssetCache.data_uri(file_path)
         except Exception as e:
             logger.error(f"Error converting image to base64: {e}", exc_info=True)
             return None
@@ -840,11 +2067,10 @@ class CertificateGenerator:
         # Watermark — use ka.png from media/certificate_logos/
         watermark_section = ''
         watermark_path = os.path.join(settings.MEDIA_ROOT, 'certificate_logos', 'ka.png')
-        if os.path.exists(watermark_path):
-            with open(watermark_path, 'rb') as f:
-                wm_data = base64.b64encode(f.read()).decode()
+        wm_uri = CertificateAssetCache.data_uri(watermark_path)
+        if wm_uri:
             watermark_section = (
-                f'<img src="data:image/png;base64,{wm_data}" class="watermark" alt="">'
+                f'<img src="{wm_uri}" class="watermark" alt="">'
             )
 
         # Rank / SVC line — output values only: svc_number rank name
@@ -986,10 +2212,8 @@ class CertificateGenerator:
 
     def _via_weasyprint(self, html: str) -> bytes:
         from weasyprint import HTML as WeasyprintHTML
-        from weasyprint.text.fonts import FontConfiguration
-        font_config = FontConfiguration()
         doc = WeasyprintHTML(string=html, base_url=str(settings.MEDIA_ROOT))
-        return doc.write_pdf(font_config=font_config)
+        return doc.write_pdf(font_config=_get_font_config())
 
     def _via_xhtml2pdf(self, html: str) -> bytes:
         from xhtml2pdf import pisa
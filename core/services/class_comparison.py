@@ -0,0 +1,180 @@
+"""
+Class comparison engine.
+
+Computes comparison metrics for any set of classes with a fixed number of
+grouped aggregate queries (class details, enrollments, exam results,
+sessions, attendance), then sorts and pages the rows in memory. The cost no
+longer depends on how many classes are compared beyond the size of those
+grouped result sets.
+"""
+from django.db.models import Count, F, Q, Sum
+
+from core.models import AttendanceSession, Class, Enrollment, ExamResult, SessionAttendance, User
+
+
+SORT_FIELDS = (
+    'class_name', 'course', 'enrolled_students', 'total_results',
+    'average_percentage', 'pass_rate', 'total_sessions',
+    'attendance_rate', 'expected_attendance_rate', 'combined_performance',
+)
+MAX_PAGE_SIZE = 200
+
+
+def _pct(numerator, denominator):
+    return round(numerator / denominator * 100, 2) if denominator else 0
+
+
+def class_comparison_rows(class_ids):
+    """
+    One row per class in ``class_ids`` with enrollment, result and
+    attendance metrics. ``attendance_rate`` is the present/late share of
+    recorded attendance; ``expected_attendance_rate`` is recorded attendance
+    over enrolled students x sessions.
+    """
+    class_ids = list(class_ids)
+    if not class_ids:
+        return []
+
+    classes = (
+        Class.all_objects.filter(id__in=class_ids)
+        .values(
+            'id', 'name', 'is_active', 'is_closed', 'course__name',
+            'instructor__first_name', 'instructor__last_name',
+            'instructor__rank', 'instructor__svc_number',
+        )
+    )
+    enrolled = dict(
+        Enrollment.all_objects.filter(class_obj_id__in=class_ids, is_active=True)
+        .values('class_obj_id').annotate(n=Count('id')).order_by()
+        .values_list('class_obj_id', 'n')
+    )
+    results = {
+        row['class_id']: row
+        for row in ExamResult.all_objects.filter(
+            exam__subject__class_obj_id__in=class_ids,
+            is_submitted=True,
+            marks_obtained__isnull=False,
+            exam__total_marks__gt=0,
+        )
+        .values(class_id=F('exam__subject__class_obj_id'))
+        .annotate(
+            tm=Sum('marks_obtained'),
+            tp=Sum('exam__total_marks'),
+            rc=Count('id'),
+            pc=Count('id', filter=Q(marks_obtained__gte=F('exam__total_marks') * 0.5)),
+        )
+        .order_by()
+    }
+    sessions = dict(
+        AttendanceSession.all_objects.filter(class_obj_id__in=class_ids)
+        .values('class_obj_id').annotate(n=Count('id')).order_by()
+        .values_list('class_obj_id', 'n')
+    )
+    attendance = {
+        row['class_id']: row
+        for row in SessionAttendance.all_objects.filter(session__class_obj_id__in=class_ids)
+        .values(class_id=F('session__class_obj_id'))
+        .annotate(
+            records=Count('id'),
+            present=Count('id', filter=Q(status__in=['present', 'late'])),
+        )
+        .order_by()
+    }
+
+    rank_labels = dict(User._meta.get_field('rank').flatchoices)
+    rows = []
+    for c in classes:
+        cid = c['id']
+        res = results.get(cid, {})
+        att = attendance.get(cid, {})
+        n_enrolled = enrolled.get(cid, 0)
+        n_sessions = sessions.get(cid, 0)
+        avg = _pct(float(res.get('tm') or 0), float(res.get('tp') or 0))
+        attendance_rate = _pct(att.get('present', 0), att.get('records', 0))
+        expected_rate = _pct(att.get('records', 0), n_enrolled * n_sessions)
+        instructor = ' '.join(
+            filter(None, [c['instructor__first_name'], c['instructor__last_name']])
+        ) or None
+
+        rows.append({
+            'class_id': cid,
+            'class_name': c['name'],
+            'course': c['course__name'],
+            'is_active': c['is_active'],
+            'is_closed': c['is_closed'],
+            'instructor': instructor,
+            'instructor_rank': rank_labels.get(c['instructor__rank']) if c['instructor__rank'] else None,
+            'instructor_svc_number': c['instructor__svc_number'],
+            'enrolled_students': n_enrolled,
+            'total_results': res.get('rc', 0),
+            'average_percentage': avg,
+            'pass_rate': _pct(res.get('pc', 0), res.get('rc', 0)),
+            'total_sessions': n_sessions,
+            'attendance_records': att.get('records', 0),
+            'attendance_rate': attendance_rate,
+            'expected_attendance_rate': expected_rate,
+            'combined_performance': round(avg * 0.7 + expected_rate * 0.3, 2),
+        })
+    return rows
+
+
+def sort_rows(rows, ordering):
+    """
+    Sort comparison rows by ``ordering`` (a SORT_FIELDS name, ``-`` prefix
+    for descending). Raises ValueError for unknown fields.
+    """
+    field = ordering.lstrip('-')
+    if field not in SORT_FIELDS:
+        raise ValueError(f'ordering must be one of: {", ".join(SORT_FIELDS)}')
+    if field in ('class_name', 'course'):
+        key = lambda r: (r.get(field) or '').lower()
+    else:
+        key = lambda r: r.get(field) or 0
+    return sorted(rows, key=key, reverse=ordering.startswith('-'))
+
+
+def paginate_rows(rows, page=None, page_size=None):
+    """
+    Slice ``rows`` for one page. Without a page size every row is returned,
+    which keeps the unpaginated response shape for existing callers.
+    Returns ``(rows, meta)``.
+    """
+    total = len(rows)
+    if not page_size:
+        return rows, {'total_classes': total}
+
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    total_pages = max(1, -(-total // page_size))
+    page = max(1, min(int(page or 1), total_pages))
+    start = (page - 1) * page_size
+    return rows[start:start + page_size], {
+        'total_classes': total,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': total_pages,
+    }
+
+
+def compare_classes(class_ids, *, ordering='-average_percentage', page=None, page_size=None):
+    """Sorted, optionally paginated comparison rows plus pagination metadata."""
+    rows = sort_rows(class_comparison_rows(class_ids), ordering)
+    return paginate_rows(rows, page, page_size)
+
+
+def compare_classes_from_params(class_ids, params, *, default_ordering='-average_percentage', aliases=None):
+    """
+    :func:`compare_classes` driven by request query params (``ordering``,
+    ``page``, ``page_size``). ``aliases`` maps response field names onto
+    SORT_FIELDS for endpoints whose payload renames a column. Raises
+    ValueError for an unknown ordering or a non-numeric page.
+    """
+    ordering = params.get('ordering') or default_ordering
+    field = ordering.lstrip('-')
+    if aliases and field in aliases:
+        ordering = ordering[:len(ordering) - len(field)] + aliases[field]
+    try:
+        page = int(params['page']) if params.get('page') else None
+        page_size = int(params['page_size']) if params.get('page_size') else None
+    except ValueError:
+        raise ValueError('page and page_size must be integers')
+    return compare_classes(class_ids, ordering=ordering, page=page, page_size=page_size)
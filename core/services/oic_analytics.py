@@ -0,0 +1,344 @@
+"""
+Batched analytics for OIC dashboards.
+
+Every per-class metric is computed with one grouped query per source table
+(``values('<class>').annotate(...)``) no matter how many classes an OIC is
+assigned, and the overview is cached per OIC until their assignments change.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from core.caching import single_flight_cached
+from core.models import (
+    AttendanceSession, Class, Enrollment, Exam, ExamReport, ExamResult,
+    OICRemark, SessionAttendance, Subject,
+)
+
+
+OIC_OVERVIEW_KEY = 'oic_overview:{school_id}:{oic_id}'
+OIC_OVERVIEW_TIMEOUT = 60
+ATTENDANCE_WINDOW_DAYS = 30
+
+PASS_FILTER = Q(marks_obtained__gte=F('exam__total_marks') * 0.5)
+
+
+def _pct(numerator, denominator):
+    return round(numerator / denominator * 100, 2) if denominator else 0
+
+
+def _result_totals(row):
+    """Derived averages for a row carrying result_count/total_marks/total_possible/pass_count."""
+    total_marks = float(row.get('total_marks') or 0)
+    total_possible = float(row.get('total_possible') or 0)
+    result_count = row.get('result_count') or 0
+    return {
+        'total_results': result_count,
+        'average_percentage': _pct(total_marks, total_possible),
+        'pass_rate': _pct(row.get('pass_count') or 0, result_count),
+    }
+
+
+def class_metrics(class_ids, *, school, oic=None):
+    """
+    Per-class metrics for ``class_ids`` as ``{class_id: {...}}``: enrollment
+    and subject counts, exam results, attendance over the last
+    ATTENDANCE_WINDOW_DAYS, and (when ``oic`` is given) exam reports still
+    awaiting that OIC's remark.
+    """
+    class_ids = list(class_ids)
+    if not class_ids:
+        return {}
+    since = timezone.now() - timedelta(days=ATTENDANCE_WINDOW_DAYS)
+
+    metrics = {
+        c['id']: {
+            'class_id': c['id'],
+            'class_name': c['name'],
+            'course': c['course__name'],
+            'is_active': c['is_active'],
+            'is_closed': c['is_closed'],
+            'enrollments': 0,
+            'subjects': 0,
+            'result_count': 0,
+            'total_marks': 0,
+            'total_possible': 0,
+            'pass_count': 0,
+            'sessions': 0,
+            'completed_sessions': 0,
+            'attendance_records': 0,
+            'present_count': 0,
+            'pending_remarks': 0,
+        }
+        for c in Class.all_objects.filter(id__in=class_ids)
+        .values('id', 'name', 'course__name', 'is_active', 'is_closed')
+    }
+
+    def _merge(rows, key, **fields):
+        for row in rows:
+            target = metrics.get(row[key])
+            if target is not None:
+                for dest, src in fields.items():
+                    target[dest] = row[src] or 0
+
+    _merge(
+        Enrollment.all_objects.filter(class_obj_id__in=class_ids, is_active=True)
+        .values('class_obj_id').annotate(n=Count('id')).order_by(),
+        'class_obj_id', enrollments='n',
+    )
+    _merge(
+        Subject.all_objects.filter(class_obj_id__in=class_ids, is_active=True)
+        .values('class_obj_id').annotate(n=Count('id')).order_by(),
+        'class_obj_id', subjects='n',
+    )
+    _merge(
+        ExamResult.all_objects.filter(
+            exam__subject__class_obj_id__in=class_ids,
+            is_submitted=True,
+            marks_obtained__isnull=False,
+            exam__total_marks__gt=0,
+        )
+        .values('exam__subject__class_obj_id')
+        .annotate(
+            rc=Count('id'),
+            tm=Sum('marks_obtained'),
+            tp=Sum('exam__total_marks'),
+            pc=Count('id', filter=PASS_FILTER),
+        )
+        .order_by(),
+        'exam__subject__class_obj_id',
+        result_count='rc', total_marks='tm', total_possible='tp', pass_count='pc',
+    )
+    _merge(
+        AttendanceSession.all_objects.filter(
+            school=school, class_obj_id__in=class_ids, scheduled_start__gte=since,
+        )
+        .values('class_obj_id')
+        .annotate(n=Count('id'), done=Count('id', filter=Q(status='completed')))
+        .order_by(),
+        'class_obj_id', sessions='n', completed_sessions='done',
+    )
+    _merge(
+        SessionAttendance.all_objects.filter(
+            session__school=school,
+            session__class_obj_id__in=class_ids,
+            session__scheduled_start__gte=since,
+        )
+        .values('session__class_obj_id')
+        .annotate(n=Count('id'), present=Count('id', filter=Q(status__in=['present', 'late'])))
+        .order_by(),
+        'session__class_obj_id', attendance_records='n', present_count='present',
+    )
+    if oic is not None:
+        _merge(
+            ExamReport.all_objects.filter(school=school, class_obj_id__in=class_ids)
+            .exclude(remarks__author_role='oic', remarks__author=oic)
+            .values('class_obj_id')
+            .annotate(n=Count('id', distinct=True))
+            .order_by(),
+            'class_obj_id', pending_remarks='n',
+        )
+
+    for m in metrics.values():
+        m['total_marks'] = float(m['total_marks'])
+        m.update(_result_totals(m))
+        m['attendance_rate'] = _pct(m['present_count'], m['attendance_records'])
+    return metrics
+
+
+def _empty_overview(school, my_remarks_count):
+    return {
+        'school': {
+            'id': str(school.id),
+            'name': school.name,
+            'code': school.code,
+        },
+        'user_role': 'oic',
+        'counts': {
+            'assigned_classes': 0,
+            'active_classes': 0,
+            'total_enrollments': 0,
+            'total_subjects': 0,
+            'my_remarks': my_remarks_count,
+            'pending_remarks': 0,
+        },
+        'attendance_summary': {
+            'period': 'last_30_days',
+            'total_sessions': 0,
+            'completed_sessions': 0,
+            'overall_attendance_rate': 0,
+        },
+        'exam_performance': {
+            'total_results': 0,
+            'average_performance': 0,
+            'pass_rate': 0,
+        },
+        'pending_actions': {
+            'reports_awaiting_your_remarks': 0,
+        },
+        'classes': [],
+        'message': 'You have no classes assigned yet.',
+    }
+
+
+@single_flight_cached(
+    lambda oic, school, class_ids: OIC_OVERVIEW_KEY.format(school_id=school.id, oic_id=oic.id),
+    timeout=OIC_OVERVIEW_TIMEOUT,
+)
+def oic_overview(oic, school, class_ids):
+    """
+    OIC dashboard payload: school-wide totals across the assigned classes
+    plus a per-class ``classes`` breakdown. Cached per OIC; see
+    :func:`invalidate_oic_overview`.
+    """
+    my_remarks_count = OICRemark.all_objects.filter(oic=oic, school=school).count()
+    if not class_ids:
+        return _empty_overview(school, my_remarks_count)
+
+    metrics = class_metrics(class_ids, school=school, oic=oic)
+    rows = sorted(metrics.values(), key=lambda m: m['class_name'])
+
+    totals = {
+        field: sum(m[field] for m in rows)
+        for field in (
+            'enrollments', 'subjects', 'result_count', 'total_marks', 'total_possible',
+            'pass_count', 'sessions', 'completed_sessions', 'attendance_records',
+            'present_count', 'pending_remarks',
+        )
+    }
+    results = _result_totals(totals)
+
+    return {
+        'school': {
+            'id': str(school.id),
+            'name': school.name,
+            'code': school.code,
+        },
+        'user_role': 'oic',
+        'counts': {
+            'assigned_classes': len(rows),
+            'active_classes': sum(1 for m in rows if m['is_active'] and not m['is_closed']),
+            'total_enrollments': totals['enrollments'],
+            'total_subjects': totals['subjects'],
+            'my_remarks': my_remarks_count,
+            'pending_remarks': totals['pending_remarks'],
+        },
+        'attendance_summary': {
+            'period': 'last_30_days',
+            'total_sessions': totals['sessions'],
+            'completed_sessions': totals['completed_sessions'],
+            'overall_attendance_rate': _pct(totals['present_count'], totals['attendance_records']),
+        },
+        'exam_performance': {
+            'total_results': results['total_results'],
+            'average_performance': results['average_percentage'],
+            'pass_rate': results['pass_rate'],
+        },
+        'pending_actions': {
+            'reports_awaiting_your_remarks': totals['pending_remarks'],
+        },
+        'classes': [
+            {
+                'class_id': str(m['class_id']),
+                'class_name': m['class_name'],
+                'course': m['course'],
+                'is_active': m['is_active'],
+                'is_closed': m['is_closed'],
+                'enrollments': m['enrollments'],
+                'subjects': m['subjects'],
+                'total_results': m['total_results'],
+                'average_percentage': m['average_percentage'],
+                'pass_rate': m['pass_rate'],
+                'total_sessions': m['sessions'],
+                'completed_sessions': m['completed_sessions'],
+                'attendance_rate': m['attendance_rate'],
+                'pending_remarks': m['pending_remarks'],
+            }
+            for m in rows
+        ],
+    }
+
+
+def invalidate_oic_overview(oic_id, school_id):
+    cache.delete(OIC_OVERVIEW_KEY.format(school_id=school_id, oic_id=oic_id))
+
+
+def class_results_summary(class_obj):
+    """
+    Per-subject and overall exam statistics for one class: a single grouped
+    result query (totals, pass count, highest and lowest percentage) plus
+    one for exam counts. Overall figures are summed from the subject rows.
+    """
+    subjects = list(
+        Subject.all_objects.filter(class_obj=class_obj, is_active=True)
+        .select_related('instructor')
+    )
+    pct = Cast(F('marks_obtained'), FloatField()) * 100.0 / F('exam__total_marks')
+    agg_map = {
+        row['exam__subject_id']: row
+        for row in ExamResult.all_objects.filter(
+            exam__subject__class_obj=class_obj,
+            exam__subject__is_active=True,
+            is_submitted=True,
+            marks_obtained__isnull=False,
+            exam__total_marks__gt=0,
+        )
+        .values('exam__subject_id')
+        .annotate(
+            result_count=Count('id'),
+            total_marks=Sum('marks_obtained'),
+            total_possible=Sum('exam__total_marks'),
+            pass_count=Count('id', filter=PASS_FILTER),
+            max_pct=Max(pct),
+            min_pct=Min(pct),
+        )
+        .order_by()
+    }
+    exam_count_map = dict(
+        Exam.all_objects.filter(
+            subject__class_obj=class_obj, subject__is_active=True, is_active=True,
+        )
+        .values('subject_id')
+        .annotate(n=Count('id'))
+        .order_by()
+        .values_list('subject_id', 'n')
+    )
+
+    subject_performance = []
+    overall = {'result_count': 0, 'total_marks': 0.0, 'total_possible': 0.0, 'pass_count': 0}
+    for subject in subjects:
+        agg = agg_map.get(subject.id) or {}
+        totals = _result_totals(agg)
+        overall['result_count'] += agg.get('result_count') or 0
+        overall['pass_count'] += agg.get('pass_count') or 0
+        overall['total_marks'] += float(agg.get('total_marks') or 0)
+        overall['total_possible'] += float(agg.get('total_possible') or 0)
+        subject_performance.append({
+            'subject_id': str(subject.id),
+            'subject_name': subject.name,
+            'instructor': subject.instructor.get_full_name() if subject.instructor else None,
+            'total_exams': exam_count_map.get(subject.id, 0),
+            'total_results': totals['total_results'],
+            'average_percentage': totals['average_percentage'],
+            'pass_rate': totals['pass_rate'],
+            'highest_score': round(agg['max_pct'], 2) if agg.get('max_pct') else 0,
+            'lowest_score': round(agg['min_pct'], 2) if agg.get('min_pct') else 0,
+        })
+
+    overall_totals = _result_totals(overall)
+    return {
+        'class': {
+            'id': str(class_obj.id),
+            'name': class_obj.name,
+            'course': class_obj.course.name,
+        },
+        'overall_statistics': {
+            'average_percentage': overall_totals['average_percentage'],
+            'pass_rate': overall_totals['pass_rate'],
+            'total_results': overall_totals['total_results'],
+        },
+        'subject_performance': subject_performance,
+    }
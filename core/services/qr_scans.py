@@ -0,0 +1,326 @@
+"""
+QR scan ingestion.
+
+A whole intake scanning in the same QR window used to cost every request a
+session lookup, an enrollment check, a duplicate check and an INSERT. Scans
+are now checked against a cached per-session context (the session row, its
+enrolled student ids and the students already marked) and accepted marks
+are pushed onto a Redis list. :func:`flush_qr_scans` drains that list into
+SessionAttendance in batches; the unique (session, student) constraint and
+a per-student cache key make every mark idempotent. Each batch is moved to
+its own processing list first and only deleted once its rows are
+committed, so a flush worker dying mid-batch leaves the marks to be
+re-queued by the next flush.
+
+Without a Redis cache (local development, tests) the queue is skipped and
+each mark is written straight away through the same code.
+"""
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import AttendanceSession, Enrollment, SessionAttendance
+from core.services import (
+    mark_school_stats_dirty, schedule_class_snapshot_refresh, schedule_session_stats_refresh,
+)
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'qr_scan_queue'
+FLUSH_SCHEDULED_KEY = 'qr_scan_flush_scheduled'
+# Sorted set of in-flight batch lists, scored by the time they were taken.
+PROCESSING_KEY = 'qr_scan_processing'
+# Long enough to cover a session; the database constraint backs it up afterwards.
+MARKED_TIMEOUT = 60 * 60 * 12
+
+
+def _context_key(session_uuid):
+    return f'qr_scan_context:{session_uuid}'
+
+
+def _marked_key(session_pk, student_id):
+    return f'qr_scan_marked:{session_pk}:{student_id}'
+
+
+def _redis_client():
+    """Raw client behind the default cache, or None when it is not Redis."""
+    backend = getattr(cache, '_cache', None)
+    if hasattr(backend, 'get_client'):
+        return backend.get_client(write=True)
+    client = getattr(cache, 'client', None)
+    if hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    return None
+
+
+def qr_scan_context(session_uuid):
+    """
+    ``{'session', 'enrolled', 'marked'}`` for an active session, cached for
+    ``QR_SCAN_CONTEXT_TTL`` seconds, or None when no such session exists.
+    """
+    key = _context_key(session_uuid)
+    context = cache.get(key)
+    if context is not None:
+        return context
+
+    session = (
+        AttendanceSession.all_objects.select_related('class_obj', 'subject')
+        .filter(session_id=session_uuid, is_active=True).first()
+    )
+    if session is None:
+        return None
+    context = {
+        'session': session,
+        'enrolled': frozenset(
+            Enrollment.all_objects.filter(class_obj_id=session.class_obj_id, is_active=True)
+            .values_list('student_id', flat=True)
+        ),
+        'marked': frozenset(
+            SessionAttendance.all_objects.filter(session=session).values_list('student_id', flat=True)
+        ),
+    }
+    cache.set(key, context, settings.QR_SCAN_CONTEXT_TTL)
+    return context
+
+
+def invalidate_qr_scan_context(session_uuids):
+    cache.delete_many([_context_key(session_uuid) for session_uuid in session_uuids])
+
+
+def invalidate_class_qr_scan_contexts(class_id):
+    invalidate_qr_scan_context(
+        AttendanceSession.all_objects.filter(class_obj_id=class_id, status='active')
+        .values_list('session_id', flat=True)
+    )
+
+
+def claim_qr_mark(context, student_id):
+    """
+    Reserve the student's mark for this session. False when the student is
+    already marked or another request got there first.
+    """
+    if student_id in context['marked']:
+        return False
+    return cache.add(_marked_key(context['session'].pk, student_id), 1, MARKED_TIMEOUT)
+
+
+def release_qr_mark(session_pk, student_id):
+    cache.delete(_marked_key(session_pk, student_id))
+
+
+def hold_qr_marks(session_pk, student_ids):
+    """
+    Claim the marks of students marked outside the QR path once the
+    transaction commits, so a later scan is refused instead of queued and
+    dropped.
+    """
+    keys = {_marked_key(session_pk, student_id): 1 for student_id in student_ids}
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(keys, MARKED_TIMEOUT))
+
+
+def claimed_qr_marks(pairs):
+    """
+    The ``(session_pk, student_id)`` pairs holding a mark claim: scans that
+    are written or still waiting in the queue.
+    """
+    keys = {_marked_key(session_pk, student_id): (session_pk, student_id) for session_pk, student_id in pairs}
+    if not keys:
+        return set()
+    return {keys[key] for key in cache.get_many(list(keys))}
+
+
+def enqueue_qr_mark(session, student_id, *, status, latitude=None,
+                    longitude=None, ip_address=None, user_agent='', scanned_at=None):
+    """Queue one claimed mark, or write it at once without a Redis cache."""
+    mark = {
+        'school_id': str(session.school_id) if session.school_id else None,
+        'session_id': session.pk,
+        'class_id': session.class_obj_id,
+        'scheduled_start': session.scheduled_start.isoformat(),
+        'student_id': student_id,
+        'status': status,
+        'latitude': str(latitude) if latitude is not None else None,
+        'longitude': str(longitude) if longitude is not None else None,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'scanned_at': (scanned_at or timezone.now()).isoformat(),
+    }
+    client = _redis_client()
+    if client is None:
+        write_qr_marks([mark])
+        return
+
+    client.rpush(cache.make_key(QUEUE_KEY), json.dumps(mark))
+    # One flush task per burst: the first scan after a drain schedules it.
+    if cache.add(FLUSH_SCHEDULED_KEY, 1, settings.QR_SCAN_FLUSH_DELAY * 4):
+        from core.tasks import flush_qr_scans
+        try:
+            flush_qr_scans.apply_async(countdown=settings.QR_SCAN_FLUSH_DELAY)
+        except Exception as e:
+            cache.delete(FLUSH_SCHEDULED_KEY)
+            logger.error(f"Failed to schedule QR scan flush: {e}")
+
+
+def write_qr_marks(marks):
+    """
+    Insert marks into SessionAttendance, skipping students that already
+    have a row for the session unless that row is a system absence recorded
+    after the scan. Returns the number of marks handled.
+    """
+    rows = [
+        SessionAttendance(
+            school_id=mark['school_id'],
+            session_id=mark['session_id'],
+            student_id=mark['student_id'],
+            status=mark['status'],
+            marking_method='qr_scan',
+            marked_by_id=mark['student_id'],
+            latitude=mark['latitude'],
+            longitude=mark['longitude'],
+            ip_address=mark['ip_address'],
+            user_agent=mark['user_agent'],
+            **_scan_time(mark),
+        )
+        for mark in marks
+    ]
+    if not rows:
+        return 0
+
+    session_days = defaultdict(set)
+    with transaction.atomic():
+        SessionAttendance.all_objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+        _replace_later_absences(marks)
+        # bulk_create skips the post_save receivers that keep derived data fresh.
+        for mark in marks:
+            session_days[(mark['school_id'], mark['class_id'])].add(
+                timezone.localdate(datetime.fromisoformat(mark['scheduled_start']))
+            )
+        for session_id in {mark['session_id'] for mark in marks}:
+            schedule_session_stats_refresh(session_id)
+        for (school_id, class_id), days in session_days.items():
+            schedule_class_snapshot_refresh(class_id)
+            for day in days:
+                mark_school_stats_dirty(school_id, day)
+    return len(rows)
+
+
+def _scan_time(mark):
+    # Marks keep the time of the scan, not of the flush that wrote them, so
+    # minutes_late and the absence ordering below stay accurate.
+    if mark.get('scanned_at'):
+        return {'marked_at': datetime.fromisoformat(mark['scanned_at'])}
+    return {}
+
+
+def _replace_later_absences(marks):
+    # A scan still queued when the session was closed out reaches the table
+    # after the absentee sweep; the absence it collided with gives way.
+    scans = {
+        (mark['session_id'], mark['student_id']): mark
+        for mark in marks if mark.get('scanned_at')
+    }
+    if not scans:
+        return
+    absences = SessionAttendance.all_objects.filter(
+        session_id__in={session_id for session_id, _ in scans},
+        student_id__in={student_id for _, student_id in scans},
+        status='absent', marking_method='admin',
+    )
+    replaced = []
+    for row in absences:
+        mark = scans.get((row.session_id, row.student_id))
+        if mark is None or row.marked_at < datetime.fromisoformat(mark['scanned_at']):
+            continue
+        row.status = mark['status']
+        row.marking_method = 'qr_scan'
+        row.marked_by_id = mark['student_id']
+        row.latitude = mark['latitude']
+        row.longitude = mark['longitude']
+        row.ip_address = mark['ip_address']
+        row.user_agent = mark['user_agent']
+        row.remarks = None
+        row.marked_at = datetime.fromisoformat(mark['scanned_at'])
+        replaced.append(row)
+    if replaced:
+        SessionAttendance.all_objects.bulk_update(
+            replaced,
+            ['status', 'marking_method', 'marked_by', 'latitude', 'longitude',
+             'ip_address', 'user_agent', 'remarks', 'marked_at'],
+            batch_size=500,
+        )
+
+
+def _take_batch(client, queue_key, batch_size):
+    """Move up to ``batch_size`` queued marks onto a fresh processing list."""
+    count = min(batch_size, client.llen(queue_key))
+    if not count:
+        return None, []
+    batch_key = cache.make_key(f'{PROCESSING_KEY}:{uuid.uuid4().hex}')
+    pipe = client.pipeline()
+    pipe.zadd(cache.make_key(PROCESSING_KEY), {batch_key: time.time()})
+    for _ in range(count):
+        pipe.lmove(queue_key, batch_key, 'LEFT', 'RIGHT')
+    items = [item for item in pipe.execute()[1:] if item is not None]
+    return batch_key, items
+
+
+def _release_batch(client, batch_key):
+    pipe = client.pipeline()
+    pipe.delete(batch_key)
+    pipe.zrem(cache.make_key(PROCESSING_KEY), batch_key)
+    pipe.execute()
+
+
+def requeue_stale_qr_scans(client, queue_key) -> int:
+    """
+    Put the marks of batches taken more than ``QR_SCAN_PROCESSING_TIMEOUT``
+    seconds ago back at the head of the queue. Returns the count re-queued.
+    """
+    processing_key = cache.make_key(PROCESSING_KEY)
+    stale = client.zrangebyscore(
+        processing_key, '-inf', time.time() - settings.QR_SCAN_PROCESSING_TIMEOUT,
+    )
+    requeued = 0
+    for batch_key in stale:
+        while client.lmove(batch_key, queue_key, 'RIGHT', 'LEFT') is not None:
+            requeued += 1
+        client.zrem(processing_key, batch_key)
+    if requeued:
+        logger.warning(f"Re-queued {requeued} QR scan marks from stalled flushes")
+    return requeued
+
+
+def flush_qr_scans(batch_size=None) -> int:
+    """Drain the queued QR marks into SessionAttendance. Returns the count written."""
+    client = _redis_client()
+    if client is None:
+        return 0
+    batch_size = batch_size or settings.QR_SCAN_FLUSH_BATCH_SIZE
+    key = cache.make_key(QUEUE_KEY)
+    # Cleared before draining so scans arriving meanwhile schedule another flush.
+    cache.delete(FLUSH_SCHEDULED_KEY)
+    requeue_stale_qr_scans(client, key)
+
+    written = 0
+    while True:
+        batch_key, items = _take_batch(client, key, batch_size)
+        if not items:
+            if batch_key:
+                _release_batch(client, batch_key)
+            return written
+        # On failure the batch stays in its processing list until re-queued.
+        written += write_qr_marks([json.loads(item) for item in items])
+        transaction.on_commit(partial(_release_batch, client, batch_key))
+        if len(items) < batch_size:
+            return written
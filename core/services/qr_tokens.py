@@ -0,0 +1,94 @@
+"""
+QR display counters.
+
+``AttendanceSession.generate_qr_token`` is pure, so showing a QR code costs
+no database write. How often a session's code was displayed is counted in
+the cache (Redis in production) by :func:`record_qr_generation` and folded
+into ``qr_generation_count`` / ``qr_last_generated`` by
+:func:`flush_qr_generation_counters`, which Celery beat runs every
+``QR_COUNTER_FLUSH_INTERVAL`` seconds.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import AttendanceSession, AttendanceSessionLog
+
+
+# Counters outlive several missed flushes before the cache may drop them.
+COUNTER_TIMEOUT = 60 * 60 * 24
+
+
+def _count_key(session_pk):
+    return f'qr_generations:{session_pk}'
+
+
+def _last_key(session_pk):
+    return f'qr_last_generated:{session_pk}'
+
+
+def record_qr_generation(session, at=None):
+    """Count one QR display for ``session`` in the cache."""
+    at = at or timezone.now()
+    key = _count_key(session.pk)
+    cache.add(key, 0, COUNTER_TIMEOUT)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr.
+        cache.set(key, 1, COUNTER_TIMEOUT)
+    cache.set(_last_key(session.pk), at.timestamp(), COUNTER_TIMEOUT)
+
+
+def qr_generation_stats(session):
+    """``(count, last_generated)`` including displays not flushed yet."""
+    values = cache.get_many([_count_key(session.pk), _last_key(session.pk)])
+    count = session.qr_generation_count + (values.get(_count_key(session.pk)) or 0)
+    last = values.get(_last_key(session.pk))
+    if last is None:
+        return count, session.qr_last_generated
+    return count, datetime.fromtimestamp(last, tz=dt_timezone.utc)
+
+
+def flush_qr_generation_counters():
+    """
+    Add cached display counts to active (or just ended) sessions with one
+    UPDATE each and log them. Returns the number of sessions updated.
+    """
+    interval = getattr(settings, 'QR_COUNTER_FLUSH_INTERVAL', 60)
+    sessions = dict(
+        AttendanceSession.all_objects
+        .filter(Q(status='active') | Q(actual_end__gte=timezone.now() - timedelta(seconds=interval * 10)))
+        .values_list('pk', 'school_id')
+    )
+    keys = [key for pk in sessions for key in (_count_key(pk), _last_key(pk))]
+    values = cache.get_many(keys) if keys else {}
+
+    flushed = 0
+    for pk, school_id in sessions.items():
+        count = values.get(_count_key(pk)) or 0
+        if not count:
+            continue
+        # Subtract what was read rather than deleting, so displays counted meanwhile survive.
+        try:
+            cache.decr(_count_key(pk), count)
+        except ValueError:
+            pass
+        last = values.get(_last_key(pk))
+        last_generated = datetime.fromtimestamp(last, tz=dt_timezone.utc) if last else timezone.now()
+        AttendanceSession.all_objects.filter(pk=pk).update(
+            qr_generation_count=F('qr_generation_count') + count,
+            qr_last_generated=last_generated,
+        )
+        AttendanceSessionLog.all_objects.create(
+            school_id=school_id,
+            session_id=pk,
+            action='qr_generated',
+            description=f"QR code displayed {count} times",
+            metadata={'count': count, 'last_generated': last_generated.isoformat()},
+        )
+        flushed += 1
+    return flushed
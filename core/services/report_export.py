@@ -0,0 +1,133 @@
+"""
+Tabular exports of the class performance report.
+
+A report is a sequence of ``(title, header, rows)`` sections whose rows are
+iterators, so CSV can be streamed straight into a StreamingHttpResponse and
+XLSX written through an openpyxl write-only workbook without materialising
+the whole sheet.
+"""
+import csv
+import io
+
+
+RANKING_COLUMNS = [
+    ('rank', 'Rank'),
+    ('svc_number', 'SVC Number'),
+    ('student_name', 'Student Name'),
+    ('total_exams_taken', 'Exams Taken'),
+    ('exam_percentage', 'Exam %'),
+    ('sessions_attended', 'Sessions Attended'),
+    ('total_sessions', 'Total Sessions'),
+    ('attendance_rate', 'Attendance %'),
+    ('combined_score', 'Combined Score'),
+    ('overall_grade', 'Grade'),
+]
+
+SUBJECT_COLUMNS = [
+    ('subject_name', 'Subject'),
+    ('subject_code', 'Code'),
+    ('instructor', 'Instructor'),
+    ('total_exams', 'Exams'),
+    ('results_count', 'Results'),
+    ('exam_average', 'Exam Average %'),
+    ('pass_rate', 'Pass Rate %'),
+    ('highest_score', 'Highest %'),
+    ('lowest_score', 'Lowest %'),
+    ('total_sessions', 'Sessions'),
+    ('attendance_rate', 'Attendance %'),
+    ('combined_performance', 'Combined'),
+]
+
+BREAKDOWN_COLUMNS = [
+    ('exam_percentage', 'Exam %'),
+    ('attendance_rate', 'Attendance %'),
+    ('combined_score', 'Combined'),
+]
+
+
+def _columns(columns, source):
+    return ([label for _, label in columns], (
+        [row.get(key) for key, _ in columns] for row in source
+    ))
+
+
+def class_report_sections(snapshot, *, detailed=False):
+    """
+    Sections of a class performance export built from a
+    ClassPerformanceSnapshot loaded with its rankings. ``detailed`` adds one
+    row per student and subject.
+    """
+    data = snapshot.data
+    cls = data.get('class') or {}
+
+    yield 'Class', ['Field', 'Value'], iter([
+        ['Class', cls.get('name')],
+        ['Course', cls.get('course')],
+        ['Instructor', cls.get('instructor')],
+        ['Computed At', snapshot.computed_at.isoformat() if snapshot.computed_at else ''],
+    ])
+
+    stats = data.get('overall_statistics') or {}
+    yield 'Overall Statistics', ['Metric', 'Value'], (
+        [key.replace('_', ' ').title(), value] for key, value in stats.items()
+    )
+
+    distribution = data.get('grade_distribution') or {}
+    yield 'Grade Distribution', ['Grade', 'Results'], (
+        [grade, count] for grade, count in distribution.items()
+    )
+
+    header, rows = _columns(SUBJECT_COLUMNS, data.get('subject_performance') or [])
+    yield 'Subject Performance', header, rows
+
+    header, rows = _columns(RANKING_COLUMNS, snapshot.rankings or [])
+    yield 'Student Rankings', header, rows
+
+    if detailed:
+        yield 'Student Subject Breakdown', (
+            ['Rank', 'SVC Number', 'Student Name', 'Subject']
+            + [label for _, label in BREAKDOWN_COLUMNS]
+        ), (
+            [student.get('rank'), student.get('svc_number'), student.get('student_name'), item.get('subject_name')]
+            + [item.get(key) for key, _ in BREAKDOWN_COLUMNS]
+            for student in snapshot.rankings or []
+            for item in student.get('subject_breakdown') or []
+        )
+
+
+def iter_csv(sections):
+    """Yield CSV text one row at a time; sections are separated by a blank row."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    def _flush():
+        value = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return value
+
+    for index, (title, header, rows) in enumerate(sections):
+        if index:
+            writer.writerow([])
+        writer.writerow([title])
+        writer.writerow(header)
+        yield _flush()
+        for row in rows:
+            writer.writerow(row)
+            yield _flush()
+
+
+def write_xlsx(sections, fileobj):
+    """
+    Write one worksheet per section into ``fileobj`` with an openpyxl
+    write-only workbook. Raises ImportError when openpyxl is not installed.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, header, rows in sections:
+        sheet = workbook.create_sheet(title=title[:31])
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(fileobj)
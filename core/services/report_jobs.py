@@ -0,0 +1,199 @@
+"""
+Background report jobs.
+
+Report actions decorated with :func:`async_report` accept ``?async=1``:
+instead of computing the report in the web worker they record a ReportJob
+and answer 202 with its id. ``run_report_job`` then replays the same GET
+against the same view in a Celery worker, as the requesting user, and
+stores the zlib-compressed response for ``/api/report-jobs/{id}/``.
+"""
+import json
+import logging
+import re
+import zlib
+from datetime import timedelta
+from functools import wraps
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from core.managers import clear_current_school, set_current_school
+from core.models import ReportJob, SchoolMembership
+
+
+logger = logging.getLogger(__name__)
+
+FILENAME_RE = re.compile(r'filename="?([^";]+)"?')
+
+
+def _wants_async(request):
+    return request.query_params.get('async', '').lower() in ('1', 'true')
+
+
+def async_report(func):
+    """
+    Let a GET report action run as a ReportJob when called with
+    ``?async=1``. Only decorated actions can be replayed by the worker.
+    """
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        if _wants_async(request) and getattr(request, 'report_job', None) is None:
+            return enqueue_report_job(self, request, kwargs)
+        return func(self, request, *args, **kwargs)
+
+    wrapper.async_report = True
+    return wrapper
+
+
+def enqueue_report_job(view, request, view_kwargs):
+    """Record a ReportJob for the current request and queue it once committed."""
+    from core.tasks import run_report_job
+
+    query = request.query_params.copy()
+    query.pop('async', None)
+    url = request.build_absolute_uri(request.path)
+    if query:
+        url = f'{url}?{query.urlencode()}'
+
+    job = ReportJob.all_objects.create(
+        school=getattr(request, 'school', None),
+        requested_by=request.user,
+        view=f'{type(view).__module__}.{type(view).__qualname__}',
+        action=view.action,
+        url=url,
+        params=query.dict(),
+        view_kwargs={key: str(value) for key, value in view_kwargs.items()},
+    )
+    transaction.on_commit(lambda: run_report_job.delay(str(job.id)))
+
+    return Response(
+        {
+            'job_id': str(job.id),
+            'status': job.status,
+            'status_url': reverse('core:report-job-detail', args=[job.id], request=request),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+def _replay_request(job):
+    parts = urlsplit(job.url)
+    request = RequestFactory().get(
+        parts.path,
+        data=dict(job.params),
+        HTTP_HOST=parts.netloc,
+        HTTP_ACCEPT='application/json',
+        secure=parts.scheme == 'https',
+    )
+    # Picked up by DRF's Request in place of the configured authenticators.
+    request._force_auth_user = job.requested_by
+    request.school = job.school
+    request.membership = (
+        SchoolMembership.all_objects.filter(
+            user=job.requested_by, school=job.school, status='active',
+        ).first()
+        if job.school else None
+    )
+    request.report_job = job
+    return request
+
+
+def _response_body(response):
+    if getattr(response, 'streaming', False):
+        try:
+            return b''.join(response.streaming_content)
+        finally:
+            response.close()
+    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+        response.render()
+    return response.content
+
+
+def _set_progress(job, progress, **fields):
+    job.progress = progress
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=['progress', *fields])
+
+
+def run_report_job(job_id):
+    """Execute a pending ReportJob and store its response."""
+    try:
+        job = ReportJob.all_objects.select_related('requested_by', 'school').get(id=job_id)
+    except ReportJob.DoesNotExist:
+        return {'status': 'error', 'message': 'Job not found'}
+    # Claim the job in one UPDATE so a redelivered task cannot run it twice.
+    started_at = timezone.now()
+    claimed = ReportJob.all_objects.filter(id=job.id, status='pending').update(
+        status='running', started_at=started_at, progress=10,
+    )
+    if not claimed:
+        return {'status': 'skipped', 'job_id': str(job.id)}
+    job.status, job.started_at, job.progress = 'running', started_at, 10
+
+    try:
+        view_class = import_string(job.view)
+        if not getattr(getattr(view_class, job.action, None), 'async_report', False):
+            raise ValueError(f'{job.view}.{job.action} cannot run as a report job')
+
+        set_current_school(job.school)
+        try:
+            response = view_class.as_view({'get': job.action})(
+                _replay_request(job), **job.view_kwargs,
+            )
+            body = _response_body(response)
+        finally:
+            clear_current_school()
+        _set_progress(job, 90)
+
+        content_type = response.get('Content-Type', '')
+        match = FILENAME_RE.search(response.get('Content-Disposition', ''))
+        error_message = ''
+        if response.status_code >= 400:
+            error_message = f'Report failed with status {response.status_code}'
+            if content_type.startswith('application/json'):
+                payload = json.loads(body or b'{}')
+                if isinstance(payload, dict):
+                    error_message = str(payload.get('error') or payload.get('detail') or error_message)
+
+        now = timezone.now()
+        job.result = zlib.compress(body)
+        job.result_size = len(body)
+        job.result_status = response.status_code
+        job.result_content_type = content_type
+        job.result_filename = match.group(1) if match else ''
+        job.status = 'failed' if response.status_code >= 400 else 'completed'
+        job.error_message = error_message
+        job.progress = 100
+        job.finished_at = now
+        job.expires_at = now + timedelta(seconds=settings.REPORT_JOB_RESULT_TTL)
+        job.save()
+    except Exception as e:
+        logger.error(f'Report job {job.id} failed: {e}', exc_info=True)
+        now = timezone.now()
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.finished_at = now
+        job.expires_at = now + timedelta(seconds=settings.REPORT_JOB_RESULT_TTL)
+        job.save(update_fields=['status', 'error_message', 'finished_at', 'expires_at'])
+
+    return {'status': job.status, 'job_id': str(job.id), 'size': job.result_size}
+
+
+def report_job_result(job):
+    """Decompressed result bytes of a finished job, or None."""
+    if job.result is None:
+        return None
+    return zlib.decompress(bytes(job.result))
+
+
+def purge_expired_report_jobs() -> int:
+    deleted, _ = ReportJob.all_objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,294 @@
+"""
+Time-bucketed performance and attendance trends.
+
+Exam results, component results and attendance are aggregated per day,
+week or month with ``Trunc`` in the database. Settled days are read from
+the ClassDailyStats rollup; recent and dirty days are aggregated live, the
+same split the commandant overview uses for SchoolDailyStats.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, FloatField, Min, Q, Sum
+from django.db.models.functions import Cast, Trunc
+from django.utils import timezone
+
+from core.models import (
+    ClassDailyStats, Exam, ExamResult, SchoolDailyStats,
+    SessionAttendance, StudentComponentResult,
+)
+from core.services import _date_filter, school_stats_live_from
+
+
+BUCKETS = ('day', 'week', 'month')
+
+TREND_STATS_FIELDS = [
+    'exams_count', 'exam_results_count', 'exam_pct_sum',
+    'components_count', 'component_results_count', 'component_pct_sum',
+    'sessions_count', 'attendance_records', 'present_count', 'late_count',
+]
+
+PCT_EXPR = Cast(F('marks_obtained'), FloatField()) * 100.0 / F('exam__total_marks')
+
+
+def _trunc(field, kind):
+    return Trunc(field, kind, output_field=DateField())
+
+
+def bucket_start(day, kind):
+    """Python counterpart of ``Trunc`` for a date: Monday of the week or first of the month."""
+    if kind == 'week':
+        return day - timedelta(days=day.weekday())
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start, kind):
+    if kind == 'week':
+        return start + timedelta(days=7)
+    if kind == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def compute_trend_stats(scope, *, kind='day', group_by_subject=False,
+                        dates=None, date_from=None, date_to=None):
+    """
+    TREND_STATS_FIELDS aggregated straight from the source tables for the
+    classes matched by ``scope`` (``school_id``, ``class_id`` and/or
+    ``subject_id``), grouped into ``kind`` buckets.
+
+    Keys are the bucket start date, or ``(class_id, subject_id, date)`` with
+    ``group_by_subject`` (used to build the rollup). Four grouped queries
+    regardless of the number of buckets.
+    """
+    def _scope(class_path, subject_path):
+        q = Q()
+        if scope.get('school_id') is not None:
+            q &= Q(**{f'{class_path}__school_id': scope['school_id']})
+        if scope.get('class_id') is not None:
+            q &= Q(**{f'{class_path}_id': scope['class_id']})
+        if scope.get('subject_id') is not None:
+            q &= Q(**{f'{subject_path}_id': scope['subject_id']})
+        return q
+
+    def _key(row, class_field, subject_field):
+        if group_by_subject:
+            return (row[class_field], row[subject_field], row['period'])
+        return row['period']
+
+    buckets = defaultdict(lambda: dict.fromkeys(TREND_STATS_FIELDS, 0))
+
+    results = (
+        ExamResult.all_objects
+        .filter(
+            _scope('exam__subject__class_obj', 'exam__subject'),
+            exam__is_active=True, exam__total_marks__gt=0,
+            is_submitted=True, marks_obtained__isnull=False,
+        )
+        .annotate(period=_trunc('exam__exam_date', kind))
+        .filter(_date_filter('exam__exam_date', dates, date_from, date_to))
+        .values('period', 'exam__subject__class_obj_id', 'exam__subject_id')
+        .annotate(
+            exams=Count('exam_id', distinct=True),
+            rc=Count('id'),
+            pct_sum=Sum(PCT_EXPR),
+        )
+        .order_by()
+    )
+    for r in results:
+        b = buckets[_key(r, 'exam__subject__class_obj_id', 'exam__subject_id')]
+        b['exams_count'] += r['exams']
+        b['exam_results_count'] += r['rc']
+        b['exam_pct_sum'] += r['pct_sum'] or 0
+
+    component_days = {
+        row['component_id']: row
+        for row in Exam.all_objects
+        .filter(
+            _scope('subject__class_obj', 'subject'),
+            component__isnull=False, is_active=True, subject__grading_mode='POLICY',
+        )
+        .values('component_id', 'subject_id', 'subject__class_obj_id')
+        .annotate(day=Min('exam_date'))
+        .filter(_date_filter('day', dates, date_from, date_to))
+        .order_by()
+    }
+    if component_days:
+        component_aggs = (
+            StudentComponentResult.all_objects
+            .filter(component_id__in=list(component_days))
+            .effective()
+            .values('component_id')
+            .annotate(rc=Count('id'), pct_sum=Sum('percentage'))
+            .order_by()
+        )
+        for r in component_aggs:
+            comp = component_days[r['component_id']]
+            comp['period'] = bucket_start(comp['day'], kind)
+            b = buckets[_key(comp, 'subject__class_obj_id', 'subject_id')]
+            b['components_count'] += 1
+            b['component_results_count'] += r['rc']
+            b['component_pct_sum'] += float(r['pct_sum'] or 0)
+
+    attendance = (
+        SessionAttendance.all_objects
+        .filter(_scope('session__class_obj', 'session__subject'))
+        .annotate(
+            day=_trunc('session__scheduled_start', 'day'),
+            period=_trunc('session__scheduled_start', kind),
+        )
+        .filter(_date_filter('day', dates, date_from, date_to))
+        .values('period', 'session__class_obj_id', 'session__subject_id')
+        .annotate(
+            sessions=Count('session_id', distinct=True),
+            records=Count('id'),
+            present=Count('id', filter=Q(status='present')),
+            late=Count('id', filter=Q(status='late')),
+        )
+        .order_by()
+    )
+    for r in attendance:
+        b = buckets[_key(r, 'session__class_obj_id', 'session__subject_id')]
+        b['sessions_count'] += r['sessions']
+        b['attendance_records'] += r['records']
+        b['present_count'] += r['present']
+        b['late_count'] += r['late']
+
+    return dict(buckets)
+
+
+def rebuild_class_daily_stats(school_id, *, dates=None, date_from=None, date_to=None) -> int:
+    """
+    Replace the ClassDailyStats rows of one school for the given days (or
+    range) with freshly aggregated figures. Returns the row count.
+    """
+    stats = compute_trend_stats(
+        {'school_id': school_id}, group_by_subject=True,
+        dates=dates, date_from=date_from, date_to=date_to,
+    )
+    now = timezone.now()
+    rows = [
+        ClassDailyStats(
+            school_id=school_id, class_obj_id=class_id, subject_id=subject_id,
+            date=day, computed_at=now, **values,
+        )
+        for (class_id, subject_id, day), values in stats.items()
+        if class_id is not None
+    ]
+    with transaction.atomic():
+        ClassDailyStats.all_objects.filter(
+            _date_filter('date', dates, date_from, date_to), school_id=school_id,
+        ).delete()
+        ClassDailyStats.all_objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def trend_buckets(class_obj, *, kind, date_from, date_to, subject=None):
+    """
+    TREND_STATS_FIELDS per ``kind`` bucket between ``date_from`` and
+    ``date_to`` for a class (or one of its subjects), as
+    ``{bucket_start: {field: value}}``.
+    """
+    scope = {'class_id': class_obj.id}
+    if subject is not None:
+        scope['subject_id'] = subject.id
+    totals = defaultdict(lambda: dict.fromkeys(TREND_STATS_FIELDS, 0))
+
+    def _add(stats):
+        for period, values in stats.items():
+            for field in TREND_STATS_FIELDS:
+                totals[period][field] += values[field] or 0
+
+    if not ClassDailyStats.all_objects.filter(school_id=class_obj.school_id).exists():
+        _add(compute_trend_stats(scope, kind=kind, date_from=date_from, date_to=date_to))
+        return dict(totals)
+
+    live_from = school_stats_live_from()
+    dirty_days = list(
+        SchoolDailyStats.all_objects.filter(
+            _date_filter('date', date_from=date_from, date_to=date_to),
+            school_id=class_obj.school_id, is_dirty=True, date__lt=live_from,
+        ).values_list('date', flat=True)
+    )
+
+    rollup = (
+        ClassDailyStats.all_objects
+        .filter(
+            _date_filter('date', date_from=date_from, date_to=date_to),
+            class_obj_id=class_obj.id, date__lt=live_from,
+        )
+        .exclude(date__in=dirty_days)
+    )
+    if subject is not None:
+        rollup = rollup.filter(subject_id=subject.id)
+    _add({
+        row.pop('period'): row
+        for row in rollup
+        .annotate(period=_trunc('date', kind))
+        .values('period')
+        .annotate(**{field: Sum(field) for field in TREND_STATS_FIELDS})
+        .order_by()
+    })
+
+    if dirty_days:
+        _add(compute_trend_stats(scope, kind=kind, dates=dirty_days))
+    if date_to is None or date_to >= live_from:
+        recent_from = max(date_from, live_from) if date_from else live_from
+        _add(compute_trend_stats(scope, kind=kind, date_from=recent_from, date_to=date_to))
+    return dict(totals)
+
+
+def trend_series(class_obj, *, kind, date_from, date_to, enrolled, subject=None):
+    """
+    Chart-ready points, one per bucket from ``date_from`` to ``date_to``
+    (empty buckets included), with averages weighted by result count and
+    attendance measured against ``enrolled`` students per session.
+    """
+    buckets = trend_buckets(
+        class_obj, kind=kind, date_from=date_from, date_to=date_to, subject=subject,
+    )
+    points = []
+    start = bucket_start(date_from, kind)
+    while start <= date_to:
+        b = buckets.get(start) or dict.fromkeys(TREND_STATS_FIELDS, 0)
+        results = b['exam_results_count'] + b['component_results_count']
+        pct_sum = b['exam_pct_sum'] + b['component_pct_sum']
+        exams = b['exams_count'] + b['components_count']
+        expected = enrolled * b['sessions_count']
+        points.append({
+            'period_start': start,
+            'period_end': min(_next_bucket(start, kind) - timedelta(days=1), date_to),
+            'exams': exams,
+            'students_attempted': results,
+            'average_percentage': round(pct_sum / results, 2) if results else None,
+            'participation_rate': round(results / (enrolled * exams) * 100, 2) if enrolled and exams else 0,
+            'sessions': b['sessions_count'],
+            'students_marked': b['attendance_records'],
+            'present_count': b['present_count'],
+            'late_count': b['late_count'],
+            'attendance_rate': round(b['attendance_records'] / expected * 100, 2) if expected else None,
+        })
+        start = _next_bucket(start, kind)
+    return points
+
+
+def trend_series_summary(points, enrolled):
+    """Period totals for a :func:`trend_series` result."""
+    exam_points = [p for p in points if p['average_percentage'] is not None]
+    att_points = [p for p in points if p['attendance_rate'] is not None]
+    results = sum(p['students_attempted'] for p in exam_points)
+    sessions = sum(p['sessions'] for p in att_points)
+    marked = sum(p['students_marked'] for p in att_points)
+    return {
+        'total_data_points': len(points),
+        'total_exams': sum(p['exams'] for p in points),
+        'total_sessions': sessions,
+        'average_exam_performance': round(
+            sum(p['average_percentage'] * p['students_attempted'] for p in exam_points) / results, 2,
+        ) if results else 0,
+        'average_attendance_rate': round(marked / (enrolled * sessions) * 100, 2) if enrolled and sessions else 0,
+        'total_enrolled_students': enrolled,
+    }
@@ -1,16 +1,27 @@
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models import Min
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.conf import settings
-from .services import get_class_completion_status
+from django.utils import timezone
+from .services import (
+    get_class_completion_statuses, schedule_standing_refresh, schedule_class_snapshot_refresh,
+    mark_school_stats_dirty, schedule_session_stats_refresh,
+)
 from .models import (
-    PersonalNotification, User, Enrollment, School, SchoolMembership,
+    PersonalNotification, User, Enrollment, School, SchoolMembership, Exam,
     )
-from core.models import Enrollment as Enroll, StudentIndex
+from core.models import Enrollment as Enroll, StudentIndex, ClassIndexSequence
 from django.db import transaction as tx
 import logging
 from django.db.models.signals import post_save, post_delete 
 from django.core.cache import cache 
+from django.core.exceptions import ObjectDoesNotExist
+from .grading import GradeScale
+from .services.oic_analytics import invalidate_oic_overview
+from .services.qr_scans import (
+    invalidate_qr_scan_context, invalidate_class_qr_scan_contexts, release_qr_mark, hold_qr_marks,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -27,15 +38,210 @@ def invalidate_membership_caches(sender, instance, **kwargs):
     if instance.user_id and instance.school_id:
         cache.delete(f'membership:{instance.user_id}:{instance.school_id}')
 
+@receiver([post_save, post_delete], sender='core.OICAssignment')
+def invalidate_oic_overview_cache(sender, instance, **kwargs):
+    if instance.school_id and instance.oic_id:
+        invalidate_oic_overview(instance.oic_id, instance.school_id)
+
+@receiver([post_save, post_delete], sender='core.OICRemark')
+def invalidate_oic_overview_on_remark(sender, instance, **kwargs):
+    if instance.school_id and instance.oic_id:
+        invalidate_oic_overview(instance.oic_id, instance.school_id)
+
+@receiver([post_save, post_delete], sender='core.ExamReportRemark')
+def invalidate_oic_overview_on_report_remark(sender, instance, **kwargs):
+    if instance.author_role == 'oic' and instance.school_id and instance.author_id:
+        invalidate_oic_overview(instance.author_id, instance.school_id)
+
 @receiver(post_save, sender=School)
 def invalidate_school_cache(sender, instance, **kwargs):
     cache.delete(f'school_by_code:{instance.code}')
+    GradeScale.invalidate(instance.id)
 
 @receiver(post_save, sender='core.ExamResult')
 def invalidate_exam_result_caches(sender, instance, **kwargs):
     if instance.school_id:
         cache.delete(f'school_stats:{instance.school_id}')
 
+@receiver([post_save, post_delete], sender='core.ExamResult')
+def refresh_standing_on_exam_result(sender, instance, **kwargs):
+    try:
+        subject_id = instance.exam.subject_id
+    except ObjectDoesNotExist:
+        return
+    schedule_standing_refresh(subject_id)
+
+@receiver([post_save, post_delete], sender='core.StudentComponentResult')
+def refresh_standing_on_component_result(sender, instance, **kwargs):
+    try:
+        subject_id = instance.component.subject_id
+    except ObjectDoesNotExist:
+        return
+    schedule_standing_refresh(subject_id)
+
+@receiver([post_save, post_delete], sender='core.ExamResult')
+def refresh_snapshot_on_exam_result(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    try:
+        subject_id = instance.exam.subject_id
+    except ObjectDoesNotExist:
+        return
+    schedule_class_snapshot_refresh(subject_id=subject_id)
+
+@receiver([post_save, post_delete], sender='core.StudentComponentResult')
+def refresh_snapshot_on_component_result(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    try:
+        subject_id = instance.component.subject_id
+    except ObjectDoesNotExist:
+        return
+    schedule_class_snapshot_refresh(subject_id=subject_id)
+
+@receiver([post_save, post_delete], sender='core.SessionAttendance')
+def refresh_snapshot_on_attendance(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    try:
+        class_id = instance.session.class_obj_id
+    except ObjectDoesNotExist:
+        return
+    schedule_class_snapshot_refresh(class_id)
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def refresh_snapshot_on_enrollment(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    schedule_class_snapshot_refresh(instance.class_obj_id)
+
+@receiver([post_save, post_delete], sender='core.SessionAttendance')
+def refresh_session_stats_on_attendance(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    schedule_session_stats_refresh(instance.session_id)
+
+@receiver(post_save, sender='core.AttendanceSession')
+def create_session_stats(sender, instance, created, **kwargs):
+    if kwargs.get('raw') or not created:
+        return
+    schedule_session_stats_refresh(instance.pk)
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def refresh_session_stats_on_enrollment(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    schedule_session_stats_refresh(class_id=instance.class_obj_id)
+
+@receiver([post_save, post_delete], sender='core.ExamResult')
+def mark_school_stats_on_exam_result(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    try:
+        exam_date = instance.exam.exam_date
+    except ObjectDoesNotExist:
+        return
+    mark_school_stats_dirty(instance.school_id, exam_date)
+
+def _component_first_exam_date(component_id):
+    # Component results are charted on the date of the component's first exam.
+    if component_id is None:
+        return None
+    return (
+        Exam.all_objects.filter(component_id=component_id, is_active=True)
+        .aggregate(first=Min('exam_date'))['first']
+    )
+
+@receiver(pre_save, sender='core.Exam')
+def remember_exam_dates(sender, instance, raw=False, **kwargs):
+    # A rescheduled exam moves its results off the old day, so keep the days
+    # the exam and its component were charted on before the write.
+    instance._previous_stats_dates = ()
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Exam.all_objects.filter(pk=instance.pk)
+        .values('exam_date', 'component_id')
+        .first()
+    )
+    if previous is None:
+        return
+    instance._previous_stats_dates = (
+        previous['exam_date'],
+        _component_first_exam_date(previous['component_id']),
+    )
+    instance._previous_component_id = previous['component_id']
+
+@receiver([post_save, post_delete], sender='core.Exam')
+def mark_school_stats_on_exam(sender, instance, **kwargs):
+    if kwargs.get('created') or kwargs.get('raw'):
+        return
+    days = {instance.exam_date, *getattr(instance, '_previous_stats_dates', ())}
+    component_ids = {instance.component_id, getattr(instance, '_previous_component_id', None)}
+    days.update(_component_first_exam_date(component_id) for component_id in component_ids)
+    for day in days:
+        mark_school_stats_dirty(instance.school_id, day)
+
+@receiver([post_save, post_delete], sender='core.AttendanceSession')
+def mark_school_stats_on_session(sender, instance, **kwargs):
+    if kwargs.get('raw') or not instance.scheduled_start:
+        return
+    mark_school_stats_dirty(instance.school_id, timezone.localdate(instance.scheduled_start))
+
+@receiver([post_save, post_delete], sender='core.AttendanceSession')
+def invalidate_qr_scan_context_on_session(sender, instance, **kwargs):
+    invalidate_qr_scan_context([instance.session_id])
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def invalidate_qr_scan_context_on_enrollment(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    invalidate_class_qr_scan_contexts(instance.class_obj_id)
+
+@receiver(post_save, sender='core.SessionAttendance')
+def hold_qr_mark_on_attendance_save(sender, instance, created, **kwargs):
+    # Marks made outside the QR path are not in a cached scan context yet.
+    if created and not kwargs.get('raw'):
+        hold_qr_marks(instance.session_id, [instance.student_id])
+
+@receiver(post_delete, sender='core.SessionAttendance')
+def release_qr_mark_on_attendance_delete(sender, instance, **kwargs):
+    # A deleted mark lets the student scan again.
+    release_qr_mark(instance.session_id, instance.student_id)
+    try:
+        invalidate_qr_scan_context([instance.session.session_id])
+    except ObjectDoesNotExist:
+        pass
+
+@receiver([post_save, post_delete], sender='core.SessionAttendance')
+def mark_school_stats_on_attendance(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    try:
+        session = instance.session
+    except ObjectDoesNotExist:
+        return
+    mark_school_stats_dirty(session.school_id, timezone.localdate(session.scheduled_start))
+
+@receiver([post_save, post_delete], sender='core.StudentComponentResult')
+def mark_school_stats_on_component_result(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    mark_school_stats_dirty(instance.school_id, _component_first_exam_date(instance.component_id))
+
+@receiver([post_save, post_delete], sender='core.Exam')
+@receiver([post_save, post_delete], sender='core.AssessmentComponent')
+def refresh_standings_on_grading_setup(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    schedule_standing_refresh(instance.subject_id)
+
+@receiver(post_save, sender='core.Subject')
+def refresh_standings_on_subject(sender, instance, created, **kwargs):
+    if created or kwargs.get('raw'):
+        return
+    schedule_standing_refresh(instance.id)
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
     if not created:
@@ -77,7 +283,7 @@ def check_academic_completion_on_grade(sender, instance, **kwargs):
     def _check():
         class_obj = exam.subject.class_obj
         student = instance.student
-        status = get_class_completion_status(class_obj, student)
+        status = get_class_completion_statuses(class_obj, [student.id])[student.id]
 
         if status['is_academically_complete']:
             admin_memberships = class_obj.school.memberships.filter(
@@ -125,18 +331,7 @@ def auto_assign_student_index(sender, instance, created, **kwargs):
 
         try:
             with tx.atomic():
-                existing = (
-                    StudentIndex.all_objects
-                    .select_for_update()
-                    .filter(class_obj=class_obj)
-                    .order_by("-index_number")
-                )
-                if existing.exists():
-                    last_num = int(existing.first().index_number)
-                    next_number = last_num + 1
-                else:
-                    next_number = class_obj.index_start_from
-
+                next_number = ClassIndexSequence.reserve(class_obj)
                 index_str = str(next_number).zfill(3)
 
                 StudentIndex.objects.create(
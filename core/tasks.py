@@ -1,8 +1,12 @@
 import logging
+import time
+from datetime import timedelta
 from celery import shared_task
 from django.core.cache import cache
 
 logger = logging.getLogger('biometric.sync')
+certificate_logger = logging.getLogger('core.certificates')
+stats_logger = logging.getLogger('core.stats')
 
 
 @shared_task(bind=True, max_retries=0)
@@ -86,4 +90,206 @@ def sync_device_clocks():
             service = ZKTecoSyncService(device)
             service.sync_device_time()
         except Exception as e:
-            logger.error(f'Clock sync failed for {device.name}: {e}')
\ No newline at end of file
+            logger.error(f'Clock sync failed for {device.name}: {e}')
+
+@shared_task
+def run_certificate_issuance_job(job_id):
+    from celery import group
+    from django.conf import settings
+    from django.utils import timezone
+    from core.models import CertificateIssuanceJob
+    from core.services import finalize_certificate_job
+
+    try:
+        job = CertificateIssuanceJob.all_objects.get(id=job_id)
+    except CertificateIssuanceJob.DoesNotExist:
+        return {'status': 'error', 'message': 'Job not found'}
+
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    item_ids = list(
+        job.items.filter(status='pending')
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    if not item_ids:
+        finalize_certificate_job(job_id)
+        return {'chunks': 0}
+
+    size = settings.CERTIFICATE_RENDER_CHUNK_SIZE
+    chunks = [item_ids[i:i + size] for i in range(0, len(item_ids), size)]
+    group(
+        render_certificate_chunk.s(job_id, chunk) for chunk in chunks
+    ).apply_async()
+
+    return {'chunks': len(chunks), 'items': len(item_ids)}
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=30)
+def render_certificate_chunk(self, job_id, item_ids):
+    from core.services import render_certificate_job_items, fail_certificate_job_items
+
+    try:
+        return render_certificate_job_items(job_id, item_ids)
+    except Exception as e:
+        certificate_logger.error(f'Certificate chunk failed for job {job_id}: {e}')
+        if self.request.retries >= self.max_retries:
+            return fail_certificate_job_items(job_id, item_ids, e)
+        raise self.retry(exc=e)
+
+
+@shared_task
+def close_class_task(class_id, closed_by_id):
+    from core.models import Class, User
+    from core.services import close_class, CLASS_CLOSURE_REPORT_KEY
+
+    try:
+        class_obj = Class.all_objects.get(id=class_id)
+    except Class.DoesNotExist:
+        return {'status': 'error', 'message': 'Class not found'}
+
+    closed_by = User.all_objects.filter(id=closed_by_id).first()
+    success, error, report = close_class(class_obj, closed_by)
+    if not success:
+        report = {'status': 'failed', 'class_id': class_id, 'error': error}
+        cache.set(CLASS_CLOSURE_REPORT_KEY.format(class_id=class_id), report, timeout=60 * 60 * 24)
+    return report
+
+
+@shared_task
+def rebuild_class_performance_snapshot(class_id):
+    from core.models import Class, ClassPerformanceSnapshot
+    from core.services import CLASS_SNAPSHOT_PENDING_KEY
+    from core.performance_viewsets import build_class_performance_summary
+
+    cache.delete(CLASS_SNAPSHOT_PENDING_KEY.format(class_id=class_id))
+
+    class_obj = (
+        Class.all_objects.select_related('course', 'instructor')
+        .filter(id=class_id, is_active=True).first()
+    )
+    if class_obj is None:
+        ClassPerformanceSnapshot.all_objects.filter(class_obj_id=class_id).delete()
+        return {'status': 'skipped', 'class_id': class_id}
+
+    started = time.monotonic()
+    data = build_class_performance_summary(class_obj)
+    build_ms = int((time.monotonic() - started) * 1000)
+    ClassPerformanceSnapshot.store(class_obj, data, build_ms=build_ms)
+    return {'status': 'ok', 'class_id': class_id, 'build_ms': build_ms}
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def refresh_subject_standings_task(self, subject_id):
+    from core.models import Enrollment, Subject
+    from core.services import (
+        STANDING_REFRESH_PENDING_KEY, STANDING_STALE_KEY, refresh_subject_standings,
+    )
+
+    # Cleared before the rebuild, so writes that land mid-build schedule a
+    # follow-up task.
+    cache.delete(STANDING_REFRESH_PENDING_KEY.format(subject_id=subject_id))
+    stale_key = STANDING_STALE_KEY.format(subject_id=subject_id)
+    token = cache.get(stale_key)
+
+    subject = Subject.all_objects.filter(id=subject_id).first()
+    if subject is None:
+        cache.delete(stale_key)
+        return {'status': 'skipped', 'subject_id': subject_id}
+
+    try:
+        student_ids = Enrollment.all_objects.filter(
+            class_obj_id=subject.class_obj_id, is_active=True,
+        ).values_list('student_id', flat=True)
+        standings = refresh_subject_standings([subject], student_ids)
+    except Exception as e:
+        stats_logger.error(f'Standings refresh failed for subject {subject_id}: {e}')
+        raise self.retry(exc=e)
+
+    if cache.get(stale_key) == token:
+        cache.delete(stale_key)
+    return {'status': 'ok', 'subject_id': subject_id, 'standings': len(standings)}
+
+
+@shared_task
+def rollup_school_daily_stats(window_days=3):
+    """
+    Nightly SchoolDailyStats and ClassDailyStats rollup: the trailing
+    ``window_days`` settled days plus any days flagged dirty since the last
+    run. Schools without any rows yet get their full history backfilled.
+    """
+    from core.models import School, SchoolDailyStats, ClassDailyStats
+    from core.services import rebuild_school_daily_stats, school_stats_live_from
+    from core.services.trends import rebuild_class_daily_stats
+
+    settled_to = school_stats_live_from() - timedelta(days=1)
+    window_from = settled_to - timedelta(days=window_days - 1)
+    summary = {}
+
+    for school_id in School.objects.filter(is_active=True).values_list('id', flat=True):
+        try:
+            # Both rollups share the dirty flags kept on SchoolDailyStats.
+            dirty = list(
+                SchoolDailyStats.all_objects
+                .filter(school_id=school_id, is_dirty=True, date__lt=window_from)
+                .values_list('date', flat=True)
+            )
+            count = 0
+            for model, rebuild in (
+                (ClassDailyStats, rebuild_class_daily_stats),
+                (SchoolDailyStats, rebuild_school_daily_stats),
+            ):
+                if not model.all_objects.filter(school_id=school_id).exists():
+                    count += rebuild(school_id, date_to=settled_to)
+                    continue
+                count += rebuild(school_id, date_from=window_from, date_to=settled_to)
+                if dirty:
+                    count += rebuild(school_id, dates=dirty)
+            summary[str(school_id)] = count
+        except Exception as e:
+            stats_logger.error(f'School daily stats rollup failed for {school_id}: {e}')
+    return summary
+
+
+@shared_task
+def run_report_job(job_id):
+    from core.services.report_jobs import run_report_job as run
+
+    return run(job_id)
+
+
+@shared_task
+def purge_expired_report_jobs():
+    from core.services.report_jobs import purge_expired_report_jobs as purge
+
+    return {'deleted': purge()}
+
+
+@shared_task
+def flush_qr_generation_counters():
+    from core.services.qr_tokens import flush_qr_generation_counters as flush
+
+    return {'flushed': flush()}
+
+
+@shared_task
+def flush_qr_scans():
+    from core.services.qr_scans import flush_qr_scans as flush
+
+    return {'written': flush()}
+
+
+@shared_task
+def mark_absent_for_completed_sessions():
+    from django.conf import settings
+    from django.utils import timezone
+
+    from core.services import mark_absent_for_completed_sessions as mark_absent
+
+    marked = mark_absent(
+        ended_from=timezone.now() - timedelta(hours=settings.ABSENT_MARKING_LOOKBACK_HOURS),
+        remarks='Automatically marked absent after session ended',
+    )
+    return {'sessions': len(marked), 'marked': sum(marked.values())}
@@ -1,3 +1,1419 @@
+import base64
+import csv
+import io
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import numpy as np
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import analytics, tasks
+from core.caching import single_flight, single_flight_cached
+from core.grading import DEFAULT_SCALE, GradeScale
+from core.managers import clear_current_school, set_current_school
+from core.models import (
+    AssessmentComponent, AttendanceSession, AttendanceSessionLog,
+    AttendanceSessionStats, Certificate, CertificateNumberSequence, Class,
+    ClassDailyStats, ClassIndexSequence, ClassPerformanceSnapshot, Course, Enrollment,
+    Exam, ExamResult, OICAssignment, ReportJob, School, SchoolDailyStats,
+    SchoolMembership, SessionAttendance, StudentComponentResult, StudentIndex,
+    StudentSubjectStanding, Subject, User,
+)
+from core.services import (
+    bulk_assign_indexes, bulk_mark_session_attendance, certificate_job_progress,
+    close_class, determine_retake_requirements, fail_certificate_job_items,
+    get_class_completion_status, get_class_completion_statuses,
+    get_class_standing_statuses, get_retake_requirements, get_subject_standings,
+    issue_certificate, mark_unmarked_absent, rebuild_school_daily_stats,
+    refresh_class_standings, render_certificate_job_items, school_stats_summary,
+    stale_standing_subjects, start_certificate_issuance_job,
+)
+from core.services import CertificateAssetCache, _pick_effective_attempt, qr_scans
+from core.services.class_comparison import compare_classes
+from core.services.qr_tokens import flush_qr_generation_counters, qr_generation_stats
+from core.services.report_jobs import purge_expired_report_jobs, run_report_job
+from core.services.trends import bucket_start, rebuild_class_daily_stats, trend_buckets, trend_series
+
+
+class InMemoryRedis:
+    """The few list and sorted-set commands the QR scan queue uses."""
+
+    def __init__(self):
+        self.lists = {}
+        self.zsets = {}
+
+    @staticmethod
+    def _key(key):
+        return key.decode() if isinstance(key, bytes) else key
+
+    def rpush(self, key, *values):
+        items = self.lists.setdefault(self._key(key), [])
+        items.extend(v.encode() if isinstance(v, str) else v for v in values)
+        return len(items)
+
+    def llen(self, key):
+        return len(self.lists.get(self._key(key), []))
+
+    def lmove(self, source, destination, wherefrom, whereto):
+        items = self.lists.get(self._key(source))
+        if not items:
+            return None
+        item = items.pop(0 if wherefrom == 'LEFT' else -1)
+        target = self.lists.setdefault(self._key(destination), [])
+        target.insert(0 if whereto == 'LEFT' else len(target), item)
+        return item
+
+    def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(self._key(key), None)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(self._key(key), {}).update(
+            {self._key(member): score for member, score in mapping.items()}
+        )
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(self._key(key), {}).pop(self._key(member), None)
+
+    def zrangebyscore(self, key, low, high):
+        return [
+            member.encode()
+            for member, score in self.zsets.get(self._key(key), {}).items()
+            if float(low) <= score <= float(high)
+        ]
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            def execute(self):
+                calls, self.calls = self.calls, []
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+        return Pipeline()
+
+    def queued(self):
+        return self.llen(cache.make_key(qr_scans.QUEUE_KEY))
+
+    def in_flight(self):
+        return sum(len(items) for key, items in self.lists.items() if qr_scans.PROCESSING_KEY + ':' in key)
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_not_recomputed(self):
+        compute = mock.Mock(return_value={'n': 1})
+        self.assertEqual(single_flight('sf:fresh', compute, timeout=60), {'n': 1})
+        self.assertEqual(single_flight('sf:fresh', compute, timeout=60), {'n': 1})
+        compute.assert_called_once()
+
+    def test_stale_value_served_while_another_caller_refills(self):
+        single_flight('sf:stale', lambda: 'old', timeout=60)
+        cache.add('sf:stale:lock', 1)
+        later = time.time() + 61
+        with mock.patch('core.caching.time.time', return_value=later):
+            self.assertEqual(single_flight('sf:stale', lambda: 'new', timeout=60), 'old')
+            cache.delete('sf:stale:lock')
+            self.assertEqual(single_flight('sf:stale', lambda: 'new', timeout=60), 'new')
+
+    def test_cold_miss_computes_after_waiting(self):
+        cache.add('sf:cold:lock', 1)
+        self.assertEqual(single_flight('sf:cold', lambda: 'value', wait=0), 'value')
+
+    def test_decorator_skips_cache_without_key(self):
+        compute = mock.Mock(return_value=3)
+        cached = single_flight_cached(lambda bypass: None if bypass else 'sf:deco')(compute)
+        cached(True)
+        cached(True)
+        cached(False)
+        cached(False)
+        self.assertEqual(compute.call_count, 3)
+
+
+class StatisticsTests(TestCase):
+
+    def test_correlation_uses_pairwise_complete_rows(self):
+        nan = np.nan
+        values = np.array([
+            [1.0, 2.0, nan],
+            [2.0, 4.1, 1.0],
+            [3.0, 6.2, nan],
+            [4.0, 7.9, 2.0],
+            [nan, 1.0, 3.0],
+        ])
+
+        r, n = analytics.correlation_matrix(values)
+
+        self.assertAlmostEqual(r[0, 1], np.corrcoef(values[:4, 0], values[:4, 1])[0, 1])
+        self.assertEqual((n[0, 1], n[0, 2]), (4, 2))
+        self.assertTrue(np.isnan(r[0, 2]))
+        self.assertIsNone(analytics.pearson([1, 1, 1], [1, 2, 3]))
+
+    def test_distribution_helpers_skip_missing_values(self):
+        values = np.array([40.0, np.nan, 60.0, 80.0, 100.0])
+
+        summary = analytics.describe(values)
+        self.assertEqual((summary['count'], summary['mean'], summary['percentiles']['p50']), (4, 70.0, 70.0))
+        np.testing.assert_allclose(analytics.percentile_ranks(values), [25, np.nan, 50, 75, 100])
+        self.assertTrue(np.isnan(analytics.z_scores(values)[1]))
+        self.assertEqual(
+            [bucket['count'] for bucket in analytics.histogram(values, bins=4)], [0, 1, 1, 2],
+        )
+
+
+class ClassTestData(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(
+            name='Test School', code='TS1', short_name='TS', email='school@test.com',
+            phone='0700000000', address='Address', city='City',
+        )
+        cls.instructor = User.all_objects.create(
+            username='instructor', role='instructor', svc_number='I001',
+            phone_number='0700000001', email='instructor@test.com',
+        )
+        cls.admin = User.all_objects.create(
+            username='admin', role='admin', svc_number='A001',
+            phone_number='0700000002', email='admin@test.com',
+        )
+        SchoolMembership.all_objects.create(user=cls.admin, school=cls.school, role='admin', status='active')
+        course = Course.all_objects.create(school=cls.school, name='Course', code='C1', description='Course')
+        cls.class_obj = Class.all_objects.create(
+            school=cls.school, course=course, name='Class', instructor=cls.instructor,
+            start_date=date(2026, 1, 1), end_date=date(2026, 6, 1),
+        )
+        cls.students = []
+        for i in range(4):
+            student = User.all_objects.create(
+                username=f'student{i}', role='student', svc_number=f'S00{i}',
+                phone_number=f'071000000{i}', email=f'student{i}@test.com',
+            )
+            membership = SchoolMembership.all_objects.create(user=student, school=cls.school, role='student')
+            Enrollment.all_objects.create(student=student, class_obj=cls.class_obj, school=cls.school, membership=membership)
+            cls.students.append(student)
+        cls.subject = Subject.all_objects.create(
+            school=cls.school, class_obj=cls.class_obj, name='Subject',
+            description='Subject', instructor=cls.instructor,
+        )
+
+    def setUp(self):
+        cache.clear()
+        for patcher in (
+            mock.patch('core.tasks.flush_qr_scans.apply_async'),
+            mock.patch('core.tasks.rebuild_class_performance_snapshot.apply_async'),
+            mock.patch('core.tasks.refresh_subject_standings_task.apply_async'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def final_exam(self, subject=None, exam_date=None, **results):
+        """A final exam of ``subject`` with ``{'student<n>': marks}`` submitted results."""
+        subject = subject or self.subject
+        exam = Exam.all_objects.create(
+            school=self.school, subject=subject, title='Final', exam_type='final', total_marks=100,
+            exam_date=exam_date or timezone.localdate() - timedelta(days=30), created_by=self.instructor,
+        )
+        for username, marks in results.items():
+            ExamResult.all_objects.create(
+                school=self.school, exam=exam, student=User.all_objects.get(username=username),
+                marks_obtained=marks, is_submitted=True,
+            )
+        return exam
+
+    def api(self, viewset, action, *, method='get', user=None, data=None, pk=None, **params):
+        """Call one viewset action (on object ``pk`` if given) as ``user``, the school admin by default."""
+        factory = APIRequestFactory()
+        if method == 'get':
+            request = factory.get('/', params)
+        else:
+            request = getattr(factory, method)(f'/?{urlencode(params)}', data or {}, format='json')
+        request.school = self.school
+        set_current_school(self.school)
+        self.addCleanup(clear_current_school)
+        force_authenticate(request, user or self.admin)
+        return viewset.as_view({method: action})(request, **({'pk': pk} if pk is not None else {}))
+
+    def policy_subject(self, *weights, name='Range'):
+        """A POLICY subject with one component per weight."""
+        subject = Subject.all_objects.create(
+            school=self.school, class_obj=self.class_obj, name=name, description=name,
+            instructor=self.instructor, grading_mode='POLICY',
+        )
+        components = [
+            AssessmentComponent.all_objects.create(
+                school=self.school, subject=subject, name=f'Component {i}', weight=weight, sort_order=i,
+            )
+            for i, weight in enumerate(weights)
+        ]
+        return subject, components
+
+    def component_result(self, component, student, marks, attempt=1):
+        return StudentComponentResult.all_objects.create(
+            school=self.school, component=component, student=student, marks_obtained=marks,
+            attempt_number=attempt, is_retake=attempt > 1, is_submitted=True,
+        )
+
+
+class CompletionEngineTests(ClassTestData):
+
+    def test_batch_matches_per_student_status(self):
+        self.final_exam(student0=80, student1=30)
+        self.policy_subject(100)
+
+        statuses = get_class_completion_statuses(self.class_obj, [s.id for s in self.students])
+
+        for student in self.students:
+            self.assertEqual(statuses[student.id], get_class_completion_status(self.class_obj, student))
+        self.assertEqual(statuses[self.students[0].id]['completed_subjects'], 1)
+        self.assertFalse(statuses[self.students[2].id]['is_academically_complete'])
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self.final_exam(student0=80, student1=30, student2=60)
+
+        def count_queries(student_ids):
+            with CaptureQueriesContext(connection) as queries:
+                get_class_completion_statuses(self.class_obj, student_ids)
+            return len(queries)
+
+        self.assertEqual(
+            count_queries([self.students[0].id]),
+            count_queries([s.id for s in self.students]),
+        )
+
+
+class CertificateJobTests(ClassTestData):
+
+    def start_job(self):
+        with mock.patch('core.tasks.run_certificate_issuance_job.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                job, report = start_certificate_issuance_job(self.class_obj, self.admin)
+        delay.assert_called_once_with(str(job.id))
+        return job, report
+
+    def pending_items(self, job):
+        return list(job.items.filter(status='pending').order_by('id').values_list('id', flat=True))
+
+    def test_rendered_job_completes(self):
+        self.final_exam(student0=80, student1=75, student2=60, student3=90)
+        job, report = self.start_job()
+        self.assertEqual((report['issued_count'], report['failed_count']), (4, 0))
+
+        with mock.patch('core.services.CertificateGenerator'):
+            self.assertTrue(render_certificate_job_items(job.id, self.pending_items(job)))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(certificate_job_progress(job)['rendered'], 4)
+
+    def test_exhausted_chunk_still_finishes_job(self):
+        self.final_exam(student0=80, student1=75)
+        job, report = self.start_job()
+        self.assertEqual((report['issued_count'], report['failed_count']), (2, 2))
+        first, second = self.pending_items(job)
+
+        self.assertFalse(fail_certificate_job_items(job.id, [first], RuntimeError('renderer crashed')))
+        with mock.patch('core.services.CertificateGenerator'):
+            self.assertTrue(render_certificate_job_items(job.id, [second]))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed_with_errors')
+        progress = certificate_job_progress(job)
+        self.assertEqual(
+            (progress['rendered'], progress['failed'], progress['percent_complete']), (1, 3, 100.0),
+        )
+
+
+class CertificateAssetCacheTests(TestCase):
+
+    def setUp(self):
+        CertificateAssetCache.clear()
+        self.addCleanup(CertificateAssetCache.clear)
+        handle, self.path = tempfile.mkstemp(suffix='.png')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def test_encodes_each_file_once_until_it_changes(self):
+        self.write(b'logo')
+        with mock.patch('core.services.base64.b64encode', wraps=base64.b64encode) as encode:
+            first = CertificateAssetCache.data_uri(self.path)
+            self.assertEqual(CertificateAssetCache.data_uri(self.path), first)
+            self.assertEqual(encode.call_count, 1)
+
+            self.write(b'new logo')
+            self.assertNotEqual(CertificateAssetCache.data_uri(self.path), first)
+            self.assertEqual(encode.call_count, 2)
+        self.assertTrue(first.startswith('data:image/png;base64,'))
+
+    def test_missing_file(self):
+        self.assertIsNone(CertificateAssetCache.data_uri(self.path + '.missing'))
+
+
+class CloseClassTests(ClassTestData):
+
+    def test_blocked_while_enrollments_lack_certificates(self):
+        success, error, report = close_class(self.class_obj, self.admin)
+        self.assertFalse(success)
+        self.assertIn('4 student(s)', error)
+        self.assertIsNone(report)
+
+    def test_completes_enrollments_and_memberships_in_bulk(self):
+        student = self.students[3]
+        other_class = Class.all_objects.create(
+            school=self.school, course=self.class_obj.course, name='Other', instructor=self.instructor,
+            start_date=date(2026, 1, 1), end_date=date(2026, 6, 1),
+        )
+        membership = SchoolMembership.all_objects.get(user=student, school=self.school)
+        Enrollment.all_objects.create(student=student, class_obj=other_class, school=self.school, membership=membership)
+        Enrollment.all_objects.filter(student=self.students[0], class_obj=self.class_obj).update(completed_via='certificate')
+
+        with mock.patch('core.services.class_closure_blocker', return_value=None):
+            with self.captureOnCommitCallbacks(execute=True):
+                success, error, report = close_class(self.class_obj, self.admin)
+
+        self.assertTrue(success)
+        self.assertEqual(
+            (report['enrollments_closed'], report['memberships_completed'], report['memberships_still_active']),
+            (4, 3, 1),
+        )
+        self.class_obj.refresh_from_db()
+        self.assertTrue(self.class_obj.is_closed)
+        self.assertEqual(
+            dict(Enrollment.all_objects.filter(class_obj=self.class_obj).values_list('student_id', 'completed_via')),
+            {
+                self.students[0].id: 'certificate', self.students[1].id: 'admin_closure',
+                self.students[2].id: 'admin_closure', self.students[3].id: 'admin_closure',
+            },
+        )
+        self.assertEqual(
+            dict(SchoolMembership.all_objects.filter(role='student').values_list('user_id', 'status')),
+            {
+                self.students[0].id: 'completed', self.students[1].id: 'completed',
+                self.students[2].id: 'completed', self.students[3].id: 'active',
+            },
+        )
+
+
+class ClassIndexSequenceTests(ClassTestData):
+
+    def test_reserves_consecutive_blocks_from_index_start(self):
+        self.class_obj.index_start_from = 50
+        self.assertEqual(ClassIndexSequence.reserve(self.class_obj, 3), 50)
+        self.assertEqual(ClassIndexSequence.reserve(self.class_obj), 53)
+        self.assertEqual(ClassIndexSequence.objects.get(class_obj=self.class_obj).last_value, 53)
+
+    def test_bulk_assign_continues_after_existing_indexes(self):
+        first = Enrollment.all_objects.get(student=self.students[0], class_obj=self.class_obj)
+        StudentIndex.all_objects.create(
+            enrollment=first, class_obj=self.class_obj, index_number='007', school=self.school,
+        )
+
+        created = bulk_assign_indexes(self.class_obj)
+
+        self.assertEqual(sorted(index.index_number for index in created), ['008', '009', '010'])
+        self.assertEqual(bulk_assign_indexes(self.class_obj), [])
+
+
+class CertificateNumberTests(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        self.stem = f'{self.school.code}/{date.today().year}/'
+
+    def test_reserves_consecutive_numbers_per_school_and_year(self):
+        self.assertEqual(
+            Certificate.reserve_numbers(self.school, 2), [self.stem + '0001', self.stem + '0002'],
+        )
+        self.assertEqual(Certificate.reserve_numbers(self.school, 1), [self.stem + '0003'])
+        self.assertEqual(CertificateNumberSequence.reserve('OTHER', date.today().year), 1)
+
+    def test_counter_starts_after_existing_certificates(self):
+        enrollment = Enrollment.all_objects.get(student=self.students[0], class_obj=self.class_obj)
+        certificate, error = issue_certificate(
+            enrollment, self.admin, generate_pdf=False,
+            completion_status={'is_academically_complete': True}, grade_data={},
+            certificate_number=self.stem + '0041',
+        )
+        self.assertIsNone(error)
+
+        self.assertEqual(Certificate.reserve_numbers(self.school, 1), [self.stem + '0042'])
+
+
+class EffectiveAttemptTests(ClassTestData):
+
+    def test_effective_attempt_follows_retake_evaluation(self):
+        _, (latest, best) = self.policy_subject(50, 50)
+        best.retake_evaluation = 'best'
+        best.save()
+        for component in (latest, best):
+            for student in self.students[:2]:
+                self.component_result(component, student, 70)
+                self.component_result(component, student, 40, attempt=2)
+        unsubmitted = self.component_result(latest, self.students[0], 90, attempt=3)
+        unsubmitted.is_submitted = False
+        unsubmitted.save()
+
+        effective = {
+            (r.component_id, r.student_id): r.attempt_number
+            for r in StudentComponentResult.all_objects.effective()
+        }
+
+        for student in self.students[:2]:
+            self.assertEqual(effective[(latest.id, student.id)], 2)
+            self.assertEqual(effective[(best.id, student.id)], 1)
+        for component in (latest, best):
+            attempts = StudentComponentResult.all_objects.filter(component=component, student=self.students[0])
+            self.assertEqual(
+                _pick_effective_attempt(component, list(attempts)).attempt_number,
+                effective[(component.id, self.students[0].id)],
+            )
+
+
+class RetakeRequirementTests(ClassTestData):
+
+    def test_class_report_matches_per_student_requirements(self):
+        subject, (range_test,) = self.policy_subject(100)
+        range_test.is_critical = True
+        range_test.retake_allowed = True
+        range_test.max_retake_attempts = 2
+        range_test.save()
+        self.component_result(range_test, self.students[0], 30)
+        self.component_result(range_test, self.students[1], 30)
+        self.component_result(range_test, self.students[1], 35, attempt=2)
+        self.component_result(range_test, self.students[2], 80)
+
+        with self.assertNumQueries(4):
+            rows = get_retake_requirements(self.class_obj)
+
+        self.assertEqual(
+            [(row['student_id'], row['attempts_used'], row['can_retake']) for row in rows],
+            [(self.students[0].id, 1, True), (self.students[1].id, 2, False)],
+        )
+        row_keys = {'student_id', 'svc_number', 'student_name', 'subject_id', 'subject_name', 'is_critical'}
+        for student in self.students:
+            self.assertEqual(
+                determine_retake_requirements(subject, student),
+                [
+                    {key: value for key, value in row.items() if key not in row_keys}
+                    for row in rows if row['student_id'] == student.id
+                ],
+            )
+
+
+class GradeScaleTests(ClassTestData):
+
+    def test_python_and_sql_banding_agree(self):
+        scale = GradeScale.for_school(self.school)
+        exam = self.final_exam()
+        exam.total_marks = 40
+        exam.save()
+        marks = [0, 19.99, 20, 25.99, 26, 36.39, 36.4, 40]
+        for i, mark in enumerate(marks):
+            student = User.all_objects.create(
+                username=f'graded{i}', role='student', svc_number=f'G00{i}',
+                phone_number=f'072000000{i}', email=f'graded{i}@test.com',
+            )
+            ExamResult.all_objects.create(
+                school=self.school, exam=exam, student=student, marks_obtained=mark, is_submitted=True,
+            )
+
+        rows = ExamResult.all_objects.filter(exam=exam).annotate(
+            band=scale.sql_case_marks(),
+        ).values_list('marks_obtained', 'band')
+
+        self.assertEqual(
+            sorted((float(m), band) for m, band in rows),
+            [(m, scale.classify(m / 40 * 100)) for m in marks],
+        )
+        self.assertEqual(
+            scale.classify_many([m / 40 * 100 for m in marks]),
+            ['F', 'F', 'C-', 'C', 'C+', 'A-', 'A', 'A'],
+        )
+
+    def test_school_scale_from_settings(self):
+        scale = GradeScale.from_settings({'grade_scale': [[70, 'Pass'], [85, 'Merit']], 'fail_grade': 'Fail'})
+        self.assertEqual(scale.labels, ['Merit', 'Pass', 'Fail'])
+        self.assertEqual(scale.classify_many([84.9, 85, 69.99, None]), ['Pass', 'Merit', 'Fail', ''])
+        self.assertEqual(scale.distribution([90, 75, 10, 20]), {'Merit': 1, 'Pass': 1, 'Fail': 2})
+        self.assertIs(GradeScale.from_settings({'grade_scale': [['x', 'A']]}), DEFAULT_SCALE)
+
+
+class ClassSnapshotTests(ClassTestData):
+
+    def test_result_writes_queue_one_debounced_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.final_exam(student0=80, student1=60)
+
+        tasks.rebuild_class_performance_snapshot.apply_async.assert_called_once_with(
+            (self.class_obj.id,), countdown=settings.CLASS_PERFORMANCE_SNAPSHOT_DEBOUNCE,
+        )
+
+    def test_rebuild_stores_header_and_rankings(self):
+        self.final_exam(student0=80, student1=60)
+
+        result = tasks.rebuild_class_performance_snapshot.apply(args=(self.class_obj.id,))
+
+        self.assertEqual(result.get()['status'], 'ok')
+        snapshot = ClassPerformanceSnapshot.all_objects.get(class_obj=self.class_obj)
+        self.assertEqual(snapshot.data['overall_statistics']['total_exams'], 1)
+        self.assertEqual(snapshot.data['overall_statistics']['total_results_submitted'], 2)
+        self.assertNotIn('all_students', snapshot.data)
+        self.assertEqual(len(snapshot.rankings), 4)
+
+    def test_summary_builds_missing_snapshot_once(self):
+        from core.performance_viewsets import ClassPerformanceViewSet, build_class_performance_summary
+
+        self.final_exam(student0=80)
+        with mock.patch(
+            'core.performance_viewsets.build_class_performance_summary',
+            wraps=build_class_performance_summary,
+        ) as build:
+            first = self.api(ClassPerformanceViewSet, 'summary', class_id=self.class_obj.id)
+            second = self.api(ClassPerformanceViewSet, 'summary', class_id=self.class_obj.id)
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.data['computed_at'], second.data['computed_at'])
+        self.assertNotIn('all_students', second.data)
+
+    def test_closed_class_drops_snapshot(self):
+        ClassPerformanceSnapshot.store(self.class_obj, {'overall_statistics': {}, 'all_students': []})
+        Class.all_objects.filter(pk=self.class_obj.pk).update(is_active=False)
+
+        result = tasks.rebuild_class_performance_snapshot.apply(args=(self.class_obj.id,))
+
+        self.assertEqual(result.get()['status'], 'skipped')
+        self.assertFalse(ClassPerformanceSnapshot.all_objects.filter(class_obj=self.class_obj).exists())
+
+
+class ClassRankingsTests(ClassTestData):
+
+    def rankings(self, **params):
+        from core.performance_viewsets import ClassPerformanceViewSet
+        return self.api(ClassPerformanceViewSet, 'rankings', class_id=self.class_obj.id, **params)
+
+    def test_pages_through_ranked_students(self):
+        self.final_exam(student0=55, student1=90, student2=70, student3=40)
+
+        first = self.rankings(page_size=3)
+        second = self.rankings(page_size=3, page=2)
+
+        self.assertEqual(first.data['count'], 4)
+        self.assertIsNotNone(first.data['next'])
+        self.assertIsNone(second.data['next'])
+        ranked = [row['student_id'] for row in first.data['results'] + second.data['results']]
+        self.assertEqual(ranked, [self.students[i].id for i in (1, 2, 0, 3)])
+
+    def test_ordering_and_field_selection(self):
+        self.final_exam(student0=55, student1=90, student2=70, student3=40)
+
+        response = self.rankings(ordering='-svc_number', fields='svc_number,rank')
+
+        self.assertEqual(response.data['ordering'], '-svc_number')
+        self.assertEqual(
+            response.data['results'],
+            [{'svc_number': 'S003', 'rank': 4}, {'svc_number': 'S002', 'rank': 2},
+             {'svc_number': 'S001', 'rank': 1}, {'svc_number': 'S000', 'rank': 3}],
+        )
+
+    def test_rejects_unknown_ordering_and_fields(self):
+        self.assertEqual(self.rankings(ordering='password').status_code, 400)
+        self.assertEqual(self.rankings(fields='rank,password').status_code, 400)
+
+    def test_summary_inlines_students_only_on_request(self):
+        from core.performance_viewsets import ClassPerformanceViewSet
+
+        self.final_exam(student0=55)
+        header = self.api(ClassPerformanceViewSet, 'summary', class_id=self.class_obj.id)
+        full = self.api(ClassPerformanceViewSet, 'summary', class_id=self.class_obj.id, include='all_students')
+
+        self.assertNotIn('all_students', header.data)
+        self.assertEqual(len(full.data['all_students']), 4)
+        self.assertEqual(header.data['top_performers'], full.data['top_performers'])
+
+
+class FeatureMatrixTests(ClassTestData):
+
+    def test_matrix_rows_follow_enrollments(self):
+        self.final_exam(student0=80, student1=60)
+        other, (component,) = self.policy_subject(100)
+        self.component_result(component, self.students[0], 40)
+        refresh_class_standings(self.class_obj)
+        now = timezone.now()
+        session = AttendanceSession.all_objects.create(
+            school=self.school, class_obj=self.class_obj, title='Session', session_type='class',
+            status='completed', scheduled_start=now, scheduled_end=now, created_by=self.instructor,
+        )
+        SessionAttendance.all_objects.create(
+            school=self.school, session=session, student=self.students[0], status='late',
+        )
+
+        matrix = analytics.build_feature_matrix(
+            [self.class_obj.id], include_subjects=True, include_components=True,
+        )
+
+        self.assertEqual([row['student_id'] for row in matrix.rows], [s.id for s in self.students])
+        np.testing.assert_allclose(matrix.column('attendance_rate'), [100, 0, 0, 0])
+        np.testing.assert_allclose(matrix.column('late_rate')[:1], [100])
+        np.testing.assert_allclose(matrix.column('exam_percentage')[:2], [60, 60])
+        np.testing.assert_allclose(matrix.column(f'subject:{other.id}')[:1], [40])
+        np.testing.assert_allclose(matrix.column(f'component:{component.id}')[:1], [40])
+
+
+class SchoolDailyStatsTests(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        self.exam = self.final_exam(student0=80, student1=40)
+        self.live = school_stats_summary(self.school.id)
+        rebuild_school_daily_stats(self.school.id, date_to=timezone.localdate() - timedelta(days=2))
+
+    def test_rollup_matches_live_totals(self):
+        self.assertTrue(SchoolDailyStats.all_objects.filter(school=self.school, is_dirty=False).exists())
+        self.assertEqual(school_stats_summary(self.school.id), self.live)
+        self.assertEqual((self.live['results_count'], self.live['pass_count']), (2, 1))
+
+    def test_late_result_is_counted_through_dirty_day(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExamResult.all_objects.create(
+                school=self.school, exam=self.exam, student=self.students[2],
+                marks_obtained=60, is_submitted=True,
+            )
+
+        self.assertTrue(SchoolDailyStats.all_objects.get(school=self.school, date=self.exam.exam_date).is_dirty)
+        self.assertEqual(school_stats_summary(self.school.id)['results_count'], 3)
+
+    def test_rescheduled_exam_moves_its_results(self):
+        old_day, new_day = self.exam.exam_date, self.exam.exam_date + timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam.exam_date = new_day
+            self.exam.save()
+
+        self.assertEqual(
+            set(SchoolDailyStats.all_objects.filter(school=self.school, is_dirty=True).values_list('date', flat=True)),
+            {old_day, new_day},
+        )
+        self.assertEqual(school_stats_summary(self.school.id, date_to=old_day)['results_count'], 0)
+        self.assertEqual(school_stats_summary(self.school.id, date_from=new_day)['results_count'], 2)
+
+
+class OICAnalyticsTests(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        self.oic = User.all_objects.create(
+            username='oic', role='oic', svc_number='O001', phone_number='0700000003', email='oic@test.com',
+        )
+        SchoolMembership.all_objects.create(user=self.oic, school=self.school, role='oic', status='active')
+        self.assignment = OICAssignment.all_objects.create(
+            school=self.school, oic=self.oic, class_obj=self.class_obj, assigned_by=self.admin,
+        )
+        self.exam = self.final_exam(student0=80, student1=40)
+
+    def overview(self):
+        from core.oic_views import OICDashboardViewSet
+        return self.api(OICDashboardViewSet, 'overview', user=self.oic).data
+
+    def test_overview_totals(self):
+        data = self.overview()
+
+        self.assertEqual(data['counts']['assigned_classes'], 1)
+        self.assertEqual(data['counts']['total_enrollments'], 4)
+        self.assertEqual(data['counts']['total_subjects'], 1)
+        self.assertEqual(
+            data['exam_performance'], {'total_results': 2, 'average_performance': 60.0, 'pass_rate': 50.0},
+        )
+        self.assertEqual([c['class_id'] for c in data['classes']], [str(self.class_obj.id)])
+
+    def test_overview_query_count_does_not_grow_with_classes(self):
+        with CaptureQueriesContext(connection) as one_class:
+            self.overview()
+
+        other = Class.all_objects.create(
+            school=self.school, course=self.class_obj.course, name='Other', instructor=self.instructor,
+            start_date=date(2026, 1, 1), end_date=date(2026, 6, 1),
+        )
+        OICAssignment.all_objects.create(school=self.school, oic=self.oic, class_obj=other)
+        with CaptureQueriesContext(connection) as two_classes:
+            data = self.overview()
+
+        self.assertEqual(data['counts']['assigned_classes'], 2)
+        self.assertEqual(len(two_classes), len(one_class))
+
+    def test_overview_is_cached_until_assignments_change(self):
+        self.overview()
+        ExamResult.all_objects.create(
+            school=self.school, exam=self.exam, student=self.students[2], marks_obtained=90, is_submitted=True,
+        )
+        self.assertEqual(self.overview()['exam_performance']['total_results'], 2)
+
+        self.assignment.save()
+        self.assertEqual(self.overview()['exam_performance']['total_results'], 3)
+
+    def test_results_summary(self):
+        from core.oic_views import OICClassViewSet
+        self.final_exam(student0=60)
+
+        data = self.api(OICClassViewSet, 'results_summary', user=self.oic, pk=self.class_obj.pk).data
+
+        self.assertEqual(data['overall_statistics'], {'average_percentage': 60.0, 'pass_rate': 66.67, 'total_results': 3})
+        [subject] = data['subject_performance']
+        self.assertEqual(
+            (subject['total_exams'], subject['highest_score'], subject['lowest_score']), (2, 80.0, 40.0),
+        )
+
+
+class ClassComparisonTests(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        self.other = Class.all_objects.create(
+            school=self.school, course=self.class_obj.course, name='Another', instructor=self.instructor,
+            start_date=date(2026, 1, 1), end_date=date(2026, 6, 1),
+        )
+        self.final_exam(student0=80, student1=40)
+        now = timezone.now()
+        session = AttendanceSession.all_objects.create(
+            school=self.school, class_obj=self.class_obj, title='Session', session_type='class',
+            status='completed', scheduled_start=now, scheduled_end=now, created_by=self.instructor,
+        )
+        for student, status in zip(self.students, ['present', 'late', 'absent']):
+            SessionAttendance.all_objects.create(school=self.school, session=session, student=student, status=status)
+
+    def test_rows(self):
+        rows, meta = compare_classes([self.class_obj.id, self.other.id])
+
+        self.assertEqual(meta, {'total_classes': 2})
+        row, empty = rows
+        self.assertEqual(row['class_id'], self.class_obj.id)
+        self.assertEqual(
+            {k: row[k] for k in (
+                'enrolled_students', 'total_results', 'average_percentage', 'pass_rate',
+                'total_sessions', 'attendance_rate', 'expected_attendance_rate', 'combined_performance',
+            )},
+            {
+                'enrolled_students': 4, 'total_results': 2, 'average_percentage': 60.0, 'pass_rate': 50.0,
+                'total_sessions': 1, 'attendance_rate': 66.67, 'expected_attendance_rate': 75.0,
+                'combined_performance': 64.5,
+            },
+        )
+        self.assertEqual((empty['enrolled_students'], empty['average_percentage']), (0, 0))
+
+    def test_query_count_does_not_grow_with_classes(self):
+        with CaptureQueriesContext(connection) as two_classes:
+            compare_classes([self.class_obj.id, self.other.id])
+        extra = [
+            Class.all_objects.create(
+                school=self.school, course=self.class_obj.course, name=f'Extra {i}', instructor=self.instructor,
+                start_date=date(2026, 1, 1), end_date=date(2026, 6, 1),
+            ).id
+            for i in range(3)
+        ]
+        with CaptureQueriesContext(connection) as five_classes:
+            rows, _ = compare_classes([self.class_obj.id, self.other.id, *extra])
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(five_classes), len(two_classes))
+
+    def test_ordering_and_pages(self):
+        rows, meta = compare_classes(
+            [self.class_obj.id, self.other.id], ordering='class_name', page=2, page_size=1,
+        )
+
+        self.assertEqual([r['class_name'] for r in rows], ['Class'])
+        self.assertEqual(meta, {'total_classes': 2, 'page': 2, 'page_size': 1, 'total_pages': 2})
+        with self.assertRaises(ValueError):
+            compare_classes([self.class_obj.id], ordering='instructor')
+
+    def test_view_maps_aliases_and_rejects_bad_ordering(self):
+        from core.performance_viewsets import ClassPerformanceViewSet
+
+        response = self.api(ClassPerformanceViewSet, 'compare_classes', ordering='-total_students')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['class_name'] for c in response.data['classes']], ['Class', 'Another'])
+        self.assertEqual(response.data['classes'][0]['attendance_rate'], 75.0)
+
+        response = self.api(ClassPerformanceViewSet, 'compare_classes', ordering='bogus')
+        self.assertEqual(response.status_code, 400)
+
+
+class TrendTests(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        self.monday = bucket_start(timezone.localdate() - timedelta(days=30), 'week')
+        self.final_exam(exam_date=self.monday, student0=80, student1=40)
+        self.exam = self.final_exam(exam_date=self.monday + timedelta(days=2), student0=100)
+        self.window = {'date_from': self.monday - timedelta(days=7), 'date_to': self.monday + timedelta(days=13)}
+
+    def buckets(self, kind='week'):
+        return trend_buckets(self.class_obj, kind=kind, **self.window)
+
+    def rollup(self):
+        settled = timezone.localdate() - timedelta(days=2)
+        rebuild_school_daily_stats(self.school.id, date_to=settled)
+        return rebuild_class_daily_stats(self.school.id, date_to=settled)
+
+    def test_week_bucket_sums_its_days(self):
+        week = self.buckets()[self.monday]
+
+        self.assertEqual((week['exams_count'], week['exam_results_count'], week['exam_pct_sum']), (2, 3, 220))
+        self.assertEqual(sorted(self.buckets('day')), [self.monday, self.monday + timedelta(days=2)])
+
+    def test_rollup_matches_live_buckets(self):
+        live = self.buckets()
+
+        self.assertEqual(self.rollup(), 2)
+        self.assertEqual(ClassDailyStats.all_objects.filter(class_obj=self.class_obj).count(), 2)
+        self.assertEqual(self.buckets(), live)
+
+    def test_dirty_day_is_read_live(self):
+        self.rollup()
+        with self.captureOnCommitCallbacks(execute=True):
+            ExamResult.all_objects.create(
+                school=self.school, exam=self.exam, student=self.students[2], marks_obtained=60, is_submitted=True,
+            )
+
+        self.assertEqual(self.buckets()[self.monday]['exam_results_count'], 4)
+
+    def test_series_includes_empty_buckets(self):
+        points = trend_series(self.class_obj, kind='week', enrolled=4, **self.window)
+
+        self.assertEqual(
+            [p['period_start'] for p in points], [self.monday + timedelta(days=7 * i) for i in (-1, 0, 1)],
+        )
+        self.assertEqual([p['average_percentage'] for p in points], [None, 73.33, None])
+        self.assertEqual(points[1]['participation_rate'], 37.5)
+
+
+class ReportExportTests(ClassTestData):
+
+    SECTIONS = ['Class', 'Overall Statistics', 'Grade Distribution', 'Subject Performance', 'Student Rankings']
+
+    def setUp(self):
+        super().setUp()
+        self.final_exam(student0=80, student1=40)
+
+    def export(self, **params):
+        from core.performance_viewsets import ClassPerformanceViewSet
+        return self.api(ClassPerformanceViewSet, 'export_report', class_id=self.class_obj.id, **params)
+
+    def csv_rows(self, response):
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def section(self, rows, title):
+        """Header and rows of one CSV section."""
+        start = rows.index([title]) + 1
+        end = rows.index([], start) if [] in rows[start:] else len(rows)
+        return rows[start], rows[start + 1:end]
+
+    def test_csv_is_streamed_by_section(self):
+        response = self.export()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = self.csv_rows(response)
+        self.assertEqual([row for row in rows if len(row) == 1], [[title] for title in self.SECTIONS])
+        header, rankings = self.section(rows, 'Student Rankings')
+        self.assertEqual(header[:2], ['Rank', 'SVC Number'])
+        self.assertEqual([row[:2] for row in rankings[:2]], [['1', 'S000'], ['2', 'S001']])
+
+    def test_detailed_csv_adds_subject_breakdown(self):
+        header, breakdown = self.section(self.csv_rows(self.export(report='detailed')), 'Student Subject Breakdown')
+
+        self.assertEqual(header[:4], ['Rank', 'SVC Number', 'Student Name', 'Subject'])
+        self.assertEqual((breakdown[0][1], breakdown[0][3]), ('S000', 'Subject'))
+
+    def test_xlsx_has_one_sheet_per_section(self):
+        from openpyxl import load_workbook
+
+        response = self.export(output='xlsx')
+
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(workbook.sheetnames, self.SECTIONS)
+
+    def test_rejects_unknown_output(self):
+        self.assertEqual(self.export(output='pdf').status_code, 400)
+        self.assertEqual(self.export(report='full').status_code, 400)
+
+
+class ReportJobTests(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('core.tasks.run_report_job.delay')
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.final_exam(student0=80, student1=40)
+
+    def start(self, action, **params):
+        from core.performance_viewsets import ClassPerformanceViewSet
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api(ClassPerformanceViewSet, action, **{'async': '1'}, **params)
+        self.assertEqual(response.status_code, 202)
+        self.delay.assert_called_once_with(response.data['job_id'])
+        return response.data['job_id']
+
+    def job_view(self, action, job_id):
+        from core.views import ReportJobViewSet
+        return self.api(ReportJobViewSet, action, pk=job_id)
+
+    def test_json_report_runs_once_and_is_inlined(self):
+        job_id = self.start('compare_classes', ordering='class_name')
+
+        self.assertEqual(run_report_job(job_id)['status'], 'completed')
+        self.assertEqual(run_report_job(job_id), {'status': 'skipped', 'job_id': job_id})
+        data = self.job_view('retrieve', job_id).data
+        self.assertEqual(data['params'], {'ordering': 'class_name'})
+        self.assertEqual([c['class_name'] for c in data['result']['classes']], ['Class'])
+
+    def test_file_report_is_downloaded(self):
+        job_id = self.start('export_report', class_id=self.class_obj.id)
+        run_report_job(job_id)
+
+        response = self.job_view('download', job_id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="class_report_class_', response['Content-Disposition'])
+        self.assertTrue(response.content.startswith(b'Class'))
+
+    def test_unfinished_job_is_not_downloadable(self):
+        job_id = self.start('compare_classes')
+
+        self.assertEqual(self.job_view('download', job_id).status_code, 409)
+
+    def test_expired_result_is_gone_then_purged(self):
+        job_id = self.start('compare_classes')
+        run_report_job(job_id)
+        ReportJob.all_objects.filter(id=job_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.job_view('retrieve', job_id).status_code, 410)
+        self.assertEqual(self.job_view('download', job_id).status_code, 410)
+        self.assertEqual(purge_expired_report_jobs(), 1)
+        self.assertFalse(ReportJob.all_objects.filter(id=job_id).exists())
+
+
+class AttendanceTestData(ClassTestData):
+
+    def setUp(self):
+        super().setUp()
+        self.redis = InMemoryRedis()
+        patcher = mock.patch.object(qr_scans, '_redis_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session = AttendanceSession.all_objects.create(
+                school=self.school, class_obj=self.class_obj, subject=self.subject,
+                title='Session', session_type='class', status='scheduled',
+                scheduled_start=now - timedelta(minutes=5), scheduled_end=now + timedelta(hours=1),
+                created_by=self.instructor,
+            )
+        self.session.start_session()
+
+    def scan(self, *students):
+        context = qr_scans.qr_scan_context(self.session.session_id)
+        for student in students:
+            if qr_scans.claim_qr_mark(context, student.id):
+                qr_scans.enqueue_qr_mark(self.session, student.id, status='present')
+
+    def marks(self):
+        return dict(
+            SessionAttendance.all_objects.filter(session=self.session)
+            .values_list('student_id', 'status')
+        )
+
+    def stats(self):
+        return AttendanceSessionStats.all_objects.get(session=self.session)
+
+
+class QRScanQueueTests(AttendanceTestData):
+
+    def test_flush_writes_each_scan_once(self):
+        self.scan(*self.students[:3])
+        self.scan(self.students[0])
+        # A redelivered mark for a student already in the batch.
+        qr_scans.enqueue_qr_mark(self.session, self.students[0].id, status='present')
+        self.assertEqual(self.redis.queued(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            qr_scans.flush_qr_scans()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(qr_scans.flush_qr_scans(), 0)
+
+        self.assertEqual(
+            self.marks(), {student.id: 'present' for student in self.students[:3]},
+        )
+        self.assertEqual((self.redis.queued(), self.redis.in_flight()), (0, 0))
+        self.assertEqual(self.stats().present_count, 3)
+
+    def test_failed_flush_keeps_batch_until_requeued(self):
+        self.scan(*self.students[:2])
+        with mock.patch.object(qr_scans, 'write_qr_marks', side_effect=RuntimeError('database unavailable')):
+            with self.assertRaises(RuntimeError):
+                qr_scans.flush_qr_scans()
+        self.assertEqual((self.redis.queued(), self.redis.in_flight()), (0, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(qr_scans.flush_qr_scans(), 0)
+
+        later = time.time() + settings.QR_SCAN_PROCESSING_TIMEOUT + 1
+        with mock.patch('core.services.qr_scans.time.time', return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(qr_scans.flush_qr_scans(), 2)
+        self.assertEqual(len(self.marks()), 2)
+        self.assertEqual((self.redis.queued(), self.redis.in_flight()), (0, 0))
+
+    def test_scan_written_after_absent_sweep_replaces_absence(self):
+        self.scan(self.students[0])
+        with mock.patch.object(qr_scans, 'write_qr_marks', side_effect=RuntimeError('worker killed')):
+            with self.assertRaises(RuntimeError):
+                qr_scans.flush_qr_scans()
+        # The claim lapsed, so the sweep no longer knows the scan is pending.
+        qr_scans.release_qr_mark(self.session.pk, self.students[0].id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_unmarked_absent([self.session.pk]), {self.session.pk: 4})
+
+        later = time.time() + settings.QR_SCAN_PROCESSING_TIMEOUT + 1
+        with mock.patch('core.services.qr_scans.time.time', return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                qr_scans.flush_qr_scans()
+
+        self.assertEqual(self.marks()[self.students[0].id], 'present')
+        self.assertEqual((self.stats().present_count, self.stats().absent_count), (1, 3))
+
+    def test_end_session_records_queued_scans(self):
+        self.scan(*self.students[:2])
+        set_current_school(self.school)
+        self.addCleanup(clear_current_school)
+        self.admin.clear_membership_cache()
+        from core.views import AttendanceSessionViewSet
+
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = AttendanceSessionViewSet.as_view({'post': 'end'})(request, pk=self.session.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['absent_marked'], 2)
+        self.assertEqual(self.redis.queued(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            qr_scans.flush_qr_scans()
+        self.assertEqual(self.marks(), {
+            self.students[0].id: 'present', self.students[1].id: 'present',
+            self.students[2].id: 'absent', self.students[3].id: 'absent',
+        })
+
+    def test_flushed_mark_keeps_scan_time(self):
+        scanned_at = self.session.scheduled_start + timedelta(minutes=12)
+        context = qr_scans.qr_scan_context(self.session.session_id)
+        qr_scans.claim_qr_mark(context, self.students[0].id)
+        qr_scans.enqueue_qr_mark(self.session, self.students[0].id, status='late', scanned_at=scanned_at)
+
+        with mock.patch('django.utils.timezone.now', return_value=scanned_at + timedelta(minutes=30)):
+            with self.captureOnCommitCallbacks(execute=True):
+                qr_scans.flush_qr_scans()
+
+        attendance = SessionAttendance.all_objects.get(session=self.session, student=self.students[0])
+        self.assertEqual(attendance.marked_at, scanned_at)
+        self.assertEqual(attendance.minutes_late, 12)
+
+    def test_mark_qr_returns_attendance_payload(self):
+        from core.views import SessionAttendanceViewset
+
+        set_current_school(self.school)
+        self.addCleanup(clear_current_school)
+        request = APIRequestFactory().post('/', {
+            'session_id': str(self.session.session_id),
+            'qr_token': self.session.generate_qr_token(),
+        }, format='json')
+        force_authenticate(request, self.students[0])
+        response = SessionAttendanceViewset.as_view({'post': 'mark_qr'})(request)
+
+        self.assertEqual(response.status_code, 200)
+        attendance = response.data['attendance']
+        self.assertEqual(attendance['student_name'], self.students[0].get_full_name())
+        self.assertEqual(attendance['marking_method'], 'qr_scan')
+        self.assertEqual(attendance['status_display'], attendance['status'].title())
+        self.assertIsNotNone(attendance['marked_at_formatted'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            qr_scans.flush_qr_scans()
+        self.assertEqual(self.marks(), {self.students[0].id: attendance['status']})
+
+    def test_absent_sweep_is_idempotent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_mark_session_attendance(
+                self.session, [{'student_id': self.students[0].id, 'status': 'present'}],
+                self.instructor, self.school,
+            )
+        self.scan(self.students[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_unmarked_absent([self.session.pk]), {self.session.pk: 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_unmarked_absent([self.session.pk]), {})
+
+        self.assertEqual(self.marks(), {
+            self.students[0].id: 'present',
+            self.students[2].id: 'absent', self.students[3].id: 'absent',
+        })
+        self.assertEqual(self.redis.queued(), 1)
+
+    def test_periodic_sweep_covers_recently_ended_sessions(self):
+        self.session.end_session()
+        ended_long_ago = timezone.now() - timedelta(hours=settings.ABSENT_MARKING_LOOKBACK_HOURS + 1)
+        AttendanceSession.all_objects.filter(pk=self.session.pk).update(actual_end=ended_long_ago)
+        self.assertEqual(tasks.mark_absent_for_completed_sessions.apply().result, {'sessions': 0, 'marked': 0})
+
+        AttendanceSession.all_objects.filter(pk=self.session.pk).update(actual_end=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(tasks.mark_absent_for_completed_sessions.apply().result, {'sessions': 1, 'marked': 4})
+
+        self.assertEqual(set(self.marks().values()), {'absent'})
+        self.assertEqual(self.stats().absent_count, 4)
+
+    def test_manual_mark_blocks_later_scan(self):
+        qr_scans.qr_scan_context(self.session.session_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_mark_session_attendance(
+                self.session, [{'student_id': self.students[0].id, 'status': 'late'}],
+                self.instructor, self.school,
+            )
+        context = qr_scans.qr_scan_context(self.session.session_id)
+        self.assertFalse(qr_scans.claim_qr_mark(context, self.students[0].id))
+        self.assertTrue(qr_scans.claim_qr_mark(context, self.students[1].id))
+
+
+class BulkMarkTests(AttendanceTestData):
+
+    def bulk_mark(self, *records):
+        with self.captureOnCommitCallbacks(execute=True):
+            return bulk_mark_session_attendance(self.session, list(records), self.instructor, self.school)
+
+    def test_invalid_records_are_reported(self):
+        outsider = User.all_objects.create(
+            username='outsider', role='student', svc_number='S099', first_name='Out', last_name='Sider',
+            phone_number='0719999999', email='outsider@test.com',
+        )
+        SchoolMembership.all_objects.create(user=outsider, school=self.school, role='student')
+
+        created, updated, errors = self.bulk_mark(
+            {'student_id': 'abc', 'status': 'present'},
+            {'student_id': outsider.id, 'status': 'present'},
+            {'student_id': self.students[0].id, 'status': 'present'},
+            {'student_id': 99999, 'status': 'present'},
+        )
+
+        self.assertEqual((created, updated), (1, 0))
+        self.assertEqual(errors, [
+            'Student ID abc not found', 'Student Out Sider is not enrolled.', 'Student ID 99999 not found',
+        ])
+        self.assertEqual(self.marks(), {self.students[0].id: 'present'})
+
+    def test_later_records_win_and_count_as_updates(self):
+        self.bulk_mark({'student_id': self.students[1].id, 'status': 'present'})
+
+        created, updated, errors = self.bulk_mark(
+            {'student_id': self.students[0].id, 'status': 'present'},
+            {'student_id': self.students[0].id, 'status': 'late', 'remarks': '  traffic  '},
+            {'student_id': str(self.students[1].id), 'status': 'excused'},
+        )
+
+        self.assertEqual((created, updated, errors), (1, 2, []))
+        self.assertEqual(self.marks(), {self.students[0].id: 'late', self.students[1].id: 'excused'})
+        mark = SessionAttendance.all_objects.get(session=self.session, student=self.students[0])
+        self.assertEqual((mark.remarks, mark.marking_method, mark.marked_by), ('traffic', 'manual', self.instructor))
+
+    def test_query_count_does_not_grow_with_records(self):
+        with CaptureQueriesContext(connection) as one:
+            self.bulk_mark({'student_id': self.students[0].id, 'status': 'present'})
+        with CaptureQueriesContext(connection) as three:
+            self.bulk_mark(*({'student_id': s.id, 'status': 'late'} for s in self.students[1:]))
+
+        self.assertEqual(len(three), len(one))
+        self.assertEqual(self.stats().late_count, 3)
+
+
+class QRTokenTests(AttendanceTestData):
+
+    def qr_code(self):
+        from core.views import AttendanceSessionViewSet
+        response = self.api(AttendanceSessionViewSet, 'qr_code', pk=self.session.pk)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_token_is_pure_and_verified_within_one_window(self):
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now()):
+            window = self.session.qr_time_window()
+            with self.assertNumQueries(0):
+                token = self.session.generate_qr_token()
+                self.assertEqual(self.session.generate_qr_token(), token)
+
+            self.assertTrue(self.session.verify_qr_token(token))
+            self.assertTrue(self.session.verify_qr_token(self.session._qr_token_for_window(window - 1)))
+            self.assertFalse(self.session.verify_qr_token(self.session._qr_token_for_window(window - 2)))
+
+    def test_displays_are_counted_in_cache_and_flushed(self):
+        self.assertEqual([self.qr_code()['generation_count'] for _ in range(2)], [1, 2])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.qr_generation_count, 0)
+
+        self.assertEqual(flush_qr_generation_counters(), 1)
+        self.assertEqual(flush_qr_generation_counters(), 0)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.qr_generation_count, 2)
+        self.assertIsNotNone(self.session.qr_last_generated)
+        self.assertEqual(qr_generation_stats(self.session)[0], 2)
+        log = AttendanceSessionLog.all_objects.get(session=self.session, action='qr_generated')
+        self.assertEqual(log.metadata['count'], 2)
+        self.assertEqual(self.qr_code()['generation_count'], 3)
+
+
+class SessionStatsCounterTests(AttendanceTestData):
+
+    def test_counters_follow_bulk_mark(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created, updated, errors = bulk_mark_session_attendance(
+                self.session,
+                [
+                    {'student_id': self.students[0].id, 'status': 'present'},
+                    {'student_id': self.students[1].id, 'status': 'present'},
+                    {'student_id': self.students[2].id, 'status': 'late'},
+                ],
+                self.instructor, self.school,
+            )
+        self.assertEqual((created, updated, errors), (3, 0, []))
+        stats = self.stats()
+        self.assertEqual((stats.present_count, stats.late_count, stats.expected_count), (2, 1, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_mark_session_attendance(
+                self.session, [{'student_id': self.students[1].id, 'status': 'absent'}],
+                self.instructor, self.school,
+            )
+        stats = self.stats()
+        self.assertEqual((stats.present_count, stats.absent_count, stats.marked_count), (1, 1, 3))
+
+    def test_close_class_clears_expected_count(self):
+        self.assertEqual(self.session.stats.expected_count, 4)
+        qr_scans.qr_scan_context(self.session.session_id)
+
+        with mock.patch('core.services.class_closure_blocker', return_value=None):
+            with self.captureOnCommitCallbacks(execute=True):
+                success, error, report = close_class(self.class_obj, self.admin)
+
+        self.assertTrue(success)
+        self.assertEqual(report['enrollments_closed'], 4)
+        self.assertEqual(self.stats().expected_count, 0)
+        self.assertIsNone(cache.get(qr_scans._context_key(self.session.session_id)))
+
+    def test_close_class_keeps_completed_session_headcount(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_unmarked_absent([self.session.pk])
+            self.session.end_session()
+
+        with mock.patch('core.services.class_closure_blocker', return_value=None):
+            with self.captureOnCommitCallbacks(execute=True):
+                close_class(self.class_obj, self.admin)
+
+        stats = self.stats()
+        self.assertEqual((stats.expected_count, stats.absent_count), (4, 4))
+
+    def test_stats_without_row_are_counted_not_saved(self):
+        AttendanceSessionStats.all_objects.filter(session=self.session).delete()
+        session = AttendanceSession.all_objects.get(pk=self.session.pk)
+
+        self.assertEqual(session.stats.expected_count, 4)
+        self.assertFalse(AttendanceSessionStats.all_objects.filter(session=self.session).exists())
+
+
+class StandingRefreshTests(ClassTestData):
+
+    def test_refresh_is_queued_once_and_clears_stale_flag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.final_exam(student0=80)
+
+        tasks.refresh_subject_standings_task.apply_async.assert_called_once_with(
+            (self.subject.id,), countdown=settings.STUDENT_STANDING_REFRESH_DELAY,
+        )
+        self.assertEqual(stale_standing_subjects([self.subject.id]), {self.subject.id})
+        student_ids = [student.id for student in self.students]
+        self.assertEqual(
+            get_class_standing_statuses(self.class_obj, student_ids),
+            get_class_completion_statuses(self.class_obj, student_ids),
+        )
+
+        result = tasks.refresh_subject_standings_task.apply(args=(self.subject.id,))
+        self.assertEqual(result.get()['status'], 'ok')
+        self.assertEqual(stale_standing_subjects([self.subject.id]), set())
+        standing = StudentSubjectStanding.all_objects.get(student=self.students[0], subject=self.subject)
+        self.assertEqual(standing.percentage, 80)
+
+    def test_rolled_back_write_queues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.final_exam(student0=80)
+                raise RuntimeError('rollback')
+
+        tasks.refresh_subject_standings_task.apply_async.assert_not_called()
+        self.assertEqual(stale_standing_subjects([self.subject.id]), set())
+
+    def test_failed_refresh_keeps_subject_stale(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.final_exam(student0=80)
+
+        with mock.patch('core.services.refresh_subject_standings', side_effect=RuntimeError('deadlock')):
+            result = tasks.refresh_subject_standings_task.apply(args=(self.subject.id,))
+        self.assertTrue(result.failed())
+        self.assertEqual(stale_standing_subjects([self.subject.id]), {self.subject.id})
+
+    def test_policy_standing_weights_graded_components_only(self):
+        subject, (theory, practical) = self.policy_subject(60, 40)
+        self.component_result(theory, self.students[0], 80)
+
+        refresh_class_standings(self.class_obj)
+
+        standing = StudentSubjectStanding.all_objects.get(student=self.students[0], subject=subject)
+        self.assertEqual(standing.percentage, 80)
+        self.assertEqual((standing.components_graded, standing.pending_components), (1, 1))
+        self.assertFalse(standing.is_complete)
+
+    def test_missing_standings_are_materialized_on_read(self):
+        self.final_exam(student1=70)
+
+        standings = get_subject_standings(self.class_obj, [self.students[1].id])
 
-# Create your tests here.
+        self.assertTrue(standings[(self.students[1].id, self.subject.id)].is_passed)
+        self.assertTrue(StudentSubjectStanding.all_objects.filter(student=self.students[1]).exists())
@@ -5,7 +5,7 @@ from .views import (
     # for the admin
     UserViewSet, CourseViewSet, ClassViewSet, EnrollmentViewSet, SubjectViewSet, NoticeViewSet, SchoolMembershipViewSet, MarksEntryViewSet, AdminRosterViewSet,
     # for the instructor
-    ExamViewSet, ClassNoticeViewSet, ProfileViewSet, CertificateViewSet, CertificateTemplateViewSet, EnrollmentCertificateView,
+    ExamViewSet, ClassNoticeViewSet, ProfileViewSet, CertificateViewSet, CertificateTemplateViewSet, EnrollmentCertificateView, CertificateIssuanceJobViewSet, ReportJobViewSet,
     ExamReportViewSet, ExamResultViewSet, InstructorDashboardViewset, ExamAttachmentViewSet, StudentDashboardViewset, PersonalNotificationViewSet, SchoolViewSet, SchoolAdminViewSet,
     # departments
     DepartmentViewSet, DepartmentMembershipViewSet, ResultEditRequestViewSet, BiometricDeviceViewSet, BiometricUserMappingViewSet,
@@ -28,7 +28,7 @@ from .auth_views import (
     csrf_token_view, login_view, logout_view, current_user_view, change_password_view, token_refresh_view, verify_token_view,
 )
 from .performance_viewsets import (
-    SubjectPerformanceViewSet, ClassPerformanceViewSet,
+    SubjectPerformanceViewSet, ClassPerformanceViewSet, PerformanceStatisticsViewSet,
 )
 from .commandant_views import (
     CommandantDashboardViewSet,
@@ -73,6 +73,7 @@ app_name = 'core'
 # performance summary
 router.register(r'subject-performance', SubjectPerformanceViewSet, basename='subject-performance')
 router.register(r'class-performance', ClassPerformanceViewSet, basename='class-performance')
+router.register(r'performance-statistics', PerformanceStatisticsViewSet, basename='performance-statistics')
 
 # attendance
 router.register(r'attendance-sessions', AttendanceSessionViewSet, basename='attendance-session')
@@ -95,6 +96,8 @@ router.register(r'certificate_templates', CertificateTemplateViewSet, basename='
 
 # certificates
 router.register(r'certificates', CertificateViewSet, basename='certificate')
+router.register(r'certificate-jobs', CertificateIssuanceJobViewSet, basename='certificate-job')
+router.register(r'report-jobs', ReportJobViewSet, basename='report-job')
 
 # indexes
 router.register(r"marks-entry", MarksEntryViewSet, basename="marks-entry")
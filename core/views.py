@@ -1,12 +1,13 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status, filters
 from rest_framework.pagination import PageNumberPagination
-from .models import (User, StudentIndex, Profile, Course, Class, Enrollment, Subject, Notice, Exam, ExamReport, ExamReportRemark, PersonalNotification, School, SchoolAdmin, Certificate, CertificateDownloadLog, CertificateTemplate,
+from .models import (User, StudentIndex, ClassIndexSequence, Profile, Course, Class, Enrollment, Subject, Notice, Exam, ExamReport, ExamReportRemark, PersonalNotification, School, SchoolAdmin, Certificate, CertificateDownloadLog, CertificateTemplate,
  SchoolMembership,Attendance, ExamResult, ClassNotice, ExamAttachment, NoticeReadStatus, ClassNoticeReadStatus, AttendanceSessionLog,AttendanceSession, SessionAttendance,BiometricRecord,ExamResultNotificationReadStatus,
- Department, DepartmentMembership, ResultEditRequest, BiometricUserMapping, BiometricDevice, AssessmentComponent, StudentComponentResult)
+ Department, DepartmentMembership, ResultEditRequest, BiometricUserMapping, BiometricDevice, AssessmentComponent, StudentComponentResult,
+ CertificateIssuanceJob, ReportJob)
 from .serializers import (
 
-    CertificateDownloadLogSerializer,CertificateTemplateSerializer,BiometricSyncSerializer,CertificateSerializer,CertificateListSerializer,SchoolEnrollmentSerializer,SchoolMembershipSerializer,UserSerializer, ProfileReadSerializer, ProfileUpdateSerializer, CourseSerializer, ClassSerializer, EnrollmentSerializer, SubjectSerializer,PersonalNotificationSerializer,
+    CertificateDownloadLogSerializer,CertificateTemplateSerializer,CertificateIssuanceJobSerializer,CertificateIssuanceJobDetailSerializer,ReportJobSerializer,BiometricSyncSerializer,CertificateSerializer,CertificateListSerializer,SchoolEnrollmentSerializer,SchoolMembershipSerializer,UserSerializer, ProfileReadSerializer, ProfileUpdateSerializer, CourseSerializer, ClassSerializer, EnrollmentSerializer, SubjectSerializer,PersonalNotificationSerializer,
     NoticeSerializer,BulkAttendanceSerializer, UserListSerializer, ClassNotificationSerializer, ClassListSerializer, ClassSerializer,
     ExamReportSerializer, ExamReportRemarkSerializer, AddRemarkSerializer, ExamResultSerializer, AttendanceSerializer, ExamSerializer, QRAttendanceMarkSerializer,SchoolSerializer,SchoolAdminSerializer,SchoolCreateWithAdminSerializer,SchoolListSerializer,SchoolThemeSerializer,
     BulkExamResultSerializer,ExamAttachmentSerializer,AttendanceSessionListSerializer,AttendanceSessionSerializer, AttendanceSessionLogSerializer,DepartmentSerializer, DepartmentMembershipSerializer,
@@ -30,6 +31,7 @@ from dateutil import parser
 from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
 import io
 import csv
+import json
 from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 from django.db import transaction
 from rest_framework.permissions import BasePermission
@@ -42,14 +44,23 @@ from rest_framework.viewsets import GenericViewSet
 from .services import (
     close_class,issue_certificate, CertificateGenerator, CertificateDownloadLog, 
     check_class_completion_for_all_students,get_class_completion_status,
-    bulk_issue_certificates, bulk_assign_indexes, assign_student_index, evaluate_subject_pass_fail,
-    determine_retake_requirements, compute_component_results, get_subject_completion_status_v2)
+    bulk_issue_certificates, start_certificate_issuance_job, bulk_assign_indexes, assign_student_index, evaluate_subject_pass_fail,
+    determine_retake_requirements, compute_component_results, get_subject_completion_status_v2,
+    get_subject_standings, class_closure_blocker, CLASS_CLOSURE_REPORT_KEY,
+    get_retake_requirements, bulk_mark_session_attendance, mark_unmarked_absent,
+    annotate_certificate_job_progress)
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, permissions
 from core.services.zkteco_service import ZKTecoSyncService
+from core.services.report_jobs import async_report, report_job_result
+from core.services.qr_tokens import record_qr_generation, qr_generation_stats
+from core.services.qr_scans import claim_qr_mark, enqueue_qr_mark, release_qr_mark
+from .grading import GradeScale
 from datetime import datetime
 from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import cache
 import logging
 logger = logging.getLogger(__name__)
 
@@ -1278,7 +1289,29 @@ class ClassViewSet(viewsets.ModelViewSet):
     def close(self, request, pk=None):
         
         class_obj = self.get_object()
-        success, error = close_class(class_obj, request.user)
+
+        active_count = Enrollment.all_objects.filter(class_obj=class_obj, is_active=True).count()
+        if (
+            request.query_params.get('async') in ('1', 'true')
+            or active_count >= settings.CLASS_CLOSURE_ASYNC_THRESHOLD
+        ):
+            error = class_closure_blocker(class_obj)
+            if error:
+                return Response(
+                    {'error': error},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            from .tasks import close_class_task
+            task = close_class_task.delay(class_obj.id, request.user.id)
+            return Response({
+                'status': 'accepted',
+                'message': f'Closing class {class_obj.name} in the background.',
+                'task_id': task.id,
+                'active_enrollments': active_count,
+            }, status=status.HTTP_202_ACCEPTED)
+
+        success, error, report = close_class(class_obj, request.user)
 
         if not success:
             return Response(
@@ -1289,7 +1322,27 @@ class ClassViewSet(viewsets.ModelViewSet):
         return Response({
             'status': 'success',
             'message': f'Class {class_obj.name} has been closed.',
-            'class': ClassSerializer(class_obj).data
+            'class': ClassSerializer(class_obj).data,
+            'report': report,
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdmin])
+    def closure_report(self, request, pk=None):
+
+        class_obj = self.get_object()
+        report = cache.get(CLASS_CLOSURE_REPORT_KEY.format(class_id=class_obj.id))
+
+        if report is None:
+            return Response({
+                'status': 'closed' if class_obj.is_closed else 'pending',
+                'class_id': class_obj.id,
+                'report': None,
+            })
+
+        return Response({
+            'status': report.get('status'),
+            'class_id': class_obj.id,
+            'report': report,
         })
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdmin])
@@ -1311,6 +1364,56 @@ class ClassViewSet(viewsets.ModelViewSet):
             'pending':len(results) - complete_count,
             'students': results
         })
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdminOrInstructor])
+    def retake_requirements(self, request, pk=None):
+
+        class_obj = self.get_object()
+
+        subject = None
+        subject_id = request.query_params.get('subject_id')
+        if subject_id:
+            subject = get_object_or_404(Subject.all_objects, pk=subject_id, class_obj=class_obj)
+
+        rows = get_retake_requirements(class_obj, subject=subject)
+
+        if request.query_params.get('export') == 'csv':
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow([
+                'SVC Number', 'Student Name', 'Subject', 'Component', 'Critical',
+                'Current %', 'Pass Mark %', 'Attempts Used', 'Max Attempts', 'Can Retake',
+            ])
+            for row in rows:
+                writer.writerow([
+                    row['svc_number'],
+                    row['student_name'],
+                    row['subject_name'],
+                    row['component_name'],
+                    'Yes' if row['is_critical'] else 'No',
+                    row['current_percentage'],
+                    row['pass_mark'],
+                    row['attempts_used'],
+                    row['max_attempts'] or 'Unlimited',
+                    'Yes' if row['can_retake'] else 'No',
+                ])
+
+            output.seek(0)
+            response = HttpResponse(output.getvalue(), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="retakes_{class_obj.id}.csv"'
+            return response
+
+        return Response({
+            'class': {
+                'id': class_obj.id,
+                'name': class_obj.name,
+            },
+            'subject_id': subject.id if subject else None,
+            'total_retakes': len(rows),
+            'students_affected': len({r['student_id'] for r in rows}),
+            'eligible': sum(1 for r in rows if r['can_retake']),
+            'results': rows,
+        })
         
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsAdmin])
     def issue_certificates(self, request, pk=None):
@@ -1329,6 +1432,17 @@ class ClassViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
+        # Large classes can opt into the background job with ?async=1.
+        if request.query_params.get('async', '').lower() in ('1', 'true'):
+            job, result = start_certificate_issuance_job(
+                class_obj, request.user, template=template,
+            )
+            return Response({
+                'status': 'accepted',
+                **result,
+                'job': CertificateIssuanceJobSerializer(job).data,
+            }, status=status.HTTP_202_ACCEPTED)
+
         result = bulk_issue_certificates(class_obj, request.user, template=template)
 
         if 'error' in result:                         
@@ -2111,25 +2225,13 @@ class ExamViewSet(viewsets.ModelViewSet):
 
        
         if exam.component_id:
-            comp_results = StudentComponentResult.all_objects.filter(
-                component_id=exam.component_id,
-                student_id__in=[r['student'] for r in serialized_results],
-                is_submitted=True,
-                marks_obtained__isnull=False,
-            ).select_related('component')
-
-            effective: dict = {}
-            for cr in comp_results:
-                sid = cr.student_id
-                existing = effective.get(sid)
-                if existing is None:
-                    effective[sid] = cr
-                elif cr.component.retake_evaluation == 'best':
-                    if float(cr.percentage or 0) > float(existing.percentage or 0):
-                        effective[sid] = cr
-                else:  
-                    if cr.attempt_number > existing.attempt_number:
-                        effective[sid] = cr
+            effective = {
+                cr.student_id: cr
+                for cr in StudentComponentResult.all_objects.filter(
+                    component_id=exam.component_id,
+                    student_id__in=[r['student'] for r in serialized_results],
+                ).effective()
+            }
 
             enriched = []
             for r in serialized_results:
@@ -2385,6 +2487,7 @@ class ExamResultViewSet(viewsets.ModelViewSet):
         ).select_related('exam', 'exam__subject', 'exam__subject__class_obj', 'student', 'graded_by')
         serializer = self.get_serializer(results, many=True)
 
+        grade_school = get_current_school() or request.user.school
         subject_map = {}
         for r in results:
             subj = r.exam.subject
@@ -2407,14 +2510,14 @@ class ExamResultViewSet(viewsets.ModelViewSet):
             obtained = subj_data['total_marks_obtained']
             pct = (obtained / possible * 100) if possible > 0 else 0
             subj_data['percentage'] = round(pct, 2)
-            subj_data['grade'] = self._calculate_overall_grade(pct)
+            subj_data['grade'] = self._calculate_overall_grade(pct, grade_school)
 
         subject_summaries = sorted(subject_map.values(), key=lambda x: x['subject_name'])
 
         grand_total_obtained = sum(s['total_marks_obtained'] for s in subject_map.values())
         grand_total_possible = sum(s['total_possible_marks'] for s in subject_map.values())
         overall_percentage = (grand_total_obtained / grand_total_possible * 100) if grand_total_possible > 0 else 0
-        overall_grade = self._calculate_overall_grade(overall_percentage)
+        overall_grade = self._calculate_overall_grade(overall_percentage, grade_school)
 
         return Response({
             'count': results.count(),
@@ -2431,30 +2534,13 @@ class ExamResultViewSet(viewsets.ModelViewSet):
         })
 
     @staticmethod
-    def _calculate_overall_grade(percentage):
-        if percentage >= 91:
-            return 'A'
-        elif percentage >= 86:
-            return 'A-'
-        elif percentage >= 81:
-            return 'B+'
-        elif percentage >= 76:
-            return 'B'
-        elif percentage >= 71:
-            return 'B-'
-        elif percentage >= 65:
-            return 'C+'
-        elif percentage >= 60:
-            return 'C'
-        elif percentage >= 50:
-            return 'C-'
-        else:
-            return 'F'
+    def _calculate_overall_grade(percentage, school=None):
+        return GradeScale.for_school(school).classify(percentage)
 
     def _create_grade_notification(self, exam_result):
         try:
             percentage = (exam_result.marks_obtained / exam_result.exam.total_marks * 100) if exam_result.exam.total_marks > 0 else 0
-            grade_letter = self._calculate_overall_grade(percentage)
+            grade_letter = self._calculate_overall_grade(percentage, exam_result.school_id)
 
             title = f"Grade Posted: {exam_result.exam.title}"
 
@@ -2637,6 +2723,7 @@ class ExamResultViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(results, many=True)
 
+        grade_school = get_current_school() or request.user.school
         subject_map = {}
         for r in results:
             subj = r.exam.subject
@@ -2659,14 +2746,14 @@ class ExamResultViewSet(viewsets.ModelViewSet):
             obtained = subj_data['total_marks_obtained']
             pct = (obtained / possible * 100) if possible > 0 else 0
             subj_data['percentage'] = round(pct, 2)
-            subj_data['grade'] = self._calculate_overall_grade(pct)
+            subj_data['grade'] = self._calculate_overall_grade(pct, grade_school)
 
         subject_summaries = sorted(subject_map.values(), key=lambda x: x['subject_name'])
 
         grand_total_obtained = sum(s['total_marks_obtained'] for s in subject_map.values())
         grand_total_possible = sum(s['total_possible_marks'] for s in subject_map.values())
         overall_percentage = (grand_total_obtained / grand_total_possible * 100) if grand_total_possible > 0 else 0
-        overall_grade = self._calculate_overall_grade(overall_percentage)
+        overall_grade = self._calculate_overall_grade(overall_percentage, grade_school)
 
         return Response({
             'count': results.count(),
@@ -2982,6 +3069,7 @@ class ExamReportViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=True, methods=['get'])
+    @async_report
     def detailed_report(self, request, pk=None):
 
         report = self.get_object()
@@ -3526,60 +3614,22 @@ class StudentDashboardViewset(viewsets.ViewSet):
         }
 
         if active_class_id:
-            active_class_results = ExamResult.objects.filter(
-                student=user,
-                is_submitted=True,
-                marks_obtained__isnull=False,
-                exam__subject__class_obj_id=active_class_id,
-            ).select_related('exam')
+            active_standings = get_subject_standings(
+                active_enrollment.class_obj, [user.id],
+            ).values()
 
-            policy_comp_results = StudentComponentResult.objects.filter(
-                student=user,
-                component__subject__class_obj_id=active_class_id,
-                is_submitted=True,
-                marks_obtained__isnull=False,
-            ).select_related('component')
-
-            effective_policy = {}
-            for r in policy_comp_results:
-                cid = r.component_id
-                existing = effective_policy.get(cid)
-                if existing is None:
-                    effective_policy[cid] = r
-                elif r.component.retake_evaluation == 'best':
-                    if float(r.percentage or 0) > float(existing.percentage or 0):
-                        effective_policy[cid] = r
-                else:
-                    if r.attempt_number > existing.attempt_number:
-                        effective_policy[cid] = r
+            total_marks = 0.0
+            total_possible = 0.0
+            for st in active_standings:
+                total_marks += float(st.exam_marks_obtained) + float(st.component_marks_obtained)
+                total_possible += st.exam_marks_possible + st.component_marks_possible
 
-            has_results = active_class_results.exists() or bool(effective_policy)
+            has_results = total_possible > 0
             if has_results:
-                total_marks = sum(float(r.marks_obtained) for r in active_class_results)
-                total_possible = sum(float(r.exam.total_marks) for r in active_class_results)
-                for r in effective_policy.values():
-                    total_marks += float(r.marks_obtained)
-                    total_possible += float(r.component.total_marks)
                 average_percentage = (total_marks / total_possible * 100) if total_possible > 0 else 0
-
-                if average_percentage >=91:
-                    grade_letter = 'A'
-                elif average_percentage >=86:
-                    grade_letter = 'A-'
-                elif average_percentage >= 81:
-                    grade_letter = 'B+'
-                elif average_percentage >= 76:
-                    grade_letter = 'B'
-                elif average_percentage >= 71:
-                    grade_letter = 'B-'
-                elif average_percentage >= 65:
-                    grade_letter = 'C+'
-                elif average_percentage >= 60:
-                    grade_letter = 'C'
-                elif average_percentage >= 50:
-                    grade_letter = 'C-'
-                else:
-                    grade_letter = 'F'
+                grade_letter = GradeScale.for_school(
+                    active_enrollment.class_obj.school_id
+                ).classify(average_percentage)
 
                 stats['active_class_id'] = active_class_id
                 stats['active_class_name'] = active_class_name
@@ -3876,7 +3926,7 @@ class StudentDashboardViewset(viewsets.ViewSet):
 class AttendanceSessionViewSet(viewsets.ModelViewSet):
 
     queryset = AttendanceSession.objects.select_related(
-        'class_obj', 'subject', 'created_by'
+        'class_obj', 'subject', 'created_by', 'live_stats'
     ).all()
     permission_classes = [IsAuthenticated, IsAdminOrInstructor]
     filterset_fields = ['class_obj', 'subject', 'session_type', 'status', 'is_active']
@@ -3891,7 +3941,7 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = AttendanceSession.all_objects.select_related(
-            'class_obj', 'subject', 'created_by'
+            'class_obj', 'subject', 'created_by', 'live_stats'
         ).all()
         user = self.request.user
 
@@ -3977,42 +4027,27 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
 
         if session.end_session():
 
-            marked_student_ids = session.session_attendances.values_list('student_id', flat=True)
-            unmarked_students = User.all_objects.filter(
-                enrollments__class_obj = session.class_obj,
-                enrollments__is_active = True,
-                role='student',
-                is_active = True
-            ).exclude(id__in=marked_student_ids)
-
-            absent_records = []
-            for student in unmarked_students:
-                absent_records.append(SessionAttendance(
-                    session=session,
-                    student=student,
-                    status='absent',
-                    marking_method = 'admin',
-                    marked_by =request.user,
-                    remarks = 'Automatically marked absent when session ended'
-                ))
-
-            if absent_records:
-                SessionAttendance.objects.bulk_create(absent_records)
+            absent_count = mark_unmarked_absent(
+                [session],
+                marked_by=request.user,
+                remarks='Automatically marked absent when session ended',
+            ).get(session.id, 0)
 
             AttendanceSessionLog.objects.create(
                 session=session,
                 action = 'session_ended',
                 performed_by = request.user,
-                description = f"Session ended. {len(absent_records)} students marked absent automatically",
+                description = f"Session ended. {absent_count} students marked absent automatically",
                 ip_address= request.META.get('REMOTE_ADDR'),
-                metadata = {'absent_count': len(absent_records)}
+                metadata = {'absent_count': absent_count}
             )
 
+            session.refresh_from_db()
             serializer = self.get_serializer(session)
             return Response({
                 'status': "success",
-                'message':'Session ended successuflly. {len(absent_records)} students marked absent.',
-                'absent_marked': len(absent_records),
+                'message':f'Session ended successuflly. {absent_count} students marked absent.',
+                'absent_marked': absent_count,
                 'session': serializer.data
             })
         return Response({
@@ -4030,27 +4065,18 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-        token = session.generate_qr_token()
-
-        elapsed = (timezone.now() - session.qr_last_generated).total_seconds()\
-
-        expires_time = max(0, int(session.qr_refresh_interval - elapsed))
-
-        AttendanceSessionLog.objects.create(
-            session=session,
-            action='qr_generated',
-            performed_by=request.user,
-            description=f"QR code generated (count: {session.qr_generation_count})",
-            metadata = {'token': token, 'expires_in': expires_time}
+        now = timezone.now()
+        token = session.generate_qr_token(now)
+        record_qr_generation(session, now)
+        generation_count, _ = qr_generation_stats(session)
 
-        )
         return Response({
             'session_id':str(session.session_id),
             'qr_token':token,
-            'expires_time':expires_time,
+            'expires_time':session.qr_expires_in(now),
             'refresh_interval':session.qr_refresh_interval,
-            'generated_at':session.qr_last_generated,
-            'generation_count':session.qr_generation_count
+            'generated_at':now,
+            'generation_count':generation_count
         })
 
     @action(detail=True, methods=['get'])
@@ -4058,14 +4084,8 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
         session = self.get_object()
 
         attendances = session.session_attendances.all()
+        stats = session.stats
 
-        status_counts = attendances.aggregate(
-            present = Count(Case(When(status='present', then=1), output_field=IntegerField())),
-            late= Count(Case(When(status='late', then=1), output_field=IntegerField())),
-            absent = Count(Case(When(status='absent', then=1), output_field=IntegerField())),
-            excused = Count(Case(When(status='excused', then=1), output_field=IntegerField()))
-        )
-        
         method_counts = attendances.aggregate(
             qr_scan=Count(Case(When(marking_method='qr_scan', then=1), output_field=IntegerField())),
             manual = Count(Case(When(marking_method='manual', then=1), output_field=IntegerField())),
@@ -4073,19 +4093,19 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
             admin = Count(Case(When(marking_method='admin', then=1), output_field=IntegerField()))
         )
 
-        total_students = session.total_students
-        marked_count = attendances.count()
+        total_students = stats.expected_count
+        marked_count = stats.marked_count
 
         attendance_rate = (marked_count /total_students * 100) if total_students > 0 else 0
-        on_time_rate = (status_counts['present'] / marked_count * 100) if marked_count > 0 else 0
+        on_time_rate = (stats.present_count / marked_count * 100) if marked_count > 0 else 0
 
         statistics = {
             'total_students': total_students,
             'marked_count':marked_count,
-            'present_count':status_counts['present'],
-            'late_count': status_counts['late'],
-            'absent_count': status_counts['absent'],
-            'excused_count':status_counts['excused'],
+            'present_count':stats.present_count,
+            'late_count': stats.late_count,
+            'absent_count': stats.absent_count,
+            'excused_count':stats.excused_count,
             'attendance_rate':round(attendance_rate, 2),
             'on_time_rate':round(on_time_rate, 2),
             'qr_scan_count':method_counts['qr_scan'],
@@ -4098,7 +4118,7 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
         return Response({
             'statistics':statistics,
             'session': AttendanceSessionSerializer(session).data,
-            'count':attendances.count(),
+            'count':marked_count,
             'attendances':serializer.data
         })
 
@@ -4136,40 +4156,24 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
             }, status= status.HTTP_400_BAD_REQUEST)
 
 
-        marked_student_ids = session.session_attendances.values_list('student_id', flat=True)
-        unmarked_students = User.objects.filter(
-            enrollments__class_obj = session.class_obj,
-            enrollments__is_active = True,
-            role='student',
-            is_active=True
-        ).exclude(id__in=marked_student_ids)
-
-        absent_records = []
-
-        for student in unmarked_students:
-            absent_records.append(SessionAttendance(
-                session=session,
-                student= student,
-                status = 'absent',
-                marking_method = 'admin',
-                marked_by = request.user,
-                remarks = 'Automatically marked absent after session ended'
-            ))
-
-        SessionAttendance.objects.bulk_create(absent_records)
+        absent_count = mark_unmarked_absent(
+            [session],
+            marked_by=request.user,
+            remarks='Automatically marked absent after session ended',
+        ).get(session.id, 0)
 
         AttendanceSessionLog.objects.create(
             session=session,
             action= 'bulk_import',
             performed_by=request.user,
-            description = f"Marked {len(absent_records)} students as absent",
-            metadata = {'count': len(absent_records)}
+            description = f"Marked {absent_count} students as absent",
+            metadata = {'count': absent_count}
         )
 
         return Response({
             'status': 'success',
-            'message':f'{len(absent_records)} students marked as absent',
-            'count':len(absent_records)
+            'message':f'{absent_count} students marked as absent',
+            'count':absent_count
         })
 
     @action(detail=True, methods=['get'])
@@ -4276,23 +4280,24 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
         session = self.get_object()
         
         attendances = session.session_attendances.select_related('student', 'marked_by').all()
+        stats = session.stats
         
-        total_students = session.total_students
-        marked_count = attendances.count()
+        total_students = stats.expected_count
+        marked_count = stats.marked_count
         
         status_counts = {
-            'present': attendances.filter(status='present').count(),
-            'late': attendances.filter(status='late').count(),
-            'absent': attendances.filter(status='absent').count(),
-            'excused': attendances.filter(status='excused').count()
+            'present': stats.present_count,
+            'late': stats.late_count,
+            'absent': stats.absent_count,
+            'excused': stats.excused_count
         }
         
-        method_counts = {
-            'qr_scan': attendances.filter(marking_method='qr_scan').count(),
-            'manual': attendances.filter(marking_method='manual').count(),
-            'biometric': attendances.filter(marking_method='biometric').count(),
-            'admin': attendances.filter(marking_method='admin').count()
-        }
+        method_counts = attendances.aggregate(
+            qr_scan=Count('id', filter=Q(marking_method='qr_scan')),
+            manual=Count('id', filter=Q(marking_method='manual')),
+            biometric=Count('id', filter=Q(marking_method='biometric')),
+            admin=Count('id', filter=Q(marking_method='admin'))
+        )
         
         marked_student_ids = attendances.values_list('student_id', flat=True)
         unmarked_students = User.objects.filter(
@@ -4386,42 +4391,52 @@ class SessionAttendanceViewset(viewsets.ModelViewSet):
         serializer = QRAttendanceMarkSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        session = serializer.validated_data['session']
+        context = serializer.validated_data['context']
+        session = context['session']
         student = request.user
 
-
-        if not Enrollment.objects.filter(
-            student=student,
-            class_obj=session.class_obj,
-            is_active=True
-        ).exists():
+        if student.id not in context['enrolled']:
             return Response({
                 'error': 'You are not enrolled in this class'
             }, status=status.HTTP_403_FORBIDDEN)
 
-        if SessionAttendance.objects.filter(session=session, student=student).exists():
+        if not claim_qr_mark(context, student.id):
             return Response({
                 'error': 'You have already marked attendance for this session.'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-
         attendance_time = timezone.now()
         attendance_status = session.get_attendance_status_for_time(attendance_time)
 
-        attendance = SessionAttendance.objects.create(
+        try:
+            enqueue_qr_mark(
+                session,
+                student.id,
+                status=attendance_status,
+                latitude=serializer.validated_data.get('latitude'),
+                longitude=serializer.validated_data.get('longitude'),
+                ip_address=request.META.get('REMOTE_ADDR'),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                scanned_at=attendance_time,
+            )
+        except Exception:
+            release_qr_mark(session.pk, student.id)
+            raise
+
+        # The row is written by the next flush; describe it as it will be stored.
+        attendance = SessionAttendance(
+            school_id=session.school_id,
             session=session,
             student=student,
-            status= attendance_status,
-            marking_method = 'qr_scan',
-            marked_by = student,
-            latitude = serializer.validated_data.get('latitude'),
-            longitude = serializer.validated_data.get('longitude'),
-            ip_address = request.META.get('REMOTE_ADDR'),
-            user_agent= request.META.get('HTTP_USER_AGENT', '')
-
-
+            status=attendance_status,
+            marking_method='qr_scan',
+            marked_by=student,
+            latitude=serializer.validated_data.get('latitude'),
+            longitude=serializer.validated_data.get('longitude'),
+            ip_address=request.META.get('REMOTE_ADDR'),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            marked_at=attendance_time,
         )
-
         return Response({
             'status': 'success',
             'message':f'Attendance marked as {attendance.get_status_display()}',
@@ -4449,50 +4464,12 @@ class SessionAttendanceViewset(viewsets.ModelViewSet):
                 return Response({
                     'error': 'You do not have permission to mark attendance for this session.'
                 }, status=status.HTTP_403_FORBIDDEN)
-        records = serializer.validated_data['attendance_records']
-
-        created_count = 0
-        updated_count = 0
-        errors =[]
-
-        for record in records:
-            try:
-                student = User.all_objects.get(
-                    id=record['student_id'],
-                    role='student',
-                    school_memberships__school=request.user.school,
-                    school_memberships__status='active',
-                )
-
-                if not Enrollment.objects.filter(
-                    student=student,
-                    class_obj=session.class_obj,
-                    is_active=True
-                ).exists():
-                    errors.append(f"Student {student.get_full_name()} is not enrolled.")
-                    continue
-
-                attendance, created  =SessionAttendance.objects.update_or_create(
-                    session = session,
-                    student = student,
-                    defaults = {
-                        'status': record['status'],
-                        'marking_method': 'manual',
-                        'marked_by': request.user,
-                        'remarks': record.get('remarks', '').strip() or None
-                    }
-                )
-
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-
-            except User.DoesNotExist:
-                errors.append(f"Student ID {record['student_id']} not found")
-            except Exception as e:
-                errors.append(f"Error processing student{record['student_id']}: {str(e)}")
-
+        created_count, updated_count, errors = bulk_mark_session_attendance(
+            session,
+            serializer.validated_data['attendance_records'],
+            request.user,
+            request.user.school,
+        )
 
         AttendanceSessionLog.objects.create(
             session=session,
@@ -5069,6 +5046,7 @@ class AttendanceReportViewSet(viewsets.ViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @async_report
     def low_attendance_alert(self, request):
         class_id = request.query_params.get('class_id')
         threshold = float(request.query_params.get('threshold', 75.0))
@@ -5548,6 +5526,82 @@ class CertificateViewSet(viewsets.ReadOnlyModelViewSet):
             'results': serializer.data,
         })
 
+class CertificateIssuanceJobViewSet(viewsets.ReadOnlyModelViewSet):
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'class_obj']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        qs = annotate_certificate_job_progress(
+            CertificateIssuanceJob.all_objects.select_related(
+                'class_obj', 'template', 'requested_by',
+            )
+        )
+        user = self.request.user
+        if user.active_role == 'superadmin':
+            school = get_current_school()
+            return qs.filter(school=school) if school else qs
+        if user.school:
+            return qs.filter(school=user.school)
+        return qs.none()
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return CertificateIssuanceJobDetailSerializer
+        return CertificateIssuanceJobSerializer
+
+class ReportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Background report jobs started with ``?async=1`` on a report action.
+    Users only see their own jobs. While the job runs, poll the detail
+    endpoint. JSON results are then inlined under ``result``; file
+    results are fetched from ``download``.
+    """
+
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'action']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        return ReportJob.all_objects.filter(requested_by=self.request.user).defer('result')
+
+    def retrieve(self, request, *args, **kwargs):
+        job = ReportJob.all_objects.filter(
+            requested_by=request.user, id=kwargs.get('pk'),
+        ).first()
+        if job is None:
+            return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+        if job.expires_at and job.expires_at < timezone.now():
+            return Response({'error': 'Report result has expired'}, status=status.HTTP_410_GONE)
+
+        data = self.get_serializer(job).data
+        if job.is_finished and job.is_json and job.result is not None:
+            data['result'] = json.loads(report_job_result(job))
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = ReportJob.all_objects.filter(requested_by=request.user, id=pk).first()
+        if job is None:
+            return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not job.is_finished or job.result is None:
+            return Response({'error': 'Report is not ready yet', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+        if job.expires_at and job.expires_at < timezone.now():
+            return Response({'error': 'Report result has expired'}, status=status.HTTP_410_GONE)
+
+        response = HttpResponse(
+            report_job_result(job),
+            content_type=job.result_content_type or 'application/octet-stream',
+            status=job.result_status or 200,
+        )
+        if job.result_filename:
+            response['Content-Disposition'] = f'attachment; filename="{job.result_filename}"'
+        return response
+
 class EnrollmentCertificateView(APIView):
 
     permission_classes = [IsAuthenticated]
@@ -5853,6 +5907,7 @@ class AdminRosterViewSet(viewsets.ViewSet):
 
         student_index.index_number = new_number
         student_index.save(update_fields=["index_number"])
+        ClassIndexSequence.bump_to(class_obj, int(new_number))
 
         return Response({
             "message": f"Index updated to {class_obj.format_index(int(new_number))}.",
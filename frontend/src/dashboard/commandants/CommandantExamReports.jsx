@@ -348,7 +348,11 @@ export default function CommandantExamReports() {
     if (!selectedClass) return
     setLoadingComprehensive(true)
     try {
-      const data = await api.getClassPerformanceSummary(selectedClass)
+      const [data, allStudents] = await Promise.all([
+        api.getClassPerformanceSummary(selectedClass),
+        api.getAllClassPerformanceRankings(selectedClass),
+      ])
+      if (data) data.all_students = allStudents
       if (data?.all_students) {
         data.all_students = data.all_students.map(student => {
           let totalObtained = 0, totalPossible = 0
@@ -336,7 +336,11 @@ export default function ExamReports() {
     if (!selectedClass) return
     setLoadingComprehensive(true)
     try {
-      const data = await api.getClassPerformanceSummary(selectedClass)
+      const [data, allStudents] = await Promise.all([
+        api.getClassPerformanceSummary(selectedClass),
+        api.getAllClassPerformanceRankings(selectedClass),
+      ])
+      if (data) data.all_students = allStudents
       // Map fields to match StudentPerformanceTable expectations
       if (data?.all_students) {
         data.all_students = data.all_students.map(student => {
@@ -607,6 +607,12 @@ export default function PerformanceAnalytics() {
     enabled: viewMode === 'class' && !!selectedClass,
     staleTime: 5 * 60 * 1000,
   })
+  const { data: classRankings } = useQuery({
+    queryKey: ['class-performance-rankings', selectedClass],
+    queryFn: () => api.getAllClassPerformanceRankings(selectedClass).catch(() => null),
+    enabled: viewMode === 'class' && !!selectedClass,
+    staleTime: 5 * 60 * 1000,
+  })
   const { data: subjectComparison } = useQuery({
     queryKey: ['subject-comparison', selectedClass],
     queryFn: () => api.compareSubjects(selectedClass).catch(() => null),
@@ -977,10 +983,10 @@ export default function PerformanceAnalytics() {
           )}
 
           {/* All Students Table */}
-          {classPerformance.all_students && classPerformance.all_students.length > 0 && (
+          {classRankings && classRankings.length > 0 && (
             <section className="bg-white rounded-xl border border-gray-200 p-4 md:p-6 shadow-sm">
               <StudentPerformanceTable
-                students={classPerformance.all_students.map(s => ({
+                students={classRankings.map(s => ({
                   ...s,
                   total_grade: s.total_grade || s.overall_grade,
                   total_percentage: s.total_percentage ?? s.exam_percentage ?? 0,
@@ -1045,9 +1045,27 @@ export async function getAttendanceCorrelation(classId) {
 }
 
 // Class Performance
-export async function getClassPerformanceSummary(classId) {
+export async function getClassPerformanceSummary(classId, { includeStudents = false } = {}) {
   if (!classId) throw new Error('classId is required')
-  return request(`/api/class-performance/summary/?class_id=${encodeURIComponent(classId)}`)
+  const include = includeStudents ? '&include=all_students' : ''
+  return request(`/api/class-performance/summary/?class_id=${encodeURIComponent(classId)}${include}`)
+}
+
+export async function getClassPerformanceRankings(classId, params = {}) {
+  if (!classId) throw new Error('classId is required')
+  const qs = new URLSearchParams({ class_id: classId, ...params }).toString()
+  return request(`/api/class-performance/rankings/?${qs}`)
+}
+
+// Every ranked student of a class, fetched page by page from the rankings endpoint
+export async function getAllClassPerformanceRankings(classId, { pageSize = 200 } = {}) {
+  if (!classId) throw new Error('classId is required')
+  const students = []
+  for (let page = 1; ; page += 1) {
+    const data = await getClassPerformanceRankings(classId, { page, page_size: pageSize })
+    students.push(...(data?.results || []))
+    if (!data?.next) return students
+  }
 }
 
 export async function getClassTopPerformers(classId, limit = 10) {
@@ -1060,9 +1078,25 @@ export async function compareClasses(courseId) {
   return request(`/api/class-performance/compare_classes/${qs}`)
 }
 
-export async function exportClassReport(classId, format = 'summary') {
+export async function exportClassReport(classId, report = 'summary', output = 'csv') {
   if (!classId) throw new Error('classId is required')
-  return request(`/api/class-performance/export_report/?class_id=${encodeURIComponent(classId)}&format=${encodeURIComponent(format)}`)
+  const url = `${API_BASE}/api/class-performance/export_report/?class_id=${encodeURIComponent(classId)}&report=${encodeURIComponent(report)}&output=${encodeURIComponent(output)}`
+  const res = await fetch(url, { credentials: 'include' })
+  if (!res.ok) throw new Error('Export failed')
+  return res.blob()
+}
+
+// Background report jobs (started by calling a report endpoint with ?async=1)
+export async function getReportJob(jobId) {
+  if (!jobId) throw new Error('jobId is required')
+  return request(`/api/report-jobs/${encodeURIComponent(jobId)}/`)
+}
+
+export async function downloadReportJob(jobId) {
+  if (!jobId) throw new Error('jobId is required')
+  const res = await fetch(`${API_BASE}/api/report-jobs/${encodeURIComponent(jobId)}/download/`, { credentials: 'include' })
+  if (!res.ok) throw new Error('Download failed')
+  return res.blob()
 }
 
 // Upload exam attachment (multipart/form-data). Returns attachment resource.
@@ -2168,8 +2202,11 @@ export default {
   compareSubjects,
   getSubjectTrendAnalysis,
   getClassPerformanceSummary,
+  getClassPerformanceRankings,
   getClassTopPerformers,
   compareClasses,
+  getReportJob,
+  downloadReportJob,
   exportClassReport,
   // Attendance Sessions
   getAttendanceSessions,
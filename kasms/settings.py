@@ -5,6 +5,7 @@ import os
 # from decouple import Config, RepositoryEnv
 from dotenv import load_dotenv
 import dj_database_url
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
@@ -334,6 +335,18 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:63
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Africa/Nairobi'
+CERTIFICATE_RENDER_CHUNK_SIZE = int(os.getenv('CERTIFICATE_RENDER_CHUNK_SIZE', 25))
+CLASS_CLOSURE_ASYNC_THRESHOLD = int(os.getenv('CLASS_CLOSURE_ASYNC_THRESHOLD', 500))
+CLASS_PERFORMANCE_SNAPSHOT_DEBOUNCE = int(os.getenv('CLASS_PERFORMANCE_SNAPSHOT_DEBOUNCE', 30))
+STUDENT_STANDING_REFRESH_DELAY = int(os.getenv('STUDENT_STANDING_REFRESH_DELAY', 5))
+REPORT_JOB_RESULT_TTL = int(os.getenv('REPORT_JOB_RESULT_TTL', 60 * 60 * 24))
+QR_COUNTER_FLUSH_INTERVAL = int(os.getenv('QR_COUNTER_FLUSH_INTERVAL', 60))
+QR_SCAN_CONTEXT_TTL = int(os.getenv('QR_SCAN_CONTEXT_TTL', 300))
+QR_SCAN_FLUSH_DELAY = int(os.getenv('QR_SCAN_FLUSH_DELAY', 2))
+QR_SCAN_FLUSH_BATCH_SIZE = int(os.getenv('QR_SCAN_FLUSH_BATCH_SIZE', 500))
+QR_SCAN_PROCESSING_TIMEOUT = int(os.getenv('QR_SCAN_PROCESSING_TIMEOUT', 300))
+ABSENT_MARKING_LOOKBACK_HOURS = int(os.getenv('ABSENT_MARKING_LOOKBACK_HOURS', 24))
+
 CELERY_BEAT_SCHEDULE = {
     'sync-biometric-devices': {
         'task': 'core.tasks.sync_all_devices', 
@@ -347,5 +360,25 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'core.tasks.sync_device_clocks',
         'schedule': 3600.0
     },
+    'rollup-school-daily-stats': {
+        'task': 'core.tasks.rollup_school_daily_stats',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'purge-expired-report-jobs': {
+        'task': 'core.tasks.purge_expired_report_jobs',
+        'schedule': 3600.0,
+    },
+    'flush-qr-generation-counters': {
+        'task': 'core.tasks.flush_qr_generation_counters',
+        'schedule': float(QR_COUNTER_FLUSH_INTERVAL),
+    },
+    'flush-qr-scans': {
+        'task': 'core.tasks.flush_qr_scans',
+        'schedule': 30.0,
+    },
+    'mark-absent-for-completed-sessions': {
+        'task': 'core.tasks.mark_absent_for_completed_sessions',
+        'schedule': 900.0,
+    },
 }
 